@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aio_pika
+from django.conf import settings
+
+from config import tracing
+from config.metrics import observe_handled, observe_received, start_metrics_server
+from worker import WORKER_TYPES
+
+logger = logging.getLogger('async_worker')
+
+REPUBLISHED_PROPERTIES = (
+    'content_type', 'content_encoding', 'priority', 'correlation_id', 'reply_to',
+    'message_id', 'timestamp', 'type', 'user_id', 'app_id',
+)
+
+
+class AsyncWorkerRuntime:
+    """
+    asyncio runtime for the Worker classes in worker.py.
+
+    Runs up to `concurrency` messages at once per process, each through
+    the worker's aprocess_message(). Queue topology, retry scheduling and
+    DLQ handling match Worker.handle_message, so sync and async consumers
+    can share a queue.
+    """
+    def __init__(self, worker, concurrency=50, threads=10):
+        self.worker = worker
+        self.concurrency = concurrency
+        self.threads = threads
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.tasks = set()
+        self.connection = None
+        self.channel = None
+        self.stopping = None
+
+    async def connect(self):
+        self.connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
+        self.channel = await self.connection.channel()
+        await self.channel.set_qos(prefetch_count=self.concurrency)
+
+        queue = None
+        for queue_name, arguments in self.worker.queue_declarations():
+            declared = await self.channel.declare_queue(queue_name, durable=True, arguments=arguments)
+            if queue_name == self.worker.queue_name:
+                queue = declared
+        return queue
+
+    async def on_message(self, message):
+        await self.semaphore.acquire()
+        task = asyncio.create_task(self.handle_message(message))
+        self.tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task):
+        self.tasks.discard(task)
+        self.semaphore.release()
+
+    async def handle_message(self, message):
+        worker = self.worker
+        started = time.monotonic()
+        payload = None
+        try:
+            payload = json.loads(message.body)
+            job_id = payload.get('job_id')
+            logger.info(f"Processing job {job_id}: {payload.get('task_name')}")
+            observe_received(worker.queue_name, payload)
+
+            with tracing.consumer_span(worker.queue_name, payload):
+                await worker.aprocess_message(payload)
+
+            await message.ack()
+            observe_handled(worker.queue_name, payload, 'success', time.monotonic() - started)
+            logger.info(f"Job {job_id} completed successfully")
+
+        except Exception as e:
+            logger.error(f"Error processing message: {e}", exc_info=True)
+
+            retry_count = (message.headers or {}).get('x-retry-count', 0)
+
+            if retry_count < worker.max_retries:
+                retry_count += 1
+                delay = worker.retry_delay(retry_count)
+                await self.republish(
+                    message, worker.retry_queue_name(delay),
+                    headers={'x-retry-count': retry_count}
+                )
+                await message.ack()
+                observe_handled(worker.queue_name, payload, 'retry', time.monotonic() - started)
+                logger.info(f"Scheduled retry {retry_count}/{worker.max_retries} in {delay}s")
+            else:
+                await self.republish(
+                    message, f"{worker.queue_name}_dlq",
+                    headers=worker.dlq_headers(e, retry_count)
+                )
+                await message.ack()
+                observe_handled(worker.queue_name, payload, 'dlq', time.monotonic() - started)
+                logger.error(f"Message moved to DLQ after {worker.max_retries} retries")
+
+    async def republish(self, message, routing_key, headers):
+        # Retries and dead letters keep the original message's properties
+        # (content_type, message_id, correlation_id, ...) and headers
+        properties = {
+            name: getattr(message, name) for name in REPUBLISHED_PROPERTIES
+            if getattr(message, name) is not None
+        }
+        properties.setdefault('content_type', 'application/json')
+        await self.channel.default_exchange.publish(
+            aio_pika.Message(
+                body=message.body,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                headers={**(message.headers or {}), **headers},
+                **properties,
+            ),
+            routing_key=routing_key,
+        )
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        # Sync fallbacks (process_message, ORM calls) run here; bound it so
+        # we never hold more DB connections than threads.
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.threads))
+        self.stopping = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stopping.set)
+
+        queue = await self.connect()
+        consumer_tag = await queue.consume(self.on_message)
+        logger.info(
+            f"Async worker started, listening on queue: {self.worker.queue_name} "
+            f"(concurrency={self.concurrency})"
+        )
+
+        await self.stopping.wait()
+
+        # Drain: stop deliveries, let in-flight messages finish, then close
+        # the channel so prefetched messages return to the queue.
+        logger.info("Stopping: waiting for in-flight messages")
+        await queue.cancel(consumer_tag)
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.connection.close()
+        logger.info(f"Async worker stopped, queue: {self.worker.queue_name}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a worker on the asyncio runtime')
+    parser.add_argument('worker_type', choices=sorted(WORKER_TYPES))
+    parser.add_argument('--concurrency', type=int, default=settings.ASYNC_WORKER_CONCURRENCY)
+    parser.add_argument('--threads', type=int, default=settings.ASYNC_WORKER_THREADS)
+    args = parser.parse_args()
+
+    tracing.set_service_name(f"worker-{args.worker_type}")
+    start_metrics_server()
+    runtime = AsyncWorkerRuntime(
+        WORKER_TYPES[args.worker_type](),
+        concurrency=args.concurrency,
+        threads=args.threads,
+    )
+    sys.exit(asyncio.run(runtime.run()))
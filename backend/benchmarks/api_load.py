@@ -0,0 +1,390 @@
+"""
+Load-test the API through its real URL routes with a mix of scenarios
+and write a JSON report that can be diffed between commits.
+
+By default requests run in-process through Django's test client, which
+also records SQL queries and Elasticsearch calls per request. With
+--base-url they go over HTTP to a running server instead; query and ES
+counts are then read from the Server-Timing header if the server sends
+it (SERVER_TIMING=True).
+
+Scenarios:
+    browse    product list, product detail, search
+    checkout  cart, add to cart, create order (needs variants in stock)
+
+Usage (from backend/, against a seeded database, e.g. generate_dataset):
+    python benchmarks/api_load.py --concurrency 16 --duration 30 --mix browse=90,checkout=10 -o after.json
+    python benchmarks/api_load.py --base-url http://127.0.0.1:8000 --concurrency 64 -o http.json
+    python benchmarks/api_load.py --compare before.json after.json --threshold 10
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+DEFAULT_MIX = 'browse=90,checkout=10'
+SERVER_TIMING_COUNT_RE = re.compile(r'([\w-]+);dur=[\d.]+;desc="(\d+) ')
+
+
+# Instrumentation (in-process only) ------------------------------------------
+
+_counters = threading.local()
+
+
+def count_es_calls():
+    """Count Elasticsearch requests made by the current thread."""
+    from elastic_transport import Transport
+    from config.memory_search import InMemoryElasticsearch
+
+    def counted(method):
+        def wrapper(*args, **kwargs):
+            _counters.es_calls = getattr(_counters, 'es_calls', 0) + 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    Transport.perform_request = counted(Transport.perform_request)
+    # SEARCH_BACKEND=memory never reaches the transport
+    for name in ('index', 'delete', 'delete_by_query', 'search'):
+        setattr(InMemoryElasticsearch, name, counted(getattr(InMemoryElasticsearch, name)))
+
+
+class InProcessClient:
+    def __init__(self, token):
+        from django.test import Client
+
+        self.client = Client(raise_request_exception=False, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def request(self, method, path, body=None, headers=None):
+        from django.db import connections
+        from django.test.utils import CaptureQueriesContext
+
+        captures = [CaptureQueriesContext(connections[alias]) for alias in connections]
+        for capture in captures:
+            capture.__enter__()
+        _counters.es_calls = 0
+        started = time.perf_counter()
+        try:
+            response = self.client.generic(
+                method, path,
+                data=json.dumps(body) if body is not None else '',
+                content_type='application/json',
+                **{f'HTTP_{k.upper().replace("-", "_")}': v for k, v in (headers or {}).items()}
+            )
+            elapsed = (time.perf_counter() - started) * 1000
+        finally:
+            for capture in captures:
+                capture.__exit__(None, None, None)
+        queries = sum(len(capture.captured_queries) for capture in captures)
+        return response.status_code, elapsed, queries, _counters.es_calls, response
+
+    def json(self, response):
+        return json.loads(response.content or b'null')
+
+    def close(self):
+        from django.db import connections
+        connections.close_all()
+
+
+def parse_server_timing(header):
+    """(SQL queries, ES calls) from a Server-Timing header (server needs SERVER_TIMING=True)."""
+    if not header:
+        return None, None
+    queries = es_calls = 0
+    for name, count in SERVER_TIMING_COUNT_RE.findall(header):
+        if name.startswith('db-'):
+            queries += int(count)
+        elif name == 'es':
+            es_calls += int(count)
+    return queries, es_calls
+
+
+class HttpClient:
+    def __init__(self, base_url, token):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.token = token
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = {'Authorization': f'Bearer {self.token}', 'Content-Type': 'application/json', **(headers or {})}
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            return 0, (time.perf_counter() - started) * 1000, None, None, None
+        queries, es_calls = parse_server_timing(response.getheader('Server-Timing'))
+        return response.status, (time.perf_counter() - started) * 1000, queries, es_calls, content
+
+    def json(self, response):
+        return json.loads(response or b'null')
+
+    def close(self):
+        self.connection.close()
+
+
+# Fixtures and scenarios -----------------------------------------------------
+
+def load_fixtures(concurrency):
+    from catalog.models import Product, Variant
+    from django.conf import settings
+    from rest_framework_simplejwt.tokens import AccessToken
+    from users.models import Address, User
+
+    slugs = list(Product.objects.filter(is_active=True).order_by('id').values_list('slug', flat=True)[:20000])
+    if not slugs:
+        raise SystemExit('No products found; seed the database first (seed_products or generate_dataset)')
+    words = sorted({
+        word.lower() for name in Product.objects.order_by('id').values_list('name', flat=True)[:2000]
+        for word in name.split() if len(word) > 3 and not word.isdigit()
+    })
+    variants = list(
+        Variant.objects.filter(is_active=True, stock_quantity__gt=10).order_by('id').values_list('product_id', 'id')[:20000]
+    )
+
+    users = []
+    for i in range(concurrency):
+        user, created = User.objects.get_or_create(
+            email=f'bench-{i}@example.com', defaults={'username': f'bench-{i}'}
+        )
+        if created:
+            user.set_unusable_password()
+            user.save()
+        address = Address.objects.filter(user=user).first() or Address.objects.create(
+            user=user, address_type='shipping', full_name='Bench User', phone='5550100',
+            address_line1='1 Benchmark Way', city='Springfield', state='CA', postal_code='90001',
+            country='US', is_default=True,
+        )
+        users.append((str(AccessToken.for_user(user)), address.id))
+
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 20
+    return {
+        'slugs': slugs,
+        'pages': max(1, min(5, len(slugs) // page_size)),
+        'search_terms': words or ['shirt'],
+        'variants': variants,
+        'users': users,
+    }
+
+
+def browse(session, fixtures, rng):
+    session.call('product_list', 'GET', f"/api/catalog/products/?page={rng.randint(1, fixtures['pages'])}")
+    session.call('product_detail', 'GET', f"/api/catalog/products/{rng.choice(fixtures['slugs'])}/")
+    session.call('search', 'GET', f"/api/catalog/search/?q={rng.choice(fixtures['search_terms'])}")
+
+
+def checkout(session, fixtures, rng):
+    if not fixtures['variants']:
+        return browse(session, fixtures, rng)
+    session.call('cart', 'GET', '/api/orders/cart/')
+    product_id, variant_id = rng.choice(fixtures['variants'])
+    session.call('cart_add', 'POST', '/api/orders/cart/items/', {
+        'product_id': product_id, 'variant_id': variant_id, 'quantity': 1,
+    })
+    session.call('order_create', 'POST', '/api/orders/orders/create/', {
+        'shipping_address_id': session.address_id,
+        'billing_address_id': session.address_id,
+        'payment_method': 'cod',
+    }, headers={'Idempotency-Key': uuid.uuid4().hex})
+
+
+SCENARIOS = {'browse': browse, 'checkout': checkout}
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Session:
+    """One virtual user: a client plus the samples it has recorded."""
+    def __init__(self, client, address_id):
+        self.client = client
+        self.address_id = address_id
+        self.recording = False
+        self.samples = defaultdict(list)
+
+    def call(self, name, method, path, body=None, headers=None):
+        status, elapsed, queries, es_calls, _ = self.client.request(method, path, body, headers)
+        if self.recording:
+            self.samples[name].append((status, elapsed, queries, es_calls))
+
+
+# Running and reporting ------------------------------------------------------
+
+def run(args, fixtures):
+    names, weights = zip(*args.mix.items())
+    sessions = []
+    start_recording = time.monotonic() + args.warmup
+    deadline = start_recording + args.duration
+
+    def virtual_user(index):
+        rng = random.Random(args.seed + index)
+        token, address_id = fixtures['users'][index]
+        client = HttpClient(args.base_url, token) if args.base_url else InProcessClient(token)
+        session = Session(client, address_id)
+        sessions.append(session)
+        try:
+            while time.monotonic() < deadline:
+                session.recording = time.monotonic() >= start_recording
+                SCENARIOS[rng.choices(names, weights)[0]](session, fixtures, rng)
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=virtual_user, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    samples = defaultdict(list)
+    for session in sessions:
+        for name, values in session.samples.items():
+            samples[name].extend(values)
+    return samples
+
+
+def percentile(values, p):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[p - 1]
+
+
+def summarise(samples, duration):
+    endpoints = {}
+    for name, values in sorted(samples.items()):
+        latencies = sorted(elapsed for _, elapsed, _, _ in values)
+        queries = [q for _, _, q, _ in values if q is not None]
+        es_calls = [e for _, _, _, e in values if e is not None]
+        endpoints[name] = {
+            'requests': len(values),
+            'errors': sum(1 for status, _, _, _ in values if not 200 <= status < 400),
+            'rps': round(len(values) / duration, 1),
+            'mean_ms': round(statistics.fmean(latencies), 2),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries_mean': round(statistics.fmean(queries), 2) if queries else None,
+            'queries_max': max(queries) if queries else None,
+            'es_calls_mean': round(statistics.fmean(es_calls), 2) if es_calls else None,
+        }
+    return endpoints
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report):
+    print(f"\n{'endpoint':<16} {'req':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'es':>5}")
+    for name, r in report['endpoints'].items():
+        print(
+            f"{name:<16} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} "
+            f"{r['p99_ms']:>8} {r['queries_mean']!s:>8} {r['es_calls_mean']!s:>5}"
+        )
+
+
+def compare(before_path, after_path, threshold):
+    """Print per-endpoint changes; return 1 if p95 or query counts regressed."""
+    with open(before_path) as f:
+        before = json.load(f)['endpoints']
+    with open(after_path) as f:
+        after = json.load(f)['endpoints']
+
+    regressed = False
+    print(f"{'endpoint':<16} {'p95 before':>11} {'p95 after':>10} {'change':>8} {'queries':>15}")
+    for name in sorted(set(before) | set(after)):
+        if name not in before or name not in after:
+            print(f"{name:<16} {'only in ' + ('after' if name in after else 'before'):>31}")
+            continue
+        old, new = before[name], after[name]
+        change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0
+        flags = []
+        if change > threshold:
+            flags.append('SLOWER')
+        if old['queries_mean'] is not None and new['queries_mean'] is not None \
+                and new['queries_mean'] > old['queries_mean'] + 0.5:
+            flags.append('MORE QUERIES')
+        regressed = regressed or bool(flags)
+        queries = f"{old['queries_mean']} -> {new['queries_mean']}"
+        print(f"{name:<16} {old['p95_ms']:>11} {new['p95_ms']:>10} {change:>+7.1f}% {queries:>15}  {' '.join(flags)}")
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds run before recording starts')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f'Default: {DEFAULT_MIX}')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--base-url', help='Run against this server over HTTP instead of in-process')
+    parser.add_argument('-o', '--output', help='Write the JSON report here')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Diff two reports and exit')
+    parser.add_argument('--threshold', type=float, default=10, help='p95 regression (%%) that fails --compare')
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare, args.threshold)
+
+    import django
+    django.setup()
+    from django.conf import settings
+
+    if not args.base_url:
+        settings.ALLOWED_HOSTS.append('testserver')
+        count_es_calls()
+
+    fixtures = load_fixtures(args.concurrency)
+    samples = run(args, fixtures)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'mode': 'http' if args.base_url else 'in-process',
+            'base_url': args.base_url,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'mix': args.mix,
+            'seed': args.seed,
+            'async_views': settings.ASYNC_VIEWS,
+        },
+        'endpoints': summarise(samples, args.duration),
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nReport written to {args.output}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Compare catalog throughput of the WSGI (sync DRF views) and ASGI (async
+views) serving paths at the same worker count.
+
+Starts gunicorn twice against the configured services, drives each
+endpoint with N concurrent clients for a fixed duration and prints
+requests/sec and latency percentiles.
+
+Usage (from backend/, with DB/ES/Redis reachable and data seeded):
+    python benchmarks/asgi_vs_wsgi.py --workers 2 --concurrency 64 --duration 20
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+SERVERS = {
+    'wsgi': ['gunicorn', 'config.wsgi:application', '--threads', '1'],
+    'asgi': ['gunicorn', 'config.asgi:application', '-k', 'uvicorn.workers.UvicornWorker'],
+}
+
+DEFAULT_PATHS = [
+    '/api/catalog/categories/',
+    '/api/catalog/search/?q=dress',
+]
+
+
+def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/catalog/categories/')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.3)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+def run_load(port, path, concurrency, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        local_errors = 0
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    local_errors += 1
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            local.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    if not latencies:
+        return {'rps': 0, 'p50': None, 'p95': None, 'p99': None, 'errors': errors[0]}
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'rps': round(len(latencies) / duration, 1),
+        'p50': round(q[49], 1),
+        'p95': round(q[94], 1),
+        'p99': round(q[98], 1),
+        'errors': errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--path', action='append', dest='paths', help='Endpoint to load (repeatable)')
+    args = parser.parse_args()
+    paths = args.paths or DEFAULT_PATHS
+
+    results = {}
+    for offset, (name, command) in enumerate(SERVERS.items()):
+        port = args.port + offset
+        env = {**os.environ, 'ASYNC_VIEWS': 'True' if name == 'asgi' else 'False'}
+        server = subprocess.Popen(
+            command + ['-w', str(args.workers), '-b', f'127.0.0.1:{port}', '--log-level', 'warning'],
+            env=env,
+        )
+        try:
+            wait_until_up(port)
+            for path in paths:
+                results[(name, path)] = run_load(port, path, args.concurrency, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"\nworkers={args.workers} concurrency={args.concurrency} duration={args.duration}s\n")
+    print(f"{'path':<40} {'server':<6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for path in paths:
+        for name in SERVERS:
+            r = results[(name, path)]
+            print(f"{path:<40} {name:<6} {r['rps']:>9} {r['p50']!s:>8} {r['p95']!s:>8} {r['p99']!s:>8} {r['errors']:>7}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Compare DRF's JSONRenderer/JSONParser with the orjson ones in
+config/renderers.py on a large ProductDetailSerializer payload.
+
+Creates a throwaway product with --variants variants (each with
+--attributes attribute values) inside a transaction that is rolled back,
+serializes it once, then times rendering the data and parsing the bytes
+back with each implementation. Also checks that both render the same
+JSON.
+
+Usage (from backend/, against any migrated database):
+    python benchmarks/json_render.py --variants 150 --iterations 300 -o json_render.json
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+
+def build_payload(variant_count, attribute_count):
+    from catalog.models import (
+        AttributeDefinition, Category, Product, ProductAttributeValue, ProductImage,
+        Variant, VariantAttributeValue,
+    )
+    from catalog.serializers import ProductDetailSerializer
+    from catalog.views import product_detail_queryset
+
+    tag = uuid.uuid4().hex[:8]
+    category = Category.objects.create(name=f'JSON bench {tag}', slug=f'json-bench-{tag}')
+    attributes = [
+        AttributeDefinition.objects.create(
+            category=category, name=f'Attribute {i}', slug=f'attribute-{i}',
+            attribute_type='select', is_variant_attribute=i > 0,
+        )
+        for i in range(attribute_count + 1)
+    ]
+    product = Product.objects.create(
+        name=f'JSON bench product {tag}', slug=f'json-bench-{tag}', category=category,
+        description='Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 20,
+        base_price=Decimal('49.99'), has_variants=True,
+    )
+    ProductAttributeValue.objects.create(product=product, attribute=attributes[0], value='Cotton – “organic”')
+    ProductImage.objects.bulk_create(
+        ProductImage(product=product, image=f'products/json-bench-{i}.jpg', alt_text=f'View {i}', display_order=i)
+        for i in range(5)
+    )
+    variants = Variant.objects.bulk_create(
+        Variant(
+            product=product, sku=f'JB-{tag}-{i:04d}', stock_quantity=i % 40,
+            price=Decimal('49.99') + Decimal(i % 7) if i % 3 else None,
+        )
+        for i in range(variant_count)
+    )
+    VariantAttributeValue.objects.bulk_create(
+        VariantAttributeValue(variant=variant, attribute=attribute, value=f'Value {variant.pk % 11}')
+        for variant in variants
+        for attribute in attributes[1:]
+    )
+    return ProductDetailSerializer(product_detail_queryset().get(pk=product.pk)).data
+
+
+def time_calls(func, iterations):
+    for _ in range(min(20, iterations)):
+        func()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'mean_ms': round(statistics.mean(samples), 4),
+        'p50_ms': round(samples[len(samples) // 2], 4),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--variants', type=int, default=150)
+    parser.add_argument('--attributes', type=int, default=3, help='Attribute values per variant')
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('-o', '--output', help='Write the JSON report here')
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    from django.db import transaction
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from catalog.batching import catalog_bulk_changes
+    from config.db_utils import UsePrimaryDB
+    from config.renderers import ORJSONParser, ORJSONRenderer
+
+    # Index events wait for a commit that never comes
+    with UsePrimaryDB(), transaction.atomic(using='default'), catalog_bulk_changes():
+        data = build_payload(args.variants, args.attributes)
+        transaction.set_rollback(True, using='default')
+
+    implementations = {
+        'drf': (JSONRenderer(), JSONParser()),
+        'orjson': (ORJSONRenderer(), ORJSONParser()),
+    }
+    rendered = {name: renderer.render(data) for name, (renderer, _) in implementations.items()}
+    if json.loads(rendered['drf']) != json.loads(rendered['orjson']):
+        sys.exit('The renderers produced different JSON')
+
+    report = {
+        'variants': args.variants,
+        'attributes_per_variant': args.attributes,
+        'payload_bytes': len(rendered['drf']),
+        'iterations': args.iterations,
+        'render': {},
+        'parse': {},
+    }
+    for name, (renderer, json_parser) in implementations.items():
+        report['render'][name] = time_calls(lambda: renderer.render(data), args.iterations)
+        body = rendered[name]
+        report['parse'][name] = time_calls(lambda: json_parser.parse(io.BytesIO(body)), args.iterations)
+
+    print(f"ProductDetailSerializer payload: {args.variants} variants, {report['payload_bytes']:,} bytes\n")
+    print(f"{'':8} {'impl':8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for operation in ('render', 'parse'):
+        for name, stats in report[operation].items():
+            print(f"{operation:8} {name:8} {stats['mean_ms']:9.3f} {stats['p50_ms']:9.3f} {stats['p95_ms']:9.3f}")
+        speedup = report[operation]['drf']['mean_ms'] / report[operation]['orjson']['mean_ms']
+        report[operation]['speedup'] = round(speedup, 2)
+        print(f"{operation:8} {'speedup':8} {speedup:8.1f}x\n")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Async variants of the public catalog views, used when serving through
+config/asgi.py. DRF has no async views, so these are plain Django views
+sharing querysets, serializers and cache keys with catalog/views.py.
+"""
+import logging
+
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Paginator
+from django.views.decorators.http import require_GET
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from config.elasticsearch import async_search_products
+from config.renderers import ORJSONResponse
+from .conditional import add_validators, aproduct_validators, not_modified
+from .models import Category, Product
+from .serializers import CategorySerializer, ProductDetailSerializer, ProductListSerializer
+from .views import (
+    CATEGORIES_CACHE_KEY, parse_search_params, product_detail_queryset,
+    search_fallback_queryset, search_result_queryset, unique_product_ids,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _paginated(request, items):
+    # Same response shape as rest_framework.pagination.PageNumberPagination
+    paginator = Paginator(items, api_settings.PAGE_SIZE)
+    try:
+        page = paginator.page(request.GET.get('page', 1))
+    except InvalidPage:
+        # Out of range or not a number (?page=abc): 404, as DRF's paginator
+        return None
+
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', page.next_page_number()) if page.has_next() else None
+    previous_url = None
+    if page.has_previous():
+        previous_number = page.previous_page_number()
+        previous_url = (
+            remove_query_param(url, 'page') if previous_number == 1
+            else replace_query_param(url, 'page', previous_number)
+        )
+    return {
+        'count': paginator.count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': list(page.object_list),
+    }
+
+
+@require_GET
+async def category_list(request):
+    categories = await cache.aget(CATEGORIES_CACHE_KEY)
+    if categories is None:
+        categories = [c async for c in Category.objects.filter(is_active=True)]
+        await cache.aset(CATEGORIES_CACHE_KEY, categories, 300)
+
+    data = _paginated(request, categories)
+    if data is None:
+        return ORJSONResponse({'detail': 'Invalid page.'}, status=404)
+    data['results'] = CategorySerializer(data['results'], many=True).data
+    return ORJSONResponse(data)
+
+
+@require_GET
+async def product_detail(request, slug):
+    validators = await aproduct_validators(slug)
+    response = not_modified(request, validators)
+    if response is None:
+        try:
+            product = await product_detail_queryset().aget(slug=slug)
+        except Product.DoesNotExist:
+            return ORJSONResponse({'detail': 'Not found.'}, status=404)
+        response = ORJSONResponse(ProductDetailSerializer(product).data)
+    return add_validators(response, validators)
+
+
+@require_GET
+async def product_search(request):
+    query = request.GET.get('q', '')
+    if not query:
+        return ORJSONResponse({'results': [], 'total': 0})
+
+    params = parse_search_params(request.GET)
+
+    try:
+        es_results = await async_search_products(query=query, **params)
+        product_ids = unique_product_ids(es_results)
+        products_dict = {p.id: p async for p in search_result_queryset(product_ids)}
+        ordered_products = [products_dict[pid] for pid in product_ids if pid in products_dict]
+
+        return ORJSONResponse({
+            'results': ProductListSerializer(ordered_products, many=True).data,
+            'total': len(ordered_products),
+            'page': params['page'],
+            'page_size': params['page_size']
+        })
+
+    except Exception as e:
+        logger.error(f"Elasticsearch error: {e}")
+        products = [p async for p in search_fallback_queryset(query)]
+        return ORJSONResponse({
+            'results': ProductListSerializer(products, many=True).data,
+            'total': len(products),
+            'page': 1,
+            'page_size': 50,
+            'fallback': True
+        })
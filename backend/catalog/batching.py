@@ -0,0 +1,116 @@
+import asyncio
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import transaction
+
+# {product_id: event_type} collected by the innermost active batch, or None
+# when product changes are published as they happen.
+_pending = ContextVar('catalog_pending_changes', default=None)
+
+
+def record_product_change(product_id, event_type='index'):
+    """
+    Publish a product reindex/delete event, or queue it if a
+    catalog_bulk_changes() block is active. Within a batch the last event
+    per product wins.
+    """
+    pending = _pending.get()
+    if pending is None:
+        from config.rabbitmq import publish_product_event
+        publish_product_event(product_id, event_type)
+    else:
+        pending[product_id] = event_type
+
+
+def _publish(pending):
+    from config.rabbitmq import publish_product_events
+
+    by_event = {}
+    for product_id, event_type in pending.items():
+        by_event.setdefault(event_type, []).append(product_id)
+    for event_type, product_ids in by_event.items():
+        publish_product_events(product_ids, event_type)
+
+
+class catalog_bulk_changes:
+    """
+    Context manager / decorator that collects the products touched by
+    catalog signals and publishes one event per product when the block
+    ends, after the surrounding transaction commits. Nested blocks fold
+    into the outermost one.
+
+    Usage:
+        with catalog_bulk_changes():
+            for variant in variants:
+                variant.save()  # one event per product, not per variant
+    """
+    def __init__(self):
+        self._tokens = []
+
+    def __enter__(self):
+        pending = _pending.get()
+        self._tokens.append(_pending.set({} if pending is None else pending))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pending = self._leave()
+        if pending:
+            self._schedule(pending)
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pending = self._leave()
+        if pending:
+            # Publishing is blocking pika I/O; run it in the thread that
+            # holds the request's sync database connection, like the ORM
+            await sync_to_async(self._schedule, thread_sensitive=True)(pending)
+
+    def _leave(self):
+        """Close this block; the events to publish if it was the outermost."""
+        token = self._tokens.pop()
+        pending = _pending.get()
+        _pending.reset(token)
+        return pending if _pending.get() is None else None
+
+    def _schedule(self, pending):
+        # Runs now outside a transaction; dropped if it rolls back
+        transaction.on_commit(lambda: _publish(pending), using='default')
+
+    def __call__(self, func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                async with catalog_bulk_changes():
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with catalog_bulk_changes():
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class CatalogBulkChangesMiddleware:
+    """Batch the catalog index events of each request (admin inlines, imports)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with catalog_bulk_changes():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        async with catalog_bulk_changes():
+            return await self.get_response(request)
@@ -0,0 +1,109 @@
+"""
+Conditional GET for the public catalog endpoints.
+
+Validators (an ETag and Last-Modified) come from one small query on
+updated_at and Product.version, checked before the view runs, so a
+client or proxy revalidating an unchanged page gets a 304 without the
+detail queries and serialization. Product.version and updated_at are
+bumped by touch_products() (catalog/models.py) on every change that
+shows on the product's page: the product itself, variants and stock,
+images, attribute values, reviews, and its brand, category and attribute
+definitions.
+
+The product list has one validator for every filter and page: the
+catalog version, a timestamp in the cache replaced after each commit
+that saves, touches or deletes a product. Reading it is one cache get.
+
+ETags are weak: the same validator covers every rendering of the
+resource (JSON, browsable API, gzip). Responses carry
+`Cache-Control: no-cache`, so clients may store them but revalidate
+each time; with Last-Modified alone browsers would cache stock levels
+heuristically.
+"""
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .models import Category, Product
+
+CATALOG_VERSION_CACHE_KEY = 'catalog_version'
+
+
+def _product_row(slug):
+    return Product.objects.filter(slug=slug, is_active=True).values_list('id', 'version', 'updated_at')
+
+
+def _product_validators(row):
+    if row is None:
+        return None
+    product_id, version, updated_at = row
+    return f'W/"product-{product_id}-{version}"', updated_at
+
+
+def product_validators(slug):
+    return _product_validators(_product_row(slug).first())
+
+
+async def aproduct_validators(slug):
+    return _product_validators(await _product_row(slug).afirst())
+
+
+def bump_catalog_version():
+    """Change the product list validator once the current transaction commits."""
+    transaction.on_commit(lambda: cache.set(CATALOG_VERSION_CACHE_KEY, time.time_ns(), None), using='default')
+
+
+def product_list_validators():
+    version = cache.get(CATALOG_VERSION_CACHE_KEY)
+    if version is None:
+        # Evicted or never set: start a new version, so nothing older matches
+        cache.add(CATALOG_VERSION_CACHE_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_CACHE_KEY)
+        if version is None:
+            return None
+    return f'W/"products-{version}"', datetime.fromtimestamp(version / 1e9, tz=timezone.utc)
+
+
+def category_validators(slug):
+    row = Category.objects.filter(slug=slug, is_active=True).values_list('id', 'updated_at').first()
+    if row is None:
+        return None
+    category_id, updated_at = row
+    return f'W/"category-{category_id}-{updated_at.timestamp():.6f}"', updated_at
+
+
+def not_modified(request, validators):
+    """The 304 response when the client's copy matches, else None."""
+    if validators is None:
+        return None
+    etag, updated_at = validators
+    return get_conditional_response(request, etag=etag, last_modified=int(updated_at.timestamp()))
+
+
+def add_validators(response, validators):
+    """Set ETag, Last-Modified and Cache-Control on a 200 or 304."""
+    if validators is not None and response.status_code in (200, 304):
+        etag, updated_at = validators
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(updated_at.timestamp()))
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    For DRF GET views: answer 304 from get_validators(), an (etag,
+    updated_at) pair or None, before the view does any work.
+    """
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        response = not_modified(request, validators) or super().get(request, *args, **kwargs)
+        return add_validators(response, validators)
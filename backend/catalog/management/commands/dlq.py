@@ -0,0 +1,207 @@
+import argparse
+import json
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pika
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SEARCH_QUEUE = 'search.index_product'
+DURATION_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+def parse_duration(value):
+    match = re.fullmatch(r'(\d+)([smhd])', value)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid duration '{value}', use e.g. 30s, 15m, 2h, 7d")
+    return timedelta(**{DURATION_UNITS[match.group(2)]: int(match.group(1))})
+
+
+class DeadMessage:
+    def __init__(self, method, properties, body):
+        self.delivery_tag = method.delivery_tag
+        self.headers = properties.headers or {}
+        self.body = body
+        try:
+            self.message = json.loads(body)
+        except ValueError:
+            self.message = {}
+
+    @property
+    def task_name(self):
+        return self.message.get('task_name') or 'unknown'
+
+    @property
+    def error(self):
+        return self.headers.get('x-error', '')
+
+    @property
+    def age(self):
+        try:
+            return datetime.utcnow() - datetime.fromisoformat(self.message['created_at'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @property
+    def dedupe_key(self):
+        return (self.task_name, json.dumps(self.message.get('payload'), sort_keys=True))
+
+
+class Command(BaseCommand):
+    help = 'Inspect a dead letter queue and replay its messages to the source queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queue', help=f'Source queue, e.g. {SEARCH_QUEUE} (reads <queue>_dlq)')
+        parser.add_argument('--replay', action='store_true', help='Replay matching messages (default: inspect only)')
+        parser.add_argument('--task-name', help='Only messages with this task_name')
+        parser.add_argument('--error', help='Only messages whose error contains this text')
+        parser.add_argument('--older-than', type=parse_duration, help='Only messages created before now-DURATION')
+        parser.add_argument('--newer-than', type=parse_duration, help='Only messages created after now-DURATION')
+        parser.add_argument('--limit', type=int, default=100000, help='Read at most this many messages')
+        parser.add_argument('--dedupe', action='store_true', help='Replay identical payloads once and drop the copies')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--rate', type=float, default=500, help='Max replayed messages per second')
+        parser.add_argument(
+            '--reindex', action='store_true',
+            help=f'For {SEARCH_QUEUE}: drop the messages and run one bulk reindex of the affected products'
+        )
+
+    def handle(self, *args, **options):
+        queue = options['queue']
+        if options['reindex'] and queue != SEARCH_QUEUE:
+            raise CommandError(f'--reindex only applies to {SEARCH_QUEUE}')
+
+        connection = pika.BlockingConnection(pika.URLParameters(settings.RABBITMQ_URL))
+        channel = connection.channel()
+        channel.confirm_delivery()
+        try:
+            # Messages stay unacked while we hold them, so basic_get never
+            # hands out the same one twice; anything not acked below goes
+            # back to the DLQ when the channel closes.
+            messages = self.fetch(channel, f'{queue}_dlq', options['limit'])
+            matched = [m for m in messages if self.matches(m, options)]
+
+            self.report(messages, matched)
+
+            if options['reindex']:
+                self.reindex(channel, matched)
+            elif options['replay']:
+                self.replay(channel, queue, matched, options)
+            else:
+                self.stdout.write('Inspect only; pass --replay or --reindex to act on matching messages.')
+        finally:
+            connection.close()
+
+    def fetch(self, channel, dlq, limit):
+        messages = []
+        while len(messages) < limit:
+            method, properties, body = channel.basic_get(queue=dlq, auto_ack=False)
+            if method is None:
+                break
+            messages.append(DeadMessage(method, properties, body))
+        return messages
+
+    def matches(self, message, options):
+        if options['task_name'] and message.task_name != options['task_name']:
+            return False
+        if options['error'] and options['error'] not in message.error:
+            return False
+        age = message.age
+        if options['older_than'] and (age is None or age < options['older_than']):
+            return False
+        if options['newer_than'] and (age is None or age > options['newer_than']):
+            return False
+        return True
+
+    def report(self, messages, matched):
+        self.stdout.write(f'Read {len(messages)} messages, {len(matched)} match the filters')
+        if not matched:
+            return
+
+        self.stdout.write('\nBy task_name:')
+        for task_name, count in Counter(m.task_name for m in matched).most_common():
+            self.stdout.write(f'  {count:>8}  {task_name}')
+
+        self.stdout.write('\nTop errors:')
+        for error, count in Counter(m.error or '(none)' for m in matched).most_common(10):
+            self.stdout.write(f'  {count:>8}  {error[:120]}')
+
+        ages = sorted(m.age for m in matched if m.age is not None)
+        if ages:
+            self.stdout.write(f'\nAge: oldest {ages[-1]}, newest {ages[0]}')
+        unique = len({m.dedupe_key for m in matched})
+        self.stdout.write(f'Unique payloads: {unique}\n')
+
+    def replay(self, channel, queue, matched, options):
+        seen = set()
+        replayed = dropped = 0
+        batch_started = time.monotonic()
+        batch_count = 0
+
+        for message in matched:
+            if options['dedupe']:
+                if message.dedupe_key in seen:
+                    channel.basic_ack(delivery_tag=message.delivery_tag)
+                    dropped += 1
+                    continue
+                seen.add(message.dedupe_key)
+
+            channel.basic_publish(
+                exchange='',
+                routing_key=queue,
+                body=message.body,
+                properties=pika.BasicProperties(
+                    delivery_mode=2,
+                    content_type='application/json',
+                    headers={'x-replayed-from-dlq': True}
+                )
+            )
+            channel.basic_ack(delivery_tag=message.delivery_tag)
+            replayed += 1
+            batch_count += 1
+
+            if batch_count >= options['batch_size']:
+                self.stdout.write(f'Replayed {replayed} messages...')
+                min_duration = batch_count / options['rate']
+                elapsed = time.monotonic() - batch_started
+                if elapsed < min_duration:
+                    channel.connection.sleep(min_duration - elapsed)
+                batch_started = time.monotonic()
+                batch_count = 0
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Replayed {replayed} messages to {queue}, dropped {dropped} duplicates'
+        ))
+
+    def reindex(self, channel, matched):
+        from catalog.models import Product
+        from config.elasticsearch import bulk_delete_products, bulk_index_products
+
+        # Last event per product wins, in DLQ order
+        last_event = {}
+        for message in matched:
+            payload = message.message.get('payload') or {}
+            if payload.get('product_id') is not None:
+                last_event[payload['product_id']] = payload.get('event_type', 'update')
+
+        to_index = [pid for pid, event in last_event.items() if event != 'delete']
+        products = Product.objects.filter(id__in=to_index).select_related(
+            'brand', 'category'
+        ).prefetch_related('attribute_values__attribute')
+        found = {p.id for p in products}
+        to_delete = [pid for pid in last_event if pid not in found]
+
+        self.stdout.write(f'Reindexing {len(found)} products, removing {len(to_delete)} from the index...')
+        indexed, errors = bulk_index_products(products)
+        bulk_delete_products(to_delete)
+        if errors:
+            raise CommandError(f'{len(errors)} documents failed to index; DLQ left untouched')
+
+        for message in matched:
+            channel.basic_ack(delivery_tag=message.delivery_tag)
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} documents for {len(found)} products; cleared {len(matched)} DLQ messages'
+        ))
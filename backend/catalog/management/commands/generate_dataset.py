@@ -0,0 +1,397 @@
+import io
+import json
+import random
+import time
+from bisect import bisect
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from catalog.conditional import bump_catalog_version
+from catalog.models import (
+    AttributeDefinition, Brand, Category, Product, ProductAttributeValue,
+    Variant, VariantAttributeValue,
+)
+from catalog.views import CATEGORIES_CACHE_KEY
+from orders.models import Order, OrderItem, Payment
+from users.models import User
+
+PRODUCT_ATTRIBUTES = {
+    'material': ['cotton', 'polyester', 'wool', 'linen', 'leather', 'denim', 'silk', 'nylon'],
+    'pattern': ['solid', 'striped', 'checked', 'floral', 'printed', 'dotted'],
+    'fit': ['regular', 'slim', 'relaxed', 'oversized'],
+    'season': ['spring', 'summer', 'autumn', 'winter', 'all-season'],
+}
+VARIANT_ATTRIBUTES = {
+    'size': ['XS', 'S', 'M', 'L', 'XL', 'XXL'],
+    'color': ['black', 'white', 'red', 'blue', 'green', 'grey', 'navy', 'beige', 'pink', 'brown'],
+    'length': ['short', 'regular', 'long'],
+}
+WORDS = [
+    'classic', 'essential', 'premium', 'vintage', 'modern', 'urban', 'cozy', 'light', 'soft',
+    'relaxed', 'tailored', 'everyday', 'summer', 'winter', 'sport', 'casual', 'formal', 'organic',
+]
+ITEMS = ['shirt', 'dress', 'jacket', 'jeans', 'sneakers', 'boots', 'scarf', 'hoodie', 'skirt', 'coat', 'bag', 'hat']
+ORDER_STATUSES = (
+    ['delivered'] * 60 + ['shipped'] * 10 + ['confirmed'] * 8 + ['processing'] * 5
+    + ['pending'] * 5 + ['cancelled'] * 10 + ['refunded'] * 2
+)
+RECORDED_STATUSES = {'confirmed', 'processing', 'shipped', 'delivered'}
+
+
+class ZipfSampler:
+    """Draws indexes 0..n-1 with P(k) proportional to 1 / (k + 1) ** s."""
+    def __init__(self, n, s, rng):
+        self.rng = rng
+        self.cumulative = list(accumulate(1 / (k + 1) ** s for k in range(n)))
+        self.total = self.cumulative[-1]
+
+    def sample(self):
+        return bisect(self.cumulative, self.rng.random() * self.total)
+
+
+class CopyWriter:
+    """
+    Buffers rows for one model in memory and loads them with COPY FROM
+    STDIN. Parent writers are flushed first, so foreign keys always point
+    at rows that are already loaded.
+    """
+    def __init__(self, cursor, model, now, chunk_size, parents=()):
+        self.cursor = cursor
+        self.parents = parents
+        self.table = model._meta.db_table
+        self.fields = model._meta.concrete_fields
+        self.columns = ', '.join(f'"{field.column}"' for field in self.fields)
+        self.defaults = {field.attname: self.default(field, now) for field in self.fields}
+        self.chunk_size = chunk_size
+        self.buffer = io.StringIO()
+        self.pending = 0
+        self.count = 0
+
+    @staticmethod
+    def default(field, now):
+        if field.has_default():
+            return field.get_default()
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            return now
+        if field.null:
+            return None
+        return ''
+
+    @staticmethod
+    def encode(value):
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value)
+        elif hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+    def add(self, **values):
+        row = [self.encode(values.get(field.attname, self.defaults[field.attname])) for field in self.fields]
+        self.buffer.write('\t'.join(row) + '\n')
+        self.pending += 1
+        if self.pending >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        for parent in self.parents:
+            parent.flush()
+        if not self.pending:
+            return
+        self.buffer.seek(0)
+        self.cursor.copy_expert(f'COPY "{self.table}" ({self.columns}) FROM STDIN', self.buffer)
+        self.count += self.pending
+        self.buffer = io.StringIO()
+        self.pending = 0
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, deterministic synthetic catalog and order history with COPY (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--variants-per-product', type=int, default=5, help='Average; 10%% of products have none')
+        parser.add_argument('--product-attributes', type=int, default=2, help='Attribute values per product')
+        parser.add_argument('--variant-attributes', type=int, default=2, help='Attribute values per variant')
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--brands', type=int, default=500)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--orders', type=int, default=50000)
+        parser.add_argument('--days', type=int, default=365, help='Spread orders over this many past days')
+        parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent for category, brand and product popularity')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Rows per COPY')
+        parser.add_argument('--index', action='store_true', help='Bulk index the generated products into Elasticsearch')
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        if connection.vendor != 'postgresql':
+            raise CommandError('generate_dataset loads data with COPY and requires PostgreSQL')
+        if options['variant_attributes'] > len(VARIANT_ATTRIBUTES) or options['product_attributes'] > len(PRODUCT_ATTRIBUTES):
+            raise CommandError(
+                f'At most {len(PRODUCT_ATTRIBUTES)} product and {len(VARIANT_ATTRIBUTES)} variant attributes'
+            )
+
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.now = timezone.now()
+        self.started = time.monotonic()
+
+        with connection.cursor() as cursor:
+            self.cursor = cursor
+            self.next_ids = {}
+            self.generate_taxonomy()
+            self.generate_products()
+            self.generate_users()
+            self.generate_orders()
+            self.reset_sequences()
+        # COPY skips the model signals: the new products and categories
+        # must show in the cached product and category lists
+        bump_catalog_version()
+        cache.delete(CATEGORIES_CACHE_KEY)
+
+        self.stdout.write(self.style.SUCCESS(f'Dataset generated in {time.monotonic() - self.started:.0f}s'))
+        if options['orders']:
+            self.stdout.write('Run `manage.py rebuild_sales_rollups` to build the sales rollups for these orders.')
+        if options['index']:
+            self.index_products()
+
+    def writer(self, model, parents=()):
+        return CopyWriter(self.cursor, model, self.now, self.options['chunk_size'], parents)
+
+    def reserve_ids(self, model, count):
+        """First of `count` fresh primary keys for model (assigned explicitly, sequences reset at the end)."""
+        if model not in self.next_ids:
+            self.cursor.execute(f'SELECT coalesce(max(id), 0) + 1 FROM "{model._meta.db_table}"')
+            self.next_ids[model] = self.cursor.fetchone()[0]
+        first = self.next_ids[model]
+        self.next_ids[model] += count
+        return first
+
+    def done(self, writer, label):
+        writer.flush()
+        self.stdout.write(f'{writer.count:>12,} {label} ({time.monotonic() - self.started:.0f}s)')
+
+    def generate_taxonomy(self):
+        options = self.options
+        categories = self.writer(Category)
+        first = self.reserve_ids(Category, options['categories'])
+        self.category_ids = list(range(first, first + options['categories']))
+        for category_id in self.category_ids:
+            categories.add(
+                id=category_id, name=f'Category {category_id}', slug=f'gen-category-{category_id}',
+                created_at=self.now, updated_at=self.now,
+            )
+        self.done(categories, 'categories')
+
+        brands = self.writer(Brand)
+        first = self.reserve_ids(Brand, options['brands'])
+        self.brand_ids = list(range(first, first + options['brands']))
+        for brand_id in self.brand_ids:
+            brands.add(id=brand_id, name=f'Brand {brand_id}', slug=f'gen-brand-{brand_id}', created_at=self.now)
+        self.done(brands, 'brands')
+
+        # {category_id: [(attribute_id, values)]} for product and variant attributes
+        definitions = self.writer(AttributeDefinition)
+        self.product_attributes, self.variant_attributes = {}, {}
+        product_names = list(PRODUCT_ATTRIBUTES)[:options['product_attributes']]
+        variant_names = list(VARIANT_ATTRIBUTES)[:options['variant_attributes']]
+        for category_id in self.category_ids:
+            for names, vocabulary, target, is_variant in (
+                (product_names, PRODUCT_ATTRIBUTES, self.product_attributes, False),
+                (variant_names, VARIANT_ATTRIBUTES, self.variant_attributes, True),
+            ):
+                for order, name in enumerate(names):
+                    attribute_id = self.reserve_ids(AttributeDefinition, 1)
+                    definitions.add(
+                        id=attribute_id, category_id=category_id, name=name.title(), slug=name,
+                        attribute_type='select', is_variant_attribute=is_variant, display_order=order,
+                        created_at=self.now,
+                    )
+                    target.setdefault(category_id, []).append((attribute_id, vocabulary[name]))
+        self.done(definitions, 'attribute definitions')
+
+    def generate_products(self):
+        options, rng = self.options, self.rng
+        category_sampler = ZipfSampler(len(self.category_ids), options['skew'], rng)
+        brand_sampler = ZipfSampler(len(self.brand_ids), options['skew'], rng)
+
+        products = self.writer(Product)
+        variants = self.writer(Variant, parents=[products])
+        product_values = self.writer(ProductAttributeValue, parents=[products])
+        variant_values = self.writer(VariantAttributeValue, parents=[variants])
+
+        first = self.reserve_ids(Product, options['products'])
+        # Per product: base price, first variant ID and variant count, used by orders
+        self.product_ids = range(first, first + options['products'])
+        self.base_prices = []
+        self.variant_ranges = []
+
+        for product_id in self.product_ids:
+            category_id = self.category_ids[category_sampler.sample()]
+            brand_id = self.brand_ids[brand_sampler.sample()] if rng.random() < 0.9 else None
+            base_price = Decimal(rng.randint(500, 30000)) / 100
+            variant_count = 0
+            if options['variants_per_product'] and rng.random() < 0.9:
+                variant_count = rng.randint(1, 2 * options['variants_per_product'] - 1)
+            name = f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {rng.choice(ITEMS)} {product_id}"
+            created_at = self.now - timedelta(days=rng.randint(0, 3 * options['days']))
+
+            products.add(
+                id=product_id, name=name, slug=f'gen-product-{product_id}',
+                description=f'{name}. Generated for benchmarking.',
+                category_id=category_id, brand_id=brand_id, base_price=base_price,
+                is_active=rng.random() < 0.97, has_variants=variant_count > 0,
+                created_at=created_at, updated_at=created_at,
+            )
+            for attribute_id, values in self.product_attributes.get(category_id, []):
+                product_values.add(
+                    id=self.reserve_ids(ProductAttributeValue, 1), product_id=product_id,
+                    attribute_id=attribute_id, value=rng.choice(values),
+                )
+
+            first_variant = self.reserve_ids(Variant, variant_count)
+            for variant_id in range(first_variant, first_variant + variant_count):
+                variants.add(
+                    id=variant_id, product_id=product_id, sku=f'GEN-{variant_id}',
+                    price=self.variant_price(base_price, variant_id),
+                    stock_quantity=rng.choice([0, 0] + list(range(1, 200))),
+                    is_active=rng.random() < 0.98, created_at=created_at, updated_at=created_at,
+                )
+                for attribute_id, values in self.variant_attributes.get(category_id, []):
+                    variant_values.add(
+                        id=self.reserve_ids(VariantAttributeValue, 1), variant_id=variant_id,
+                        attribute_id=attribute_id, value=rng.choice(values),
+                    )
+
+            self.base_prices.append(base_price)
+            self.variant_ranges.append((first_variant, variant_count))
+            if (product_id - first + 1) % 100000 == 0:
+                self.stdout.write(f'  {product_id - first + 1:,} products...')
+
+        self.done(products, 'products')
+        self.done(variants, 'variants')
+        self.done(product_values, 'product attribute values')
+        self.done(variant_values, 'variant attribute values')
+
+    @staticmethod
+    def variant_price(base_price, variant_id):
+        # Most variants inherit the product price; the rest vary by up to 10%
+        if variant_id % 3:
+            return None
+        return (base_price * (1 + Decimal((variant_id % 5) - 2) / 20)).quantize(Decimal('0.01'))
+
+    def generate_users(self):
+        users = self.writer(User)
+        first = self.reserve_ids(User, self.options['users'])
+        self.user_ids = range(first, first + self.options['users'])
+        for user_id in self.user_ids:
+            users.add(
+                id=user_id, username=f'gen-user-{user_id}', email=f'gen-user-{user_id}@example.com',
+                password='!', first_name='Generated', last_name=f'User {user_id}',
+                date_joined=self.now, created_at=self.now, updated_at=self.now,
+            )
+        self.done(users, 'users')
+
+    def generate_orders(self):
+        options, rng = self.options, self.rng
+        if not options['orders'] or not options['products'] or not options['users']:
+            return
+        # Popularity is independent of product ID order
+        popularity = list(range(len(self.product_ids)))
+        rng.shuffle(popularity)
+        product_sampler = ZipfSampler(len(popularity), options['skew'], rng)
+        user_sampler = ZipfSampler(len(self.user_ids), 0.8, rng)
+
+        orders = self.writer(Order)
+        items = self.writer(OrderItem, parents=[orders])
+        payments = self.writer(Payment, parents=[orders])
+        address = {
+            f'{kind}_{field}': value
+            for kind in ('shipping', 'billing')
+            for field, value in (
+                ('full_name', 'Generated User'), ('phone', '5550100'), ('address_line1', '1 Benchmark Way'),
+                ('city', 'Springfield'), ('state', 'CA'), ('postal_code', '90001'), ('country', 'US'),
+            )
+        }
+
+        first = self.reserve_ids(Order, options['orders'])
+        for order_id in range(first, first + options['orders']):
+            created_at = self.now - timedelta(seconds=rng.randint(0, options['days'] * 86400))
+            status = rng.choice(ORDER_STATUSES)
+            payment_method = rng.choice(['credit_card', 'debit_card', 'upi', 'wallet', 'cod'])
+
+            order_items = []
+            for _ in range(min(1 + int(rng.expovariate(0.7)), 10)):
+                index = popularity[product_sampler.sample()]
+                product_id = self.product_ids[index]
+                base_price = self.base_prices[index]
+                first_variant, variant_count = self.variant_ranges[index]
+                variant_id = first_variant + rng.randrange(variant_count) if variant_count else None
+                unit_price = (self.variant_price(base_price, variant_id) if variant_id else None) or base_price
+                quantity = rng.choice([1, 1, 1, 1, 2, 2, 3])
+                order_items.append({
+                    'product_id': product_id, 'variant_id': variant_id,
+                    'product_name': f'Product {product_id}', 'variant_info': {},
+                    'sku': f'GEN-{variant_id}' if variant_id else f'PROD-{product_id}',
+                    'quantity': quantity, 'unit_price': unit_price, 'total_price': unit_price * quantity,
+                })
+
+            subtotal = sum((item['total_price'] for item in order_items), Decimal('0.00'))
+            tax = (subtotal * Decimal('0.18')).quantize(Decimal('0.01'))
+            total = subtotal + Decimal('5.00') + tax
+            orders.add(
+                id=order_id, user_id=self.user_ids[user_sampler.sample()],
+                order_number=f'ORD-{created_at:%y%m}-G{order_id:011X}',
+                status=status, payment_status='completed' if status in RECORDED_STATUSES else 'pending',
+                subtotal=subtotal, shipping_cost=Decimal('5.00'), tax=tax, total=total,
+                payment_method=payment_method, sales_recorded=status in RECORDED_STATUSES,
+                created_at=created_at, updated_at=created_at, **address,
+            )
+            for item in order_items:
+                items.add(id=self.reserve_ids(OrderItem, 1), order_id=order_id, created_at=created_at, **item)
+            payments.add(
+                id=self.reserve_ids(Payment, 1), order_id=order_id, payment_method=payment_method,
+                amount=total, status='completed' if status in RECORDED_STATUSES else 'pending',
+                payment_data={}, created_at=created_at, updated_at=created_at,
+            )
+            if (order_id - first + 1) % 100000 == 0:
+                self.stdout.write(f'  {order_id - first + 1:,} orders...')
+
+        self.done(orders, 'orders')
+        self.done(items, 'order items')
+        self.done(payments, 'payments')
+
+    def reset_sequences(self):
+        for model in self.next_ids:
+            table = model._meta.db_table
+            self.cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), (SELECT coalesce(max(id), 0) + 1 FROM \"{table}\"), false)",
+                [table]
+            )
+        self.cursor.execute('ANALYZE')
+
+    def index_products(self):
+        from config.elasticsearch import bulk_index_products
+
+        self.stdout.write('Indexing generated products...')
+        ids = list(self.product_ids)
+        indexed = 0
+        for start in range(0, len(ids), 1000):
+            products = Product.objects.using('default').filter(id__in=ids[start:start + 1000]).select_related(
+                'brand', 'category'
+            ).prefetch_related('attribute_values__attribute')
+            count, errors = bulk_index_products(products)
+            indexed += count
+            if errors:
+                self.stdout.write(self.style.ERROR(f'{len(errors)} documents failed to index'))
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} documents'))
@@ -0,0 +1,315 @@
+import csv
+import itertools
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from catalog.batching import catalog_bulk_changes
+from catalog.models import (
+    AttributeDefinition, Brand, Category, Product, ProductAttributeValue,
+    Variant, VariantAttributeValue, touch_products,
+)
+
+PRODUCT_UPDATE_FIELDS = ['name', 'description', 'category', 'brand', 'base_price', 'is_active', 'has_variants', 'updated_at']
+VARIANT_UPDATE_FIELDS = ['product', 'price', 'stock_quantity', 'is_active', 'updated_at']
+
+
+class RowError(ValueError):
+    pass
+
+
+def parse_decimal(value, field, required=True):
+    if value in (None, ''):
+        if required:
+            raise RowError(f'{field} is required')
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise RowError(f'{field} is not a number: {value!r}')
+
+
+def parse_bool(value, default=True):
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def read_jsonl(stream):
+    for line_number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                yield line_number, RowError(f'invalid JSON: {e}')
+
+
+def read_csv(stream):
+    """
+    One row per variant (or per product without variants), grouped into
+    product records by consecutive slug. Attribute columns are named
+    attr:<slug> (product) and variant_attr:<slug> (variant).
+    """
+    rows = enumerate(csv.DictReader(stream), 2)
+    for slug, group in itertools.groupby(rows, key=lambda row: row[1].get('slug') or row[1].get('name')):
+        group = list(group)
+        line_number, first = group[0]
+        record = {
+            key: value for key, value in first.items()
+            if key and not key.startswith(('attr:', 'variant_attr:'))
+        }
+        record['attributes'] = {
+            key[5:]: value for key, value in first.items()
+            if key and key.startswith('attr:') and value
+        }
+        record['variants'] = [
+            {
+                'sku': row['sku'],
+                'price': row.get('price'),
+                'stock_quantity': row.get('stock_quantity'),
+                'is_active': row.get('variant_is_active'),
+                'attributes': {
+                    key[13:]: value for key, value in row.items()
+                    if key and key.startswith('variant_attr:') and value
+                },
+            }
+            for _, row in group if row.get('sku')
+        ]
+        yield line_number, record
+
+
+class Command(BaseCommand):
+    help = 'Stream products and variants from CSV or JSONL into the catalog with chunked bulk upserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Default: from the file extension')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Products per transaction')
+        parser.add_argument('--no-index', action='store_true', help='Skip the bulk Elasticsearch reindex')
+
+    @catalog_bulk_changes()
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        if path == '-' and not options['format']:
+            raise CommandError('--format is required when reading stdin')
+
+        self.categories = dict(Category.objects.using('default').values_list('slug', 'id'))
+        self.brands = dict(Brand.objects.using('default').values_list('slug', 'id'))
+        self.attributes = {
+            (category_id, slug): attribute_id
+            for attribute_id, category_id, slug in AttributeDefinition.objects.using('default').values_list(
+                'id', 'category_id', 'slug'
+            )
+        }
+        self.product_ids = set()
+        self.counts = {'rows': 0, 'products': 0, 'variants': 0, 'errors': 0}
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        started = time.monotonic()
+        try:
+            reader = read_csv(stream) if file_format == 'csv' else read_jsonl(stream)
+            chunk = []
+            for line_number, record in reader:
+                self.counts['rows'] += 1
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    chunk.append(self.prepare(record))
+                except RowError as e:
+                    self.counts['errors'] += 1
+                    self.stderr.write(f'Line {line_number}: {e}')
+                if len(chunk) >= options['chunk_size']:
+                    self.write_chunk(chunk)
+                    chunk = []
+                    self.report_progress(started)
+            if chunk:
+                self.write_chunk(chunk)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.counts['products']} products and {self.counts['variants']} variants "
+            f"from {self.counts['rows']} records in {elapsed:.1f}s "
+            f"({self.counts['rows'] / max(elapsed, 1e-9):.0f} rows/sec, {self.counts['errors']} errors)"
+        ))
+
+        if not options['no_index']:
+            self.reindex()
+
+    def report_progress(self, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"{self.counts['products']} products, {self.counts['variants']} variants "
+            f"({self.counts['rows'] / max(elapsed, 1e-9):.0f} rows/sec)"
+        )
+
+    def category_id(self, value):
+        slug = slugify(value)
+        if slug not in self.categories:
+            self.categories[slug] = Category.objects.using('default').get_or_create(
+                slug=slug, defaults={'name': value}
+            )[0].id
+        return self.categories[slug]
+
+    def brand_id(self, value):
+        if not value:
+            return None
+        slug = slugify(value)
+        if slug not in self.brands:
+            self.brands[slug] = Brand.objects.using('default').get_or_create(
+                slug=slug, defaults={'name': value}
+            )[0].id
+        return self.brands[slug]
+
+    def attribute_id(self, category_id, name, is_variant_attribute):
+        slug = slugify(name)
+        key = (category_id, slug)
+        if key not in self.attributes:
+            self.attributes[key] = AttributeDefinition.objects.using('default').get_or_create(
+                category_id=category_id, slug=slug,
+                defaults={
+                    'name': name,
+                    'attribute_type': 'select' if is_variant_attribute else 'text',
+                    'is_variant_attribute': is_variant_attribute,
+                }
+            )[0].id
+        return self.attributes[key]
+
+    def prepare(self, record):
+        """Validate one product record and resolve its lookups to IDs."""
+        if not isinstance(record, dict):
+            raise RowError('record must be an object')
+        name = record.get('name')
+        if not name:
+            raise RowError('name is required')
+        if not record.get('category'):
+            raise RowError('category is required')
+
+        category_id = self.category_id(record['category'])
+        variants = record.get('variants') or []
+        product = Product(
+            name=name,
+            slug=record.get('slug') or slugify(name),
+            description=record.get('description') or '',
+            category_id=category_id,
+            brand_id=self.brand_id(record.get('brand')),
+            base_price=parse_decimal(record.get('base_price'), 'base_price'),
+            is_active=parse_bool(record.get('is_active')),
+            has_variants=bool(variants),
+        )
+        attributes = [
+            (self.attribute_id(category_id, key, False), str(value))
+            for key, value in (record.get('attributes') or {}).items()
+        ]
+
+        prepared_variants = []
+        for data in variants:
+            if not data.get('sku'):
+                raise RowError('variant sku is required')
+            stock = data.get('stock_quantity')
+            try:
+                stock = int(stock) if stock not in (None, '') else 0
+            except ValueError:
+                raise RowError(f"stock_quantity is not an integer: {stock!r}")
+            variant = Variant(
+                sku=data['sku'],
+                price=parse_decimal(data.get('price'), 'price', required=False),
+                stock_quantity=stock,
+                is_active=parse_bool(data.get('is_active')),
+            )
+            variant_attributes = [
+                (self.attribute_id(category_id, key, True), str(value))
+                for key, value in (data.get('attributes') or {}).items()
+            ]
+            prepared_variants.append((variant, variant_attributes))
+
+        return product, attributes, prepared_variants
+
+    def write_chunk(self, chunk):
+        # A slug or SKU may only appear once per upsert; the last record wins
+        products = {product.slug: (product, attributes, variants) for product, attributes, variants in chunk}
+        variants = {}
+        for slug, (_, _, product_variants) in products.items():
+            for variant, variant_attributes in product_variants:
+                variants[variant.sku] = (slug, variant, variant_attributes)
+
+        now = timezone.now()
+        # bulk_create sends no post_save signals, so nothing is published
+        # per row; the products are reindexed in bulk at the end.
+        with transaction.atomic(using='default'):
+            for product, _, _ in products.values():
+                product.updated_at = now
+            Product.objects.using('default').bulk_create(
+                [product for product, _, _ in products.values()],
+                update_conflicts=True,
+                unique_fields=['slug'],
+                update_fields=PRODUCT_UPDATE_FIELDS,
+            )
+            product_ids = dict(Product.objects.using('default').filter(slug__in=products).values_list('slug', 'id'))
+
+            ProductAttributeValue.objects.using('default').bulk_create(
+                [
+                    ProductAttributeValue(product_id=product_ids[slug], attribute_id=attribute_id, value=value)
+                    for slug, (_, attributes, _) in products.items()
+                    for attribute_id, value in attributes
+                ],
+                update_conflicts=True,
+                unique_fields=['product', 'attribute'],
+                update_fields=['value'],
+            )
+
+            for slug, variant, _ in variants.values():
+                variant.product_id = product_ids[slug]
+                variant.updated_at = now
+            Variant.objects.using('default').bulk_create(
+                [variant for _, variant, _ in variants.values()],
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=VARIANT_UPDATE_FIELDS,
+            )
+            variant_ids = dict(Variant.objects.using('default').filter(sku__in=variants).values_list('sku', 'id'))
+
+            VariantAttributeValue.objects.using('default').bulk_create(
+                [
+                    VariantAttributeValue(variant_id=variant_ids[sku], attribute_id=attribute_id, value=value)
+                    for sku, (_, _, variant_attributes) in variants.items()
+                    for attribute_id, value in variant_attributes
+                ],
+                update_conflicts=True,
+                unique_fields=['variant', 'attribute'],
+                update_fields=['value'],
+            )
+            # The upserts don't go through Product.save()
+            touch_products(id__in=product_ids.values())
+
+        self.product_ids.update(product_ids.values())
+        self.counts['products'] += len(products)
+        self.counts['variants'] += len(variants)
+
+    def reindex(self):
+        from config.elasticsearch import bulk_index_products
+
+        self.stdout.write(f'Reindexing {len(self.product_ids)} products...')
+        ids = sorted(self.product_ids)
+        indexed = failed = 0
+        for start in range(0, len(ids), 500):
+            products = Product.objects.using('default').filter(id__in=ids[start:start + 500]).select_related(
+                'brand', 'category'
+            ).prefetch_related('attribute_values__attribute')
+            count, errors = bulk_index_products(products)
+            indexed += count
+            failed += len(errors)
+        if failed:
+            self.stdout.write(self.style.ERROR(f'{failed} documents failed to index'))
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} documents'))
@@ -3,10 +3,12 @@ from catalog.models import Category, Brand, Product, ProductImage, Variant, Vari
 from users.models import User
 from django.utils.text import slugify
 from decimal import Decimal
+from catalog.batching import catalog_bulk_changes
 
 class Command(BaseCommand):
     help = 'Seed database with demo products'
 
+    @catalog_bulk_changes()
     def handle(self, *args, **options):
         self.stdout.write('Creating demo data...')
 
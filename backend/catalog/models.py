@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 from django.utils.text import slugify
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
@@ -74,6 +76,9 @@ class Product(models.Model):
     base_price = models.DecimalField(max_digits=10, decimal_places=2)
     is_active = models.BooleanField(default=True)
     has_variants = models.BooleanField(default=False)
+    # Bumped with updated_at whenever anything shown on the product's page
+    # changes (see touch_products); the ETag in catalog/conditional.py
+    version = models.PositiveIntegerField(default=1, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -88,9 +93,31 @@ class Product(models.Model):
         return self.name
 
     def save(self, *args, **kwargs):
+        from catalog.conditional import bump_catalog_version
+
         if not self.slug:
             self.slug = slugify(self.name)
+        bump_catalog_version()
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        # Incremented in SQL: a stale instance must not write back a
+        # version that was already served with different content. The
+        # instance just counts its own saves, it can lag behind the row.
+        version = self.version
+        self.version = F('version') + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at'}
         super().save(*args, **kwargs)
+        self.version = version + 1
+
+
+def touch_products(*args, **filters):
+    """Bump the version and updated_at of the matching products, and the catalog version."""
+    from catalog.conditional import bump_catalog_version
+
+    bump_catalog_version()
+    return Product.objects.filter(*args, **filters).update(version=F('version') + 1, updated_at=timezone.now())
 
 
 class ProductImage(models.Model):
@@ -174,13 +201,14 @@ class Review(models.Model):
         return f"{self.product.name} - {self.user.email} - {self.rating}★"
 
 
-# Elasticsearch indexing signals
+# Elasticsearch indexing signals. Events are queued per product inside
+# catalog_bulk_changes() (every request, via CatalogBulkChangesMiddleware).
 @receiver(post_save, sender=Product)
 def index_product_on_save(sender, instance, created, **kwargs):
     """Index product in Elasticsearch when it's created or updated"""
-    from config.rabbitmq import publish_product_event
+    from catalog.batching import record_product_change
     try:
-        publish_product_event(instance.id, 'index')
+        record_product_change(instance.id, 'index')
     except Exception as e:
         print(f"Error publishing product event: {e}")
 
@@ -188,19 +216,27 @@ def index_product_on_save(sender, instance, created, **kwargs):
 @receiver(post_delete, sender=Product)
 def delete_product_on_delete(sender, instance, **kwargs):
     """Remove product from Elasticsearch when it's deleted"""
-    from config.rabbitmq import publish_product_event
+    from catalog.batching import record_product_change
+    from catalog.conditional import bump_catalog_version
+    from config.cache_purge import product_paths
+    from config.rabbitmq import publish_cache_purge
+    bump_catalog_version()
     try:
-        publish_product_event(instance.id, 'delete')
+        record_product_change(instance.id, 'delete')
     except Exception as e:
         print(f"Error publishing product delete event: {e}")
+    # The search worker purges the nginx cache after reindexing, but a
+    # delete event no longer knows the slug: send it the paths
+    paths = product_paths(instance.slug)
+    transaction.on_commit(lambda: publish_cache_purge(paths), using='default')
 
 
 @receiver(post_save, sender=Variant)
 def index_product_on_variant_save(sender, instance, created, **kwargs):
     """Re-index product when a variant is created or updated"""
-    from config.rabbitmq import publish_product_event
+    from catalog.batching import record_product_change
     try:
-        publish_product_event(instance.product.id, 'index')
+        record_product_change(instance.product_id, 'index')
     except Exception as e:
         print(f"Error publishing product event: {e}")
 
@@ -208,8 +244,60 @@ def index_product_on_variant_save(sender, instance, created, **kwargs):
 @receiver(post_delete, sender=Variant)
 def index_product_on_variant_delete(sender, instance, **kwargs):
     """Re-index product when a variant is deleted"""
-    from config.rabbitmq import publish_product_event
+    from catalog.batching import record_product_change
     try:
-        publish_product_event(instance.product.id, 'index')
+        record_product_change(instance.product_id, 'index')
     except Exception as e:
         print(f"Error publishing product event: {e}")
+
+
+# Conditional GET validators (catalog/conditional.py): every change that
+# shows on a product's page or in the product list touches the product.
+@receiver([post_save, post_delete], sender=Variant)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=ProductAttributeValue)
+@receiver([post_save, post_delete], sender=Review)
+def touch_product_on_change(sender, instance, **kwargs):
+    touch_products(id=instance.product_id)
+
+
+@receiver([post_save, post_delete], sender=VariantAttributeValue)
+def touch_product_on_variant_attribute_change(sender, instance, **kwargs):
+    touch_products(id__in=Variant.objects.filter(id=instance.variant_id).values('product_id'))
+
+
+@receiver(post_save, sender=Brand)
+def touch_products_on_brand_save(sender, instance, created, **kwargs):
+    if not created:
+        touch_products(brand=instance)
+
+
+@receiver(post_save, sender=Category)
+def touch_products_on_category_save(sender, instance, created, **kwargs):
+    if not created:
+        touch_products(category=instance)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def purge_category_caches(sender, instance, **kwargs):
+    """Categories aren't indexed: drop the cached list here and have the search worker purge nginx."""
+    from django.core.cache import cache
+    from catalog.views import CATEGORIES_CACHE_KEY
+    from config.cache_purge import category_paths
+    from config.rabbitmq import publish_cache_purge
+
+    paths = category_paths(instance.slug)
+
+    def purge():
+        cache.delete(CATEGORIES_CACHE_KEY)
+        publish_cache_purge(paths)
+    transaction.on_commit(purge, using='default')
+
+
+@receiver(post_save, sender=AttributeDefinition)
+def touch_products_on_attribute_save(sender, instance, created, **kwargs):
+    if not created:
+        touch_products(
+            models.Q(attribute_values__attribute=instance)
+            | models.Q(variants__attribute_values__attribute=instance)
+        )
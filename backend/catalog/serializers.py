@@ -83,12 +83,19 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             'variants', 'average_rating', 'review_count', 'is_active'
         ]
 
+    # Views annotate approved_rating_avg / approved_review_count so these
+    # fields don't cost two extra queries per product.
     def get_average_rating(self, obj):
-        from django.db.models import Avg
-        result = obj.reviews.filter(is_approved=True).aggregate(Avg('rating'))
-        return round(result['rating__avg'], 2) if result['rating__avg'] else None
+        if hasattr(obj, 'approved_rating_avg'):
+            avg = obj.approved_rating_avg
+        else:
+            from django.db.models import Avg
+            avg = obj.reviews.filter(is_approved=True).aggregate(Avg('rating'))['rating__avg']
+        return round(avg, 2) if avg else None
 
     def get_review_count(self, obj):
+        if hasattr(obj, 'approved_review_count'):
+            return obj.approved_review_count
         return obj.reviews.filter(is_approved=True).count()
 
 
@@ -0,0 +1,116 @@
+import json
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from catalog.models import Category, Product, Variant
+from orders.inventory import adjust_stock
+from orders.models import OrderItem
+from orders.tests import PrimaryDBTestCase, create_order
+from users.models import User
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+@mock.patch('config.rabbitmq.RabbitMQPublisher')
+class ConditionalGetTests(PrimaryDBTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.category = Category.objects.create(name='Shirts', slug='shirts')
+        self.product = Product.objects.create(
+            name='Shirt', slug='shirt', description='', category=self.category, base_price=Decimal('10.00'),
+        )
+        self.variant = Variant.objects.create(product=self.product, sku='SHIRT-M', stock_quantity=10)
+        self.client = APIClient()
+
+    def assertRevalidates(self, path):
+        """The ETag of a 200 for path, after checking a request with it gets a 304."""
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        revalidated = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], etag)
+        return etag
+
+    def assertChanged(self, path, etag):
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def import_catalog(self, *records):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as f:
+            f.writelines(json.dumps(record) + '\n' for record in records)
+            f.flush()
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('import_catalog', f.name, '--no-index', stdout=mock.Mock())
+
+    def test_product_detail_changes_with_stock(self, publisher_class):
+        path = '/api/catalog/products/shirt/'
+        etag = self.assertRevalidates(path)
+
+        order = create_order(User.objects.create_user(email='buyer@example.com', username='buyer', password='x'))
+        OrderItem.objects.create(
+            order=order, product=self.product, variant=self.variant, product_name='Shirt', sku='SHIRT-M',
+            quantity=2, unit_price=Decimal('10.00'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            adjust_stock(order.id, -1)
+
+        self.assertChanged(path, etag)
+        self.assertEqual(self.client.get(path).json()['variants'][0]['stock_quantity'], 8)
+
+    def test_product_detail_changes_with_import(self, publisher_class):
+        path = '/api/catalog/products/shirt/'
+        etag = self.assertRevalidates(path)
+
+        self.import_catalog({'name': 'Shirt', 'slug': 'shirt', 'category': 'Shirts', 'base_price': '12.00'})
+
+        self.assertChanged(path, etag)
+        self.assertEqual(self.client.get(path).json()['base_price'], '12.00')
+
+    def test_product_list_changes_with_stock_and_import(self, publisher_class):
+        path = '/api/catalog/products/'
+        etag = self.assertRevalidates(path)
+
+        order = create_order(User.objects.create_user(email='buyer@example.com', username='buyer', password='x'))
+        OrderItem.objects.create(
+            order=order, product=self.product, variant=self.variant, product_name='Shirt', sku='SHIRT-M',
+            quantity=1, unit_price=Decimal('10.00'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            adjust_stock(order.id, -1)
+        self.assertChanged(path, etag)
+
+        etag = self.assertRevalidates(path)
+        self.import_catalog({'name': 'Hoodie', 'slug': 'hoodie', 'category': 'Shirts', 'base_price': '30.00'})
+        self.assertChanged(path, etag)
+        self.assertEqual(self.client.get(path).json()['count'], 2)
+
+    def test_product_list_is_new_after_the_version_is_evicted(self, publisher_class):
+        path = '/api/catalog/products/'
+        etag = self.assertRevalidates(path)
+        cache.clear()
+        self.assertChanged(path, etag)
+
+    def test_category_detail_changes_with_the_category(self, publisher_class):
+        path = '/api/catalog/categories/shirts/'
+        etag = self.assertRevalidates(path)
+
+        self.category.description = 'All shirts'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+
+        self.assertChanged(path, etag)
+        self.assertEqual(self.client.get(path).json()['description'], 'All shirts')
+
+    def test_missing_resources_have_no_validators(self, publisher_class):
+        for path in ('/api/catalog/products/nope/', '/api/catalog/categories/nope/'):
+            response = self.client.get(path, HTTP_IF_NONE_MATCH='*')
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn('ETag', response)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -8,3 +9,14 @@ urlpatterns = [
     path('products/<slug:slug>/', views.ProductDetailView.as_view(), name='product-detail'),
     path('search/', views.ProductSearchView.as_view(), name='product-search'),
 ]
+
+if settings.ASYNC_VIEWS:
+    from . import async_views
+
+    urlpatterns = [
+        path('categories/', async_views.category_list, name='category-list'),
+        path('categories/<slug:slug>/', views.CategoryDetailView.as_view(), name='category-detail'),
+        path('products/', views.ProductListView.as_view(), name='product-list'),
+        path('products/<slug:slug>/', async_views.product_detail, name='product-detail'),
+        path('search/', async_views.product_search, name='product-search'),
+    ]
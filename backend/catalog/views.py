@@ -4,6 +4,8 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from django.core.cache import cache
+from django.db.models import Avg, Count, Q
+from .conditional import ConditionalGetMixin, category_validators, product_list_validators, product_validators
 from .models import Category, Product
 from .serializers import (
     CategorySerializer, ProductListSerializer, 
@@ -11,13 +13,71 @@ from .serializers import (
 )
 
 
+CATEGORIES_CACHE_KEY = 'categories_list'
+
+
+def annotate_review_stats(queryset):
+    approved = Q(reviews__is_approved=True)
+    return queryset.annotate(
+        approved_rating_avg=Avg('reviews__rating', filter=approved),
+        approved_review_count=Count('reviews', filter=approved),
+    )
+
+
+def parse_search_params(query_params):
+    filters = {}
+    if query_params.get('category'):
+        filters['category'] = query_params.get('category')
+    if query_params.get('brand'):
+        filters['brand'] = query_params.get('brand')
+    if query_params.get('min_price'):
+        filters['min_price'] = float(query_params.get('min_price'))
+    if query_params.get('max_price'):
+        filters['max_price'] = float(query_params.get('max_price'))
+    if query_params.get('in_stock'):
+        filters['in_stock'] = query_params.get('in_stock').lower() == 'true'
+
+    return {
+        'filters': filters if filters else None,
+        'sort_by': query_params.get('sort', '_score'),
+        'page': int(query_params.get('page', 1)),
+        'page_size': int(query_params.get('page_size', 20)),
+    }
+
+
+def unique_product_ids(es_results):
+    # Variants of the same product are indexed as separate documents
+    seen_product_ids = set()
+    product_ids = []
+    for result in es_results['results']:
+        product_id = result['product_id']
+        if product_id not in seen_product_ids:
+            seen_product_ids.add(product_id)
+            product_ids.append(product_id)
+    return product_ids
+
+
+def search_result_queryset(product_ids):
+    return Product.objects.filter(
+        id__in=product_ids,
+        is_active=True
+    ).select_related('brand', 'category').prefetch_related('images')
+
+
+def search_fallback_queryset(query):
+    return Product.objects.filter(
+        is_active=True,
+        name__icontains=query
+    ).select_related('brand', 'category').prefetch_related('images')[:50]
+
+
 class CategoryListView(generics.ListAPIView):
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
 
     def get_queryset(self):
-        cache_key = 'categories_list'
+        cache_key = CATEGORIES_CACHE_KEY
         cached_data = cache.get(cache_key)
         
         if cached_data is None:
@@ -28,14 +88,17 @@ class CategoryListView(generics.ListAPIView):
         return cached_data
 
 
-class CategoryDetailView(generics.RetrieveAPIView):
+class CategoryDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
     lookup_field = 'slug'
     permission_classes = [AllowAny]
 
+    def get_validators(self):
+        return category_validators(self.kwargs['slug'])
 
-class ProductListView(generics.ListAPIView):
+
+class ProductListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = ProductListSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['category', 'brand', 'has_variants']
@@ -46,20 +109,30 @@ class ProductListView(generics.ListAPIView):
     def get_queryset(self):
         return Product.objects.filter(is_active=True).select_related('brand', 'category').prefetch_related('images')
 
+    def get_validators(self):
+        return product_list_validators()
+
 
-class ProductDetailView(generics.RetrieveAPIView):
+class ProductDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     serializer_class = ProductDetailSerializer
     lookup_field = 'slug'
     permission_classes = [AllowAny]
 
     def get_queryset(self):
-        return Product.objects.filter(is_active=True).select_related(
-            'brand', 'category'
-        ).prefetch_related(
-            'images', 
-            'attribute_values__attribute',
-            'variants__attribute_values__attribute'
-        )
+        return product_detail_queryset()
+
+    def get_validators(self):
+        return product_validators(self.kwargs['slug'])
+
+
+def product_detail_queryset():
+    return annotate_review_stats(Product.objects.filter(is_active=True)).select_related(
+        'brand', 'category'
+    ).prefetch_related(
+        'images',
+        'attribute_values__attribute',
+        'variants__attribute_values__attribute'
+    )
 
 
 class ProductSearchView(APIView):
@@ -72,58 +145,22 @@ class ProductSearchView(APIView):
         if not query:
             return Response({'results': [], 'total': 0})
         
-        # Get filters from query params
-        filters = {}
-        if request.query_params.get('category'):
-            filters['category'] = request.query_params.get('category')
-        if request.query_params.get('brand'):
-            filters['brand'] = request.query_params.get('brand')
-        if request.query_params.get('min_price'):
-            filters['min_price'] = float(request.query_params.get('min_price'))
-        if request.query_params.get('max_price'):
-            filters['max_price'] = float(request.query_params.get('max_price'))
-        if request.query_params.get('in_stock'):
-            filters['in_stock'] = request.query_params.get('in_stock').lower() == 'true'
-        
-        # Get sorting and pagination params
-        sort_by = request.query_params.get('sort', '_score')
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 20))
+        params = parse_search_params(request.query_params)
+        page = params['page']
+        page_size = params['page_size']
         
         try:
             # Search using Elasticsearch
-            es_results = search_products(
-                query=query,
-                filters=filters if filters else None,
-                page=page,
-                page_size=page_size,
-                sort_by=sort_by
-            )
+            es_results = search_products(query=query, **params)
             
             # Get unique product IDs from ES results (deduplicate variants)
-            seen_product_ids = set()
-            unique_product_ids = []
-            for result in es_results['results']:
-                product_id = result['product_id']
-                if product_id not in seen_product_ids:
-                    seen_product_ids.add(product_id)
-                    unique_product_ids.append(product_id)
+            product_ids = unique_product_ids(es_results)
             
             # Fetch actual Product objects
-            products = Product.objects.filter(
-                id__in=unique_product_ids,
-                is_active=True
-            ).select_related('brand', 'category').prefetch_related('images')
-            
-            # Create a dict for quick lookup
-            products_dict = {p.id: p for p in products}
+            products_dict = {p.id: p for p in search_result_queryset(product_ids)}
             
             # Order products based on ES result order
-            ordered_products = []
-            for product_id in unique_product_ids:
-                product = products_dict.get(product_id)
-                if product:
-                    ordered_products.append(product)
+            ordered_products = [products_dict[pid] for pid in product_ids if pid in products_dict]
             
             # Serialize the products
             serializer = ProductListSerializer(ordered_products, many=True)
@@ -138,10 +175,7 @@ class ProductSearchView(APIView):
         except Exception as e:
             # Fallback to database search if Elasticsearch fails
             print(f"Elasticsearch error: {e}")
-            products = Product.objects.filter(
-                is_active=True,
-                name__icontains=query
-            ).select_related('brand', 'category').prefetch_related('images')[:50]
+            products = search_fallback_queryset(query)
             
             serializer = ProductListSerializer(products, many=True)
             return Response({
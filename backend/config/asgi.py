@@ -0,0 +1,7 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Serve the async catalog views (catalog/async_views.py) under ASGI
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+application = get_asgi_application()
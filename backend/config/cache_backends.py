@@ -0,0 +1,63 @@
+"""
+Cache backends that report lookups to config.request_timing (hits,
+misses and time per request) and trace them (config.tracing). The async
+API (aget etc.) goes through these methods, so it is counted too.
+"""
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from config import tracing
+from config.request_timing import record_cache_lookup, timed
+
+_missing = object()
+
+
+class InstrumentedCacheMixin:
+    cache_system = None
+
+    def traced(self, operation, **attributes):
+        return tracing.span(
+            f'cache {operation}', tracing.CLIENT,
+            attributes={'db.system': self.cache_system, 'db.operation': operation, **attributes},
+        )
+
+    def get(self, key, default=None, version=None):
+        with self.traced('get') as current:
+            started = time.perf_counter()
+            value = super().get(key, _missing, version)
+            record_cache_lookup(value is not _missing, time.perf_counter() - started)
+            if current is not None:
+                current.set_attribute('cache.hit', value is not _missing)
+        return default if value is _missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with self.traced('get_many', keys=len(keys)):
+            started = time.perf_counter()
+            values = super().get_many(keys, version)
+        seconds = (time.perf_counter() - started) / max(len(keys), 1)
+        for key in keys:
+            record_cache_lookup(key in values, seconds)
+        return values
+
+    def set(self, *args, **kwargs):
+        with self.traced('set'), timed('cache', count=0):
+            return super().set(*args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        with self.traced('add'), timed('cache', count=0):
+            return super().add(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with self.traced('delete'), timed('cache', count=0):
+            return super().delete(*args, **kwargs)
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    cache_system = 'redis'
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    cache_system = 'locmem'
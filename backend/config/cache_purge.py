@@ -0,0 +1,69 @@
+"""
+Purge hook for the nginx micro-cache on /api/catalog/ (nginx/nginx.conf).
+
+Stock nginx has no purge command, so a purge is a refresh: nginx's
+internal listener (CACHE_PURGE_URL, port 8081, never published) always
+fetches the page from Django and stores the result under the same cache
+key, replacing whatever was cached. A deleted or deactivated product is
+replaced by its 404.
+
+The cache key includes the public origin (scheme and host, since the
+responses contain absolute URLs) and whether the request had an Origin
+header (CORS headers differ), so each path is refreshed once per
+CACHE_PURGE_ORIGINS entry, with and without Origin.
+
+Runs in the SearchIndexWorker: after reindexing a changed product, and
+for the purge_cache events that product deletes and category saves and
+deletes publish (catalog/models.py), so requests never wait on nginx.
+Product list and search pages aren't purged: a bulk import would
+refresh them once per product. They follow the micro-cache TTL, and
+catalog/conditional.py makes each revalidation cheap.
+"""
+import logging
+import urllib.error
+import urllib.request
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from config import tracing
+
+logger = logging.getLogger(__name__)
+
+
+def product_paths(slug):
+    return [f'/api/catalog/products/{slug}/']
+
+
+def category_paths(slug):
+    return ['/api/catalog/categories/', f'/api/catalog/categories/{slug}/']
+
+
+def purge_paths(paths):
+    """Refresh the cached copies of `paths`; failures are logged, not raised."""
+    if not settings.CACHE_PURGE_URL or not paths:
+        return
+    with tracing.span('nginx purge', tracing.CLIENT, attributes={'purge.paths': ' '.join(paths)}):
+        for path in paths:
+            for origin in settings.CACHE_PURGE_ORIGINS:
+                public = urlsplit(origin)
+                for cors in (False, True):
+                    headers = {
+                        'Host': public.netloc,
+                        'X-Forwarded-Proto': public.scheme,
+                        'Accept': 'application/json',
+                    }
+                    if cors:
+                        headers['Origin'] = origin
+                    refresh(path, headers)
+
+
+def refresh(path, headers):
+    request = urllib.request.Request(settings.CACHE_PURGE_URL.rstrip('/') + path, headers=headers)
+    try:
+        urllib.request.urlopen(request, timeout=settings.CACHE_PURGE_TIMEOUT).close()
+    except urllib.error.HTTPError as e:
+        # 404 etc. are cached too: that is the purge of a removed page
+        e.close()
+    except Exception as e:
+        logger.warning(f"Failed to purge {path} from the nginx cache: {e}")
@@ -0,0 +1,40 @@
+from django.db import OperationalError
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from config.db_pool import PoolTimeout, get_pool
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    """
+    PostgreSQL backend that borrows connections from a per-alias pool
+    (settings_dict['POOL']) instead of opening one per request.
+
+    Django still "closes" the connection at the end of each request
+    (CONN_MAX_AGE=0); closing hands it back to the pool.
+    """
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.alias, self.settings_dict.get('POOL'))
+
+        def connect():
+            return super(DatabaseWrapper, self).get_new_connection(conn_params)
+
+        pool.prefill(connect)
+
+        # A recycled connection skips the parent's get_new_connection(),
+        # which is where the wrapper records its isolation level.
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = (
+            IsolationLevel(isolation_level) if isolation_level is not None
+            else IsolationLevel.READ_COMMITTED
+        )
+        try:
+            return pool.getconn(connect)
+        except PoolTimeout as e:
+            raise OperationalError(str(e)) from e
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # With the options: in a fresh fork this may create the pool
+                get_pool(self.alias, self.settings_dict.get('POOL')).putconn(self.connection)
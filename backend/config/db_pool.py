@@ -0,0 +1,240 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_OPTIONS = {
+    'MIN_SIZE': 2,
+    'MAX_SIZE': 10,
+    'MAX_LIFETIME': 1800,    # seconds before a connection is recycled
+    'TIMEOUT': 10,           # seconds to wait for a free connection
+    'CHECK_INTERVAL': 30,    # idle seconds after which a reused connection is pinged
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections for one database alias.
+
+    Connections are created lazily up to MAX_SIZE, recycled after
+    MAX_LIFETIME, pinged before reuse when they sat idle longer than
+    CHECK_INTERVAL, and rolled back before going back to the pool.
+    """
+    def __init__(self, alias, options=None):
+        options = {**DEFAULT_POOL_OPTIONS, **(options or {})}
+        self.alias = alias
+        self.pid = os.getpid()
+        self.min_size = options['MIN_SIZE']
+        self.max_size = options['MAX_SIZE']
+        self.max_lifetime = options['MAX_LIFETIME']
+        self.timeout = options['TIMEOUT']
+        self.check_interval = options['CHECK_INTERVAL']
+
+        self._cond = threading.Condition()
+        self._idle = deque()    # (connection, created_at, returned_at)
+        self._born = {}         # id(connection) -> created_at
+        self._size = 0
+        self._waiting = 0
+        self._prefill_started = False
+
+        self._stats = {
+            'requests': 0,
+            'requests_waited': 0,
+            'requests_timed_out': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+            'connections_created': 0,
+            'connections_closed': 0,
+            'health_checks_failed': 0,
+            'in_use_peak': 0,
+        }
+
+    def getconn(self, connect):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            conn = None
+            create = False
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['requests_timed_out'] += 1
+                        raise PoolTimeout(
+                            f"Timed out after {self.timeout}s waiting for a "
+                            f"connection to '{self.alias}' (max_size={self.max_size})"
+                        )
+                    waited = True
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+                if self._idle:
+                    conn, created_at, returned_at = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+
+            if create:
+                try:
+                    conn = connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._born[id(conn)] = time.monotonic()
+                    self._stats['connections_created'] += 1
+                break
+
+            if self._expired(created_at) or not self._healthy(conn, returned_at):
+                self._discard(conn)
+                continue
+            break
+
+        wait_ms = (time.monotonic() - started) * 1000
+        with self._cond:
+            stats = self._stats
+            stats['requests'] += 1
+            stats['wait_ms_total'] += wait_ms
+            stats['wait_ms_max'] = max(stats['wait_ms_max'], wait_ms)
+            if waited:
+                stats['requests_waited'] += 1
+            stats['in_use_peak'] = max(stats['in_use_peak'], self._size - len(self._idle))
+        return conn
+
+    def putconn(self, conn):
+        created_at = self._born.get(id(conn))
+        if created_at is None or conn.closed or self._expired(created_at) or not self._reset(conn):
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def prefill(self, connect):
+        """Open MIN_SIZE connections in the background, once per pool."""
+        with self._cond:
+            if self._prefill_started:
+                return
+            self._prefill_started = True
+        threading.Thread(target=self.fill, args=(connect,), daemon=True).start()
+
+    def fill(self, connect):
+        """Open connections until the pool holds at least MIN_SIZE."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = connect()
+            except Exception as e:
+                with self._cond:
+                    self._size -= 1
+                logger.warning(f"Could not pre-fill pool '{self.alias}': {e}")
+                return
+            with self._cond:
+                self._born[id(conn)] = time.monotonic()
+                self._stats['connections_created'] += 1
+                self._idle.append((conn, self._born[id(conn)], time.monotonic()))
+                self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            in_use = self._size - idle
+            return {
+                **self._stats,
+                'alias': self.alias,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': idle,
+                'in_use': in_use,
+                'waiting': self._waiting,
+                'saturation': round(in_use / self.max_size, 3) if self.max_size else 0,
+                'wait_ms_avg': round(self._stats['wait_ms_total'] / self._stats['requests'], 3)
+                if self._stats['requests'] else 0,
+            }
+
+    def _expired(self, created_at):
+        return bool(self.max_lifetime) and time.monotonic() - created_at > self.max_lifetime
+
+    def _healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not conn.autocommit:
+                conn.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats['health_checks_failed'] += 1
+            return False
+
+    def _reset(self, conn):
+        try:
+            # No round-trip unless the borrower left a transaction open
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            if self._born.pop(id(conn), None) is not None:
+                self._size -= 1
+            self._stats['connections_closed'] += 1
+            self._cond.notify()
+
+
+def get_pool(alias, options=None):
+    # Pools are per process: a forked worker must not reuse sockets
+    # inherited from its parent.
+    pool = _pools.get(alias)
+    if pool is None or pool.pid != os.getpid():
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None or pool.pid != os.getpid():
+                pool = _pools[alias] = ConnectionPool(alias, options)
+    return pool
+
+
+def get_pool_stats():
+    return {alias: pool.stats() for alias, pool in list(_pools.items())}
+
+
+def close_pools():
+    for pool in list(_pools.values()):
+        pool.close_all()
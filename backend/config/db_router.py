@@ -1,7 +1,12 @@
+from config.db_utils import PRIMARY_HINT, is_primary_forced
+
+
 class PrimaryReplicaRouter:
     def db_for_read(self, model, **hints):
         if hasattr(model, '_use_primary_db') and model._use_primary_db:
             return 'default'
+        if hints.get(PRIMARY_HINT) or is_primary_forced():
+            return 'default'
         return 'replica' if 'replica' in self.get_available_dbs() else 'default'
 
     def db_for_write(self, model, **hints):
@@ -12,7 +17,7 @@ class PrimaryReplicaRouter:
 
     def allow_migrate(self, db, app_label, model_name=None, **hints):
         return db == 'default'
-    
+
     def get_available_dbs(self):
         from django.conf import settings
         return settings.DATABASES.keys()
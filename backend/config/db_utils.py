@@ -1,41 +1,115 @@
+import asyncio
+from contextvars import ContextVar
 from functools import wraps
 
 
-def use_primary_db(func):
-    """
-    Decorator to force read from primary database for critical operations.
-    Use this for checkout, payment, and any operation requiring real-time data.
-    """
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        from django.db import connection
-        original_db = connection.alias
-        try:
-            return func(*args, **kwargs)
-        finally:
-            pass
-    return wrapper
+# Hint understood by PrimaryReplicaRouter.db_for_read, see primary_queryset()
+PRIMARY_HINT = 'use_primary'
+
+# Nesting depth of active primary-read overrides for the current thread/task.
+# A ContextVar keeps the override local to the request (or asyncio task)
+# that set it, so concurrent requests never leak routing into each other.
+_primary_depth = ContextVar('primary_db_depth', default=0)
+
+
+def is_primary_forced():
+    return _primary_depth.get() > 0
 
 
 class UsePrimaryDB:
     """
-    Context manager to force queries to use primary database.
-    
+    Context manager / decorator to force reads to use the primary database.
+    Overrides nest and are restored on exit, and work for both sync and
+    async code.
+
     Usage:
         with UsePrimaryDB():
             variant = Variant.objects.get(id=1)  # Reads from primary
+
+        @UsePrimaryDB()
+        def checkout(...):
+            ...
     """
+    def __init__(self):
+        self._tokens = []
+
     def __enter__(self):
+        self._tokens.append(_primary_depth.set(_primary_depth.get() + 1))
         return self
-    
+
     def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
+        _primary_depth.reset(self._tokens.pop())
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.__exit__(exc_type, exc_val, exc_tb)
+
+    def __call__(self, func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with UsePrimaryDB():
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with UsePrimaryDB():
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def use_primary_db(func):
+    """
+    Decorator to force read from primary database for critical operations.
+    Use this for checkout, payment, and any operation requiring real-time data.
+    """
+    return UsePrimaryDB()(func)
+
+
+class UsePrimaryDBMixin:
+    """
+    DRF view mixin routing every read made while handling the request
+    to the primary database.
+
+    Set `primary_db_methods` to limit the override to some HTTP methods,
+    e.g. ('post', 'patch').
+    """
+    primary_db_methods = None
+
+    def dispatch(self, request, *args, **kwargs):
+        methods = self.primary_db_methods
+        if methods is not None and request.method.lower() not in methods:
+            return super().dispatch(request, *args, **kwargs)
+        with UsePrimaryDB():
+            return super().dispatch(request, *args, **kwargs)
+
+
+def primary_queryset(queryset):
+    """
+    Route a single queryset (or a model's default manager) to the primary
+    database without locking and without affecting other queries.
+
+    Usage:
+        variants = primary_queryset(Variant).filter(product_id=1)
+        order = primary_queryset(Order.objects.filter(user=user)).first()
+    """
+    if not hasattr(queryset, '_add_hints'):
+        queryset = queryset._default_manager.all()
+    else:
+        queryset = queryset.all()
+    queryset._add_hints(**{PRIMARY_HINT: True})
+    return queryset
 
 
 def get_from_primary(model, **kwargs):
     """
     Helper to get object from primary database with SELECT FOR UPDATE lock.
-    
+    Must be called inside a transaction. Use primary_queryset() when
+    the row only needs to be fresh, not locked.
+
     Usage:
         variant = get_from_primary(Variant, id=1)
     """
@@ -45,7 +119,7 @@ def get_from_primary(model, **kwargs):
 def filter_from_primary(model, **kwargs):
     """
     Helper to filter objects from primary database.
-    
+
     Usage:
         variants = filter_from_primary(Variant, product_id=1)
     """
@@ -1,11 +1,44 @@
-from elasticsearch import Elasticsearch
+import asyncio
+import weakref
+
+from elasticsearch import AsyncElasticsearch, Elasticsearch
 from django.conf import settings
 
+from config.request_timing import timed
+
+# One AsyncElasticsearch per event loop: its HTTP session is bound to the
+# loop that created it.
+_async_clients = weakref.WeakKeyDictionary()
+
 
 def get_es_client():
+    if settings.SEARCH_BACKEND == 'memory':
+        from config.memory_search import InMemoryElasticsearch
+        return InMemoryElasticsearch()
     return Elasticsearch([settings.ELASTICSEARCH_URL])
 
 
+def get_async_es_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        if settings.SEARCH_BACKEND == 'memory':
+            from config.memory_search import AsyncInMemoryElasticsearch
+            client = AsyncInMemoryElasticsearch()
+        else:
+            client = AsyncElasticsearch([settings.ELASTICSEARCH_URL])
+        _async_clients[loop] = client
+    return client
+
+
+def es_call(operation, count=1):
+    """Time (config.request_timing) and trace (config.tracing) an Elasticsearch call."""
+    return timed(
+        'es', count, span=f'elasticsearch {operation}',
+        attributes={'db.system': 'elasticsearch', 'db.operation': operation, 'calls': count},
+    )
+
+
 def create_product_index():
     es = get_es_client()
     index_name = 'products'
@@ -82,13 +115,11 @@ def create_product_index():
     es.indices.create(index=index_name, body=mapping)
 
 
-def index_product(product):
-    from catalog.models import Variant
+def build_product_documents(product):
+    """Return the (doc_id, document) pairs indexed for a product."""
     from django.db.models import Avg
     
-    es = get_es_client()
-    index_name = 'products'
-    
+    documents = []
     brand_name = product.brand.name if product.brand else ''
     category_name = product.category.name
     
@@ -124,7 +155,7 @@ def index_product(product):
                 'created_at': product.created_at.isoformat()
             }
             
-            es.index(index=index_name, id=f"v_{variant.id}", document=doc)
+            documents.append((f"v_{variant.id}", doc))
     else:
         attributes = []
         for attr_value in product.attribute_values.all():
@@ -153,28 +184,85 @@ def index_product(product):
             'created_at': product.created_at.isoformat()
         }
         
-        es.index(index=index_name, id=f"p_{product.id}", document=doc)
+        documents.append((f"p_{product.id}", doc))
+    
+    return documents
 
 
-def delete_product_from_index(product_id):
+def index_product(product):
     es = get_es_client()
-    index_name = 'products'
+    for doc_id, doc in build_product_documents(product):
+        with es_call('index'):
+            es.index(index='products', id=doc_id, document=doc)
+
+
+def bulk_index_products(products, chunk_size=500):
+    """Index many products with the bulk API. Returns (indexed docs, errors)."""
+    from elasticsearch.helpers import bulk
+    
+    es = get_es_client()
+    if settings.SEARCH_BACKEND == 'memory':
+        indexed = 0
+        for product in products:
+            for doc_id, doc in build_product_documents(product):
+                es.index(index='products', id=doc_id, document=doc)
+                indexed += 1
+        return indexed, []
+    
+    def actions():
+        for product in products:
+            for doc_id, doc in build_product_documents(product):
+                yield {'_index': 'products', '_id': doc_id, '_source': doc}
+    
+    return bulk(es, actions(), chunk_size=chunk_size, raise_on_error=False)
+
+
+def bulk_delete_products(product_ids):
+    if not product_ids:
+        return
+    es = get_es_client()
+    with es_call('delete_by_query'):
+        es.delete_by_query(
+            index='products',
+            body={'query': {'terms': {'product_id': list(product_ids)}}}
+        )
+
+
+async def async_index_product(product):
+    from asgiref.sync import sync_to_async
     
-    query = {
+    documents = await sync_to_async(build_product_documents, thread_sensitive=False)(product)
+    es = get_async_es_client()
+    with es_call('index', count=len(documents)):
+        await asyncio.gather(*(
+            es.index(index='products', id=doc_id, document=doc)
+            for doc_id, doc in documents
+        ))
+
+
+def delete_product_query(product_id):
+    return {
         'query': {
             'term': {
                 'product_id': product_id
             }
         }
     }
-    
-    es.delete_by_query(index=index_name, body=query)
 
 
-def search_products(query, filters=None, page=1, page_size=20, sort_by='_score'):
+def delete_product_from_index(product_id):
     es = get_es_client()
-    index_name = 'products'
-    
+    with es_call('delete_by_query'):
+        es.delete_by_query(index='products', body=delete_product_query(product_id))
+
+
+async def async_delete_product_from_index(product_id):
+    es = get_async_es_client()
+    with es_call('delete_by_query'):
+        await es.delete_by_query(index='products', body=delete_product_query(product_id))
+
+
+def build_search_body(query, filters=None, page=1, page_size=20, sort_by='_score'):
     # Build the search query with both fuzzy and prefix matching
     search_query = {
         'bool': {
@@ -240,16 +328,32 @@ def search_products(query, filters=None, page=1, page_size=20, sort_by='_score')
     
     from_offset = (page - 1) * page_size
     
-    body = {
+    return {
         'query': search_query,
         'sort': sort,
         'from': from_offset,
         'size': page_size
     }
-    
-    result = es.search(index=index_name, body=body)
-    
+
+
+def parse_search_result(result):
     return {
         'total': result['hits']['total']['value'],
         'results': [hit['_source'] for hit in result['hits']['hits']]
     }
+
+
+def search_products(query, filters=None, page=1, page_size=20, sort_by='_score'):
+    es = get_es_client()
+    body = build_search_body(query, filters, page, page_size, sort_by)
+    with es_call('search'):
+        result = es.search(index='products', body=body)
+    return parse_search_result(result)
+
+
+async def async_search_products(query, filters=None, page=1, page_size=20, sort_by='_score'):
+    es = get_async_es_client()
+    body = build_search_body(query, filters, page, page_size, sort_by)
+    with es_call('search'):
+        result = await es.search(index='products', body=body)
+    return parse_search_result(result)
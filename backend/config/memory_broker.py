@@ -0,0 +1,266 @@
+"""
+In-process stand-in for RabbitMQ (BROKER_BACKEND=memory).
+
+connection() returns an object with the parts of pika's
+BlockingConnection/channel API that RabbitMQPublisher and worker.Worker
+use, so both run unchanged against queues held in this process. The
+Worker subclasses in worker.WORKER_TYPES are attached as consumers on
+first use; MEMORY_BROKER_MODE decides how messages reach them:
+
+    sync    delivered in the publishing thread as soon as they are
+            published (deterministic; a request runs its whole
+            event -> worker -> index pipeline before returning)
+    thread  one consumer thread per worker, like separate processes
+    manual  held until drain() is called (for tests)
+
+Retry queues honour x-message-ttl and dead-letter back to the main
+queue, so backoff behaves as it does in RabbitMQ.
+"""
+import itertools
+import logging
+import threading
+from collections import deque
+from types import SimpleNamespace
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryQueue:
+    def __init__(self, name, arguments=None):
+        self.name = name
+        self.arguments = arguments or {}
+        self.messages = deque()
+        self.consumers = []
+        self.next_consumer = itertools.cycle(())
+
+
+class MemoryBroker:
+    def __init__(self):
+        self.queues = {}
+        self.condition = threading.Condition()
+        self.delivery_tags = itertools.count(1)
+        self.workers = []
+        self.threads = []
+        self.started = False
+        self.start_lock = threading.Lock()
+
+    @property
+    def mode(self):
+        return settings.MEMORY_BROKER_MODE
+
+    def declare(self, name, arguments=None):
+        with self.condition:
+            queue = self.queues.get(name)
+            if queue is None:
+                queue = self.queues[name] = MemoryQueue(name, arguments)
+            elif arguments:
+                queue.arguments = arguments
+            return queue
+
+    def publish(self, routing_key, body, properties=None):
+        queue = self.declare(routing_key)
+        ttl = queue.arguments.get('x-message-ttl')
+        if ttl is not None and not queue.consumers:
+            # A retry queue: nothing consumes it, messages expire onto
+            # their dead-letter queue
+            timer = threading.Timer(
+                ttl / 1000, self.publish,
+                args=(queue.arguments.get('x-dead-letter-routing-key', routing_key), body, properties)
+            )
+            timer.daemon = True
+            timer.start()
+            return
+
+        with self.condition:
+            queue.messages.append((body, properties))
+            self.condition.notify_all()
+        if self.mode == 'sync':
+            self.drain(routing_key)
+
+    def consume(self, queue_name, channel, callback):
+        queue = self.declare(queue_name)
+        with self.condition:
+            queue.consumers.append((channel, callback))
+            queue.next_consumer = itertools.cycle(list(queue.consumers))
+        if self.mode == 'sync':
+            self.drain(queue_name)
+
+    def cancel(self, channel):
+        with self.condition:
+            for queue in self.queues.values():
+                queue.consumers = [consumer for consumer in queue.consumers if consumer[0] is not channel]
+                queue.next_consumer = itertools.cycle(list(queue.consumers))
+            self.condition.notify_all()
+
+    def take(self, queue_name, channel=None):
+        """Pop the next message for a consumer of the queue, or None."""
+        with self.condition:
+            queue = self.queues.get(queue_name)
+            if not queue or not queue.messages or not queue.consumers:
+                return None
+            if channel is None:
+                channel, callback = next(queue.next_consumer)
+            else:
+                callback = next((cb for ch, cb in queue.consumers if ch is channel), None)
+                if callback is None:
+                    return None
+            body, properties = queue.messages.popleft()
+        method = SimpleNamespace(delivery_tag=next(self.delivery_tags), routing_key=queue_name)
+        return channel, callback, method, properties, body
+
+    def drain(self, queue_name=None):
+        """
+        Deliver pending messages in the calling thread until the queue (or
+        every queue) is empty. Returns the number of messages handled.
+        """
+        handled = 0
+        while True:
+            names = [queue_name] if queue_name else list(self.queues)
+            delivery = next(filter(None, (self.take(name) for name in names)), None)
+            if delivery is None:
+                return handled
+            channel, callback, method, properties, body = delivery
+            callback(channel, method, properties, body)
+            handled += 1
+
+    def pending(self, queue_name):
+        queue = self.queues.get(queue_name)
+        return len(queue.messages) if queue else 0
+
+    def start_workers(self, worker_types=None):
+        """Attach one instance of each worker.Worker subclass as a consumer."""
+        with self.start_lock:
+            if self.started:
+                return self.workers
+            self.started = True
+
+            if worker_types is None:
+                from worker import WORKER_TYPES
+                worker_types = WORKER_TYPES.values()
+
+            for worker_type in worker_types:
+                worker = worker_type()
+                worker.connect()
+                worker.channel.basic_consume(queue=worker.queue_name, on_message_callback=worker.handle_message)
+                self.workers.append(worker)
+                if self.mode == 'thread':
+                    thread = threading.Thread(
+                        target=self._run_consumer, args=(worker,),
+                        name=f'memory-broker-{worker.queue_name}', daemon=True
+                    )
+                    thread.start()
+                    self.threads.append(thread)
+        logger.info(f"In-memory broker started {len(self.workers)} workers ({self.mode} mode)")
+        return self.workers
+
+    def _run_consumer(self, worker):
+        from django.db import connections
+        try:
+            worker.channel.start_consuming()
+        finally:
+            connections.close_all()
+
+    def stop_workers(self, timeout=5):
+        for worker in self.workers:
+            worker.should_stop = True
+            worker.channel.stop_consuming()
+            self.cancel(worker.channel)
+        for thread in self.threads:
+            thread.join(timeout)
+        self.workers, self.threads, self.started = [], [], False
+
+    def reset(self):
+        """Stop the workers and drop every queue (for tests)."""
+        self.stop_workers()
+        with self.condition:
+            self.queues.clear()
+
+
+broker = MemoryBroker()
+
+
+class MemoryChannel:
+    def __init__(self, connection):
+        self.connection = connection
+        self.consumer_queues = []
+        self.consuming = False
+
+    @property
+    def is_open(self):
+        return not self.connection.is_closed
+
+    @property
+    def is_closed(self):
+        return self.connection.is_closed
+
+    def queue_declare(self, queue, durable=False, arguments=None, **kwargs):
+        broker.declare(queue, arguments)
+        return SimpleNamespace(method=SimpleNamespace(queue=queue, message_count=broker.pending(queue)))
+
+    def basic_qos(self, prefetch_count=0, **kwargs):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, **kwargs):
+        broker.publish(routing_key, body, properties)
+
+    def basic_ack(self, delivery_tag=0, **kwargs):
+        pass
+
+    def basic_nack(self, delivery_tag=0, requeue=True, **kwargs):
+        pass
+
+    def basic_consume(self, queue, on_message_callback, **kwargs):
+        self.consumer_queues.append(queue)
+        broker.consume(queue, self, on_message_callback)
+
+    def start_consuming(self):
+        """Block delivering this channel's messages until stop_consuming()."""
+        self.consuming = True
+        while self.consuming:
+            delivery = None
+            with broker.condition:
+                while self.consuming and not any(broker.pending(name) for name in self.consumer_queues):
+                    broker.condition.wait(1)
+            for name in self.consumer_queues:
+                delivery = broker.take(name, channel=self)
+                if delivery:
+                    break
+            if delivery:
+                channel, callback, method, properties, body = delivery
+                callback(channel, method, properties, body)
+
+    def stop_consuming(self):
+        self.consuming = False
+        with broker.condition:
+            broker.condition.notify_all()
+
+    def close(self):
+        self.stop_consuming()
+
+
+class MemoryConnection:
+    def __init__(self):
+        self.is_closed = False
+
+    @property
+    def is_open(self):
+        return not self.is_closed
+
+    def channel(self):
+        return MemoryChannel(self)
+
+    def add_callback_threadsafe(self, callback):
+        callback()
+
+    def close(self):
+        self.is_closed = True
+
+
+def connection():
+    # Workers are attached on first use so a publish always has consumers
+    # to reach (except in manual mode, which waits for drain()).
+    if not broker.started:
+        broker.start_workers()
+    return MemoryConnection()
@@ -0,0 +1,274 @@
+"""
+In-process stand-in for Elasticsearch (SEARCH_BACKEND=memory).
+
+Documents live in a dict per index, shared by every client in the
+process. Only the part of the query DSL that config/elasticsearch.py
+sends is understood: bool (must/should/filter/minimum_should_match),
+multi_match (best_fields with fuzziness, phrase_prefix, and *wildcard*
+queries), term, terms and range, with sorting and from/size paging.
+Scores are a simple weighted token match, so result order is close to
+Elasticsearch's but not identical.
+"""
+import re
+import threading
+from copy import deepcopy
+
+_indices = {}
+_lock = threading.Lock()
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(value):
+    return TOKEN_RE.findall(str(value).lower()) if value is not None else []
+
+
+def reset():
+    """Drop every index (for tests)."""
+    with _lock:
+        _indices.clear()
+
+
+def _edit_distance(a, b, limit):
+    """Damerau-Levenshtein distance (transpositions count as one edit, as in Elasticsearch)."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+def _auto_fuzziness(term):
+    return 0 if len(term) <= 2 else 1 if len(term) <= 5 else 2
+
+
+def _field_value(doc, field):
+    # name.keyword etc. are the untokenised value of the parent field
+    if field.endswith('.keyword'):
+        field = field[:-len('.keyword')]
+    return doc.get(field)
+
+
+def _parse_fields(fields):
+    for field in fields:
+        name, _, boost = field.partition('^')
+        yield name, float(boost or 1)
+
+
+def _match_tokens(terms, tokens, fuzziness, prefix_length):
+    """Score how many query terms appear in the field's tokens."""
+    score = 0.0
+    for term in terms:
+        if term in tokens:
+            score += 1
+            continue
+        limit = _auto_fuzziness(term) if fuzziness == 'AUTO' else int(fuzziness or 0)
+        if limit and any(
+            token[:prefix_length] == term[:prefix_length] and _edit_distance(term, token, limit) <= limit
+            for token in tokens
+        ):
+            score += 0.5
+    return score
+
+
+def _multi_match(doc, spec):
+    query = spec['query']
+    match_type = spec.get('type', 'best_fields')
+    best = 0.0
+    for field, boost in _parse_fields(spec.get('fields', [])):
+        value = _field_value(doc, field)
+        if value is None:
+            continue
+        if '*' in query:
+            needle = query.strip('*').lower()
+            score = 1.0 if needle and needle in str(value).lower() else 0.0
+        elif match_type == 'phrase_prefix':
+            terms, tokens = tokenize(query), tokenize(value)
+            score = 0.0
+            if terms:
+                for start in range(len(tokens) - len(terms) + 1):
+                    window = tokens[start:start + len(terms)]
+                    if window[:-1] == terms[:-1] and window[-1].startswith(terms[-1]):
+                        score = float(len(terms))
+                        break
+        else:
+            score = _match_tokens(
+                tokenize(query), set(tokenize(value)), spec.get('fuzziness'), spec.get('prefix_length', 0)
+            )
+        best = max(best, score * boost)
+    return best * spec.get('boost', 1)
+
+
+def _range(value, bounds):
+    if value is None:
+        return False
+    checks = {
+        'gte': lambda bound: value >= bound,
+        'gt': lambda bound: value > bound,
+        'lte': lambda bound: value <= bound,
+        'lt': lambda bound: value < bound,
+    }
+    return all(checks[op](bound) for op, bound in bounds.items() if op in checks)
+
+
+def evaluate(doc, query):
+    """Return the document's score for the query, or None if it doesn't match."""
+    if not query or 'match_all' in query:
+        return 1.0
+    if 'term' in query:
+        field, expected = next(iter(query['term'].items()))
+        if isinstance(expected, dict):
+            expected = expected['value']
+        return 0.0 if _field_value(doc, field) == expected else None
+    if 'terms' in query:
+        field, values = next(iter(query['terms'].items()))
+        return 0.0 if _field_value(doc, field) in values else None
+    if 'range' in query:
+        field, bounds = next(iter(query['range'].items()))
+        return 0.0 if _range(_field_value(doc, field), bounds) else None
+    if 'multi_match' in query:
+        score = _multi_match(doc, query['multi_match'])
+        return score or None
+    if 'bool' in query:
+        clauses = query['bool']
+        score = 0.0
+        for clause in clauses.get('filter', []):
+            if evaluate(doc, clause) is None:
+                return None
+        for clause in clauses.get('must_not', []):
+            if evaluate(doc, clause) is not None:
+                return None
+        for clause in clauses.get('must', []):
+            clause_score = evaluate(doc, clause)
+            if clause_score is None:
+                return None
+            score += clause_score
+        should = clauses.get('should', [])
+        matched = 0
+        for clause in should:
+            clause_score = evaluate(doc, clause)
+            if clause_score is not None:
+                matched += 1
+                score += clause_score
+        required = clauses.get('minimum_should_match', 0 if clauses.get('must') or clauses.get('filter') else 1)
+        if should and matched < min(int(required), len(should)):
+            return None
+        return score
+    raise ValueError(f'Unsupported query: {sorted(query)}')
+
+
+def _sort_hits(hits, sort):
+    # Stable sorts applied from the last key to the first
+    for key in reversed(sort or [{'_score': 'desc'}]):
+        if isinstance(key, str):
+            field, order = key, 'desc' if key == '_score' else 'asc'
+        else:
+            field, order = next(iter(key.items()))
+            if isinstance(order, dict):
+                order = order.get('order', 'asc')
+        if field == '_score':
+            hits.sort(key=lambda hit: hit['_score'], reverse=order == 'desc')
+        else:
+            present = [hit for hit in hits if _field_value(hit['_source'], field) is not None]
+            missing = [hit for hit in hits if _field_value(hit['_source'], field) is None]
+            present.sort(key=lambda hit: _field_value(hit['_source'], field), reverse=order == 'desc')
+            hits[:] = present + missing
+
+
+class _Indices:
+    def exists(self, index, **kwargs):
+        return index in _indices
+
+    def create(self, index, body=None, **kwargs):
+        with _lock:
+            _indices.setdefault(index, {})
+        return {'acknowledged': True, 'index': index}
+
+    def delete(self, index, **kwargs):
+        with _lock:
+            _indices.pop(index, None)
+        return {'acknowledged': True}
+
+    def refresh(self, index=None, **kwargs):
+        return {}
+
+
+class InMemoryElasticsearch:
+    """The subset of the Elasticsearch client API the app uses."""
+
+    def __init__(self, *args, **kwargs):
+        self.indices = _Indices()
+
+    def index(self, index, id, document=None, body=None, **kwargs):
+        with _lock:
+            _indices.setdefault(index, {})[str(id)] = deepcopy(document if document is not None else body)
+        return {'_index': index, '_id': str(id), 'result': 'updated'}
+
+    def delete(self, index, id, **kwargs):
+        with _lock:
+            _indices.get(index, {}).pop(str(id), None)
+        return {'_index': index, '_id': str(id), 'result': 'deleted'}
+
+    def delete_by_query(self, index, body=None, query=None, **kwargs):
+        query = query or (body or {}).get('query')
+        with _lock:
+            docs = _indices.get(index, {})
+            matched = [doc_id for doc_id, doc in docs.items() if evaluate(doc, query) is not None]
+            for doc_id in matched:
+                del docs[doc_id]
+        return {'deleted': len(matched)}
+
+    def search(self, index, body=None, **kwargs):
+        body = {**(body or {}), **kwargs}
+        with _lock:
+            docs = list(_indices.get(index, {}).items())
+        hits = []
+        for doc_id, doc in docs:
+            score = evaluate(doc, body.get('query'))
+            if score is not None:
+                hits.append({'_index': index, '_id': doc_id, '_score': score, '_source': deepcopy(doc)})
+        _sort_hits(hits, body.get('sort'))
+        start = body.get('from', 0)
+        return {
+            'hits': {
+                'total': {'value': len(hits), 'relation': 'eq'},
+                'hits': hits[start:start + body.get('size', 10)],
+            }
+        }
+
+    def count(self, index, body=None, **kwargs):
+        return {'count': self.search(index, body=body, size=0)['hits']['total']['value']}
+
+    def close(self):
+        pass
+
+
+class AsyncInMemoryElasticsearch:
+    """Awaitable wrapper; the work is CPU-only, so it runs inline."""
+
+    def __init__(self, *args, **kwargs):
+        self._client = InMemoryElasticsearch()
+
+    async def index(self, *args, **kwargs):
+        return self._client.index(*args, **kwargs)
+
+    async def delete(self, *args, **kwargs):
+        return self._client.delete(*args, **kwargs)
+
+    async def delete_by_query(self, *args, **kwargs):
+        return self._client.delete_by_query(*args, **kwargs)
+
+    async def search(self, *args, **kwargs):
+        return self._client.search(*args, **kwargs)
+
+    async def close(self):
+        pass
@@ -0,0 +1,156 @@
+import logging
+import os
+from datetime import datetime
+
+from django.conf import settings
+from prometheus_client import (
+    REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess, start_http_server,
+)
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+WORKER_MESSAGES = Counter(
+    'worker_messages_total',
+    'Messages handled by workers, by outcome (success, retry, dlq)',
+    ['queue', 'task_name', 'outcome'],
+)
+WORKER_PROCESSING_SECONDS = Histogram(
+    'worker_processing_seconds',
+    'Time spent in process_message',
+    ['queue', 'task_name'],
+    buckets=LATENCY_BUCKETS,
+)
+WORKER_END_TO_END_SECONDS = Histogram(
+    'worker_end_to_end_seconds',
+    'Time from publish (created_at) to completion, including retries',
+    ['queue', 'task_name'],
+    buckets=LAG_BUCKETS,
+)
+WORKER_CONSUMER_LAG_SECONDS = Gauge(
+    'worker_consumer_lag_seconds',
+    'Age of the most recently received message when it was picked up',
+    ['queue'],
+    multiprocess_mode='livemax',
+)
+
+
+# Per-route request metrics, recorded by config.request_timing.RequestTimingMiddleware.
+# `route` is the URL pattern (e.g. /api/catalog/products/<slug:slug>/), not the path.
+HTTP_REQUESTS = Counter(
+    'http_requests_total',
+    'Requests handled, by route, method and status',
+    ['route', 'method', 'status'],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'Time spent in the Django middleware chain and view',
+    ['route', 'method'],
+    buckets=REQUEST_BUCKETS,
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'SQL queries per request, by database alias',
+    ['route', 'alias'],
+    buckets=COUNT_BUCKETS,
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds',
+    'Time in SQL per request, by database alias',
+    ['route', 'alias'],
+    buckets=REQUEST_BUCKETS,
+)
+HTTP_REQUEST_ES_SECONDS = Histogram(
+    'http_request_es_seconds',
+    'Time in Elasticsearch calls per request (requests that made any)',
+    ['route'],
+    buckets=REQUEST_BUCKETS,
+)
+HTTP_REQUEST_SERIALIZE_SECONDS = Histogram(
+    'http_request_serialize_seconds',
+    'Time in DRF serializers per request (requests that serialized anything)',
+    ['route'],
+    buckets=REQUEST_BUCKETS,
+)
+HTTP_REQUEST_ES_CALLS = Counter('http_request_es_calls_total', 'Elasticsearch calls made by requests', ['route'])
+HTTP_REQUEST_CACHE = Counter(
+    'http_request_cache_lookups_total', 'Cache lookups made by requests, by result (hit, miss)', ['route', 'result']
+)
+HTTP_REQUEST_BROKER_PUBLISHES = Counter(
+    'http_request_broker_publishes_total', 'Broker messages published by requests', ['route']
+)
+
+
+def observe_request(route, method, status, timings):
+    HTTP_REQUESTS.labels(route, method, status).inc()
+    HTTP_REQUEST_SECONDS.labels(route, method).observe(timings.elapsed)
+    # Every alias, so requests that skipped one (e.g. served from cache) count as 0
+    for alias in sorted(set(settings.DATABASES) | set(timings.db_aliases())):
+        HTTP_REQUEST_DB_QUERIES.labels(route, alias).observe(timings.counts[f'db-{alias}'])
+        HTTP_REQUEST_DB_SECONDS.labels(route, alias).observe(timings.seconds[f'db-{alias}'])
+    if timings.counts['es']:
+        HTTP_REQUEST_ES_CALLS.labels(route).inc(timings.counts['es'])
+        HTTP_REQUEST_ES_SECONDS.labels(route).observe(timings.seconds['es'])
+    if timings.seconds['serialize']:
+        HTTP_REQUEST_SERIALIZE_SECONDS.labels(route).observe(timings.seconds['serialize'])
+    for result in ('hit', 'miss'):
+        if timings.counts[f'cache-{result}']:
+            HTTP_REQUEST_CACHE.labels(route, result).inc(timings.counts[f'cache-{result}'])
+    if timings.counts['broker']:
+        HTTP_REQUEST_BROKER_PUBLISHES.labels(route).inc(timings.counts['broker'])
+
+
+def message_age(message):
+    # created_at is stamped by RabbitMQPublisher with datetime.utcnow()
+    created_at = message.get('created_at') if isinstance(message, dict) else None
+    if not created_at:
+        return None
+    try:
+        return max((datetime.utcnow() - datetime.fromisoformat(created_at)).total_seconds(), 0)
+    except ValueError:
+        return None
+
+
+def observe_received(queue, message):
+    age = message_age(message)
+    if age is not None:
+        WORKER_CONSUMER_LAG_SECONDS.labels(queue).set(age)
+
+
+def observe_handled(queue, message, outcome, duration):
+    task_name = (message.get('task_name') if isinstance(message, dict) else None) or 'unknown'
+    WORKER_MESSAGES.labels(queue, task_name, outcome).inc()
+    WORKER_PROCESSING_SECONDS.labels(queue, task_name).observe(duration)
+    if outcome == 'success':
+        age = message_age(message)
+        if age is not None:
+            WORKER_END_TO_END_SECONDS.labels(queue, task_name).observe(age)
+
+
+def metrics_registry():
+    # With PROMETHEUS_MULTIPROC_DIR set (worker_supervisor.py, gunicorn
+    # workers) every process writes its samples there; aggregate them all.
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def start_metrics_server(port=None):
+    """
+    Serve /metrics for this process. With PROMETHEUS_MULTIPROC_DIR set
+    (worker_supervisor.py) it aggregates every consumer process instead.
+    """
+    port = settings.WORKER_METRICS_PORT if port is None else port
+    if not port:
+        return
+    try:
+        start_http_server(port, registry=metrics_registry())
+        logger.info(f"Metrics available on :{port}/metrics")
+    except OSError as e:
+        logger.error(f"Could not start metrics server on port {port}: {e}")
@@ -0,0 +1,368 @@
+"""
+On-demand profiling of single requests, for staff.
+
+Send `X-Profile: cprofile` (deterministic, per-function times) or
+`X-Profile: sample` (a stack sampler, for flamegraphs), or the same as
+`?_profile=` on a request authenticated as a staff user. The request is
+served as usual under the profiler and the response gets an
+`X-Profile-Id` header. The profile is stored in PROFILE_DIR:
+
+    <id>.json     summary: top functions, every SQL query (slowest first),
+                  repeated statements (N+1 candidates), and EXPLAIN
+                  ANALYZE for the PROFILE_EXPLAIN_QUERIES slowest SELECTs
+    <id>.prof     cprofile: pstats dump (snakeviz, `python -m pstats`)
+    <id>.folded   sample: folded stacks (speedscope, flamegraph.pl)
+
+and served on /api/metrics/profiles/<id>/ (?download=1 for the raw file).
+
+At most PROFILE_RATE_LIMIT profiles run per PROFILE_RATE_WINDOW seconds
+across all processes (counted in the cache), and one at a time per
+process; requests over the limit are served unprofiled with
+`X-Profile: rate-limited`. SQL capture needs RequestTimingMiddleware.
+
+Under ASGI the profiler follows the request's sync thread, where sync
+views run. Async views share the event loop with other requests and are
+served unprofiled with `X-Profile: unsupported`.
+"""
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.urls import Resolver404, get_resolver
+
+from config.request_timing import current_timings, route_name, untimed
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+MODES = ('cprofile', 'sample')
+PROFILE_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+_local_slot = threading.Lock()
+
+
+def requested_mode(request):
+    mode = request.META.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+    if not mode:
+        return None
+    return mode if mode in MODES else 'cprofile'
+
+
+def is_staff(request):
+    # Session users (admin) come from AuthenticationMiddleware; API clients
+    # send a JWT, which DRF only authenticates inside the view.
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, InvalidToken):
+        return False
+    return bool(result and result[0].is_staff)
+
+
+def acquire_slot():
+    """Reserve a profile under the rate limits; release_slot() afterwards."""
+    if not _local_slot.acquire(blocking=False):
+        return False
+    window = settings.PROFILE_RATE_WINDOW
+    key = f'profiling:count:{int(time.time() // window)}'
+    cache.add(key, 0, window)
+    try:
+        allowed = cache.incr(key) <= settings.PROFILE_RATE_LIMIT
+    except ValueError:
+        # Expired between add() and incr()
+        allowed = False
+    if not allowed:
+        _local_slot.release()
+    return allowed
+
+
+def release_slot():
+    _local_slot.release()
+
+
+class StackSampler(threading.Thread):
+    """Sample one thread's Python stack every `interval` seconds."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+
+class Profile:
+    def __init__(self, request, mode):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.mode = mode
+        self.timings = current_timings()
+        self.profiler = None
+        self.sampler = None
+
+    def start(self):
+        if self.timings is not None:
+            self.timings.queries = []
+        self.started = time.perf_counter()
+        if self.mode == 'sample':
+            self.sampler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL)
+            self.sampler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        if self.profiler:
+            self.profiler.disable()
+        if self.sampler:
+            self.sampler.stop()
+        self.duration = time.perf_counter() - self.started
+        queries = self.timings.queries if self.timings is not None else []
+        if self.timings is not None:
+            self.timings.queries = None
+        return queries
+
+    def top_functions(self, limit=40):
+        if self.profiler:
+            stats = pstats.Stats(self.profiler)
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+            return [
+                {
+                    'function': f'{name} ({os.path.basename(filename)}:{line})',
+                    'calls': calls,
+                    'self_ms': round(tottime * 1000, 2),
+                    'cumulative_ms': round(cumtime * 1000, 2),
+                }
+                for (filename, line, name), (_, calls, tottime, cumtime, _) in rows
+            ]
+        inclusive, own = Counter(), Counter()
+        for stack, count in self.sampler.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+        total = sum(self.sampler.stacks.values()) or 1
+        return [
+            {
+                'function': frame,
+                'samples': count,
+                'inclusive_pct': round(count * 100 / total, 1),
+                'self_pct': round(own[frame] * 100 / total, 1),
+            }
+            for frame, count in inclusive.most_common(limit)
+        ]
+
+    def save(self, response, queries):
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        base = os.path.join(settings.PROFILE_DIR, self.id)
+        if self.profiler:
+            self.profiler.dump_stats(f'{base}.prof')
+        else:
+            with open(f'{base}.folded', 'w') as f:
+                f.writelines(f'{stack} {count}\n' for stack, count in self.sampler.stacks.items())
+
+        summary = {
+            'id': self.id,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'method': self.request.method,
+            'path': self.request.get_full_path(),
+            'route': route_name(self.request),
+            'status': response.status_code,
+            'mode': self.mode,
+            'duration_ms': round(self.duration * 1000, 2),
+            'functions': self.top_functions(),
+            'sql': sql_summary(queries),
+        }
+        with open(f'{base}.json', 'w') as f:
+            json.dump(summary, f, indent=2, default=str)
+        return summary
+
+
+def sql_summary(queries):
+    by_statement = Counter(sql for _, sql, _, _ in queries)
+    slowest = sorted(queries, key=lambda query: query[3], reverse=True)
+    explained = 0
+    rows = []
+    for alias, sql, params, seconds in slowest:
+        row = {'alias': alias, 'ms': round(seconds * 1000, 2), 'sql': sql, 'params': params}
+        if explained < settings.PROFILE_EXPLAIN_QUERIES and is_explainable(sql):
+            row['explain'] = explain(alias, sql, params)
+            explained += 1
+        rows.append(row)
+    return {
+        'count': len(queries),
+        'ms': round(sum(query[3] for query in queries) * 1000, 2),
+        'repeated': [
+            {'sql': sql, 'count': count} for sql, count in by_statement.most_common() if count > 1
+        ],
+        'queries': rows,
+    }
+
+
+def is_explainable(sql):
+    # EXPLAIN ANALYZE runs the statement: only plain reads, never locks or writes
+    statement = sql.lstrip().upper()
+    return statement.startswith('SELECT') and 'FOR UPDATE' not in statement and 'FOR SHARE' not in statement
+
+
+def explain(alias, sql, params):
+    connection = connections[alias]
+    if connection.vendor == 'postgresql':
+        prefix = connection.ops.explain_query_prefix(analyze=True, buffers=True)
+    else:
+        prefix = connection.ops.explain_query_prefix()
+    try:
+        with untimed(), connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f'EXPLAIN failed: {e}'
+
+
+def load_summary(profile_id):
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(settings.PROFILE_DIR, f'{profile_id}.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def list_summaries(limit=50):
+    try:
+        names = [name for name in os.listdir(settings.PROFILE_DIR) if name.endswith('.json')]
+    except FileNotFoundError:
+        return []
+    paths = sorted(
+        (os.path.join(settings.PROFILE_DIR, name) for name in names), key=os.path.getmtime, reverse=True
+    )[:limit]
+    summaries = []
+    for path in paths:
+        with open(path) as f:
+            summary = json.load(f)
+        summaries.append({
+            key: summary[key] for key in ('id', 'created_at', 'method', 'path', 'status', 'mode', 'duration_ms')
+        } | {'queries': summary['sql']['count']})
+    return summaries
+
+
+def raw_profile_path(profile_id):
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    for extension in ('prof', 'folded'):
+        path = os.path.join(settings.PROFILE_DIR, f'{profile_id}.{extension}')
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def is_async_view(request):
+    try:
+        match = get_resolver(getattr(request, 'urlconf', None)).resolve(request.path_info)
+    except Resolver404:
+        return False
+    return iscoroutinefunction(match.func)
+
+
+class ProfilerMiddleware:
+    """Profile staff requests that ask for it; see the module docstring."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = requested_mode(request)
+        if not mode or not is_staff(request):
+            return self.get_response(request)
+        if not acquire_slot():
+            response = self.get_response(request)
+            response['X-Profile'] = 'rate-limited'
+            return response
+        try:
+            profile = Profile(request, mode)
+            profile.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                queries = profile.stop()
+            return self.finish(profile, response, queries)
+        finally:
+            release_slot()
+
+    async def __acall__(self, request):
+        mode = requested_mode(request)
+        if not mode or not await sync_to_async(is_staff)(request):
+            return await self.get_response(request)
+        if is_async_view(request):
+            # The event loop runs other requests in between; a profile of
+            # it wouldn't be this request's
+            response = await self.get_response(request)
+            response['X-Profile'] = 'unsupported'
+            return response
+        if not await sync_to_async(acquire_slot)():
+            response = await self.get_response(request)
+            response['X-Profile'] = 'rate-limited'
+            return response
+        try:
+            # Under ASGI a sync view, and every sync middleware and ORM call
+            # of the request, runs in the request's one thread-sensitive
+            # thread: profile that thread, not the event loop.
+            profile = Profile(request, mode)
+            await sync_to_async(profile.start, thread_sensitive=True)()
+            try:
+                response = await self.get_response(request)
+            finally:
+                queries = await sync_to_async(profile.stop, thread_sensitive=True)()
+            return await sync_to_async(self.finish)(profile, response, queries)
+        finally:
+            release_slot()
+
+    def finish(self, profile, response, queries):
+        summary = profile.save(response, queries)
+        logger.info(
+            f"Profiled {summary['method']} {summary['path']} ({profile.mode}): "
+            f"{summary['duration_ms']}ms, {summary['sql']['count']} queries, id {profile.id}"
+        )
+        response['X-Profile-Id'] = profile.id
+        return response
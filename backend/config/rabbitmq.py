@@ -4,16 +4,28 @@ import uuid
 from datetime import datetime
 from django.conf import settings
 
+from config import tracing
+from config.request_timing import timed
+
+
+def open_connection():
+    if settings.BROKER_BACKEND == 'memory':
+        from config.memory_broker import connection
+        return connection()
+    return pika.BlockingConnection(pika.URLParameters(settings.RABBITMQ_URL))
+
 
 class RabbitMQPublisher:
     def __init__(self):
         self.connection = None
         self.channel = None
+        self.declared_queues = set()
     
     def connect(self):
-        parameters = pika.URLParameters(settings.RABBITMQ_URL)
-        self.connection = pika.BlockingConnection(parameters)
-        self.channel = self.connection.channel()
+        with timed('broker', count=0, span='rabbitmq connect', attributes={'messaging.system': 'rabbitmq'}):
+            self.connection = open_connection()
+            self.channel = self.connection.channel()
+        self.declared_queues = set()
     
     def close(self):
         if self.connection and not self.connection.is_closed:
@@ -23,25 +35,39 @@ class RabbitMQPublisher:
         if not self.channel or self.connection.is_closed:
             self.connect()
         
-        self.channel.queue_declare(queue=queue_name, durable=True)
+        if queue_name not in self.declared_queues:
+            self.channel.queue_declare(queue=queue_name, durable=True)
+            self.declared_queues.add(queue_name)
         
-        message = {
-            'task_name': task_name,
-            'job_id': str(uuid.uuid4()),
-            'payload': payload,
-            'created_at': datetime.utcnow().isoformat(),
-            'trace_id': trace_id or str(uuid.uuid4())
-        }
-        
-        self.channel.basic_publish(
-            exchange='',
-            routing_key=queue_name,
-            body=json.dumps(message),
-            properties=pika.BasicProperties(
-                delivery_mode=2,
-                content_type='application/json'
+        job_id = str(uuid.uuid4())
+        with tracing.span(
+            f'{queue_name} publish', tracing.PRODUCER,
+            attributes={
+                'messaging.system': 'rabbitmq',
+                'messaging.operation': 'publish',
+                'messaging.destination.name': queue_name,
+                'messaging.message.id': job_id,
+                'task_name': task_name,
+            },
+        ), timed('broker'):
+            # The consumer continues the trace from traceparent
+            message = tracing.inject({
+                'task_name': task_name,
+                'job_id': job_id,
+                'payload': payload,
+                'created_at': datetime.utcnow().isoformat(),
+                'trace_id': trace_id or tracing.current_trace_id() or str(uuid.uuid4())
+            })
+            
+            self.channel.basic_publish(
+                exchange='',
+                routing_key=queue_name,
+                body=json.dumps(message),
+                properties=pika.BasicProperties(
+                    delivery_mode=2,
+                    content_type='application/json'
+                )
             )
-        )
     
     def __enter__(self):
         self.connect()
@@ -68,6 +94,45 @@ def publish_product_event(product_id, event_type='update'):
         logger.error(f"Failed to publish product event: {e}")
 
 
+def publish_product_events(product_ids, event_type='update'):
+    """Publish one index event per distinct product over a single connection."""
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return
+    try:
+        with RabbitMQPublisher() as publisher:
+            for product_id in product_ids:
+                publisher.publish_event(
+                    queue_name='search.index_product',
+                    task_name='index_product',
+                    payload={
+                        'product_id': product_id,
+                        'event_type': event_type
+                    }
+                )
+    except Exception as e:
+        import logging
+        logger = logging.getLogger(__name__)
+        logger.error(f"Failed to publish product events: {e}")
+
+
+def publish_cache_purge(paths):
+    """Have the search worker purge `paths` from the nginx cache (config/cache_purge.py)."""
+    if not settings.CACHE_PURGE_URL or not paths:
+        return
+    try:
+        with RabbitMQPublisher() as publisher:
+            publisher.publish_event(
+                queue_name='search.index_product',
+                task_name='purge_cache',
+                payload={'paths': list(paths)}
+            )
+    except Exception as e:
+        import logging
+        logger = logging.getLogger(__name__)
+        logger.error(f"Failed to publish cache purge: {e}")
+
+
 def publish_order_event(order_id, event_type):
     try:
         with RabbitMQPublisher() as publisher:
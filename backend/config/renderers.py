@@ -0,0 +1,96 @@
+"""
+orjson-based JSON renderer, parser and response for the API.
+
+Drop-in replacements for DRF's JSONRenderer/JSONParser (and Django's
+JsonResponse in the async views) producing the same JSON: compact,
+UTF-8, U+2028/U+2029 escaped, datetimes in ISO 8601 with `Z` for UTC.
+orjson serializes dicts, lists, str/int/float subclasses, datetime,
+date, time and UUID in C; the rest goes through default() the way DRF's
+encoder does it (Decimal as a number, lazy strings, querysets, ...).
+benchmarks/json_render.py compares the two on a large product.
+"""
+import datetime
+import decimal
+
+import orjson
+from django.db.models.query import QuerySet
+from django.http import HttpResponse
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from django.utils.http import parse_header_parameters
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def default(obj):
+    """Types orjson doesn't handle natively; mirrors rest_framework.utils.encoders.JSONEncoder."""
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if isinstance(obj, decimal.Decimal):
+        # Serializer DecimalFields already render strings (COERCE_DECIMAL_TO_STRING)
+        return float(obj)
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, QuerySet):
+        return tuple(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, '__getitem__'):
+        try:
+            return dict(obj)
+        except (TypeError, ValueError):
+            pass
+    if hasattr(obj, '__iter__'):
+        return tuple(item for item in obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps(data, indent=False):
+    content = orjson.dumps(data, default=default, option=OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+    # Valid JSON but not valid JavaScript, like DRF's JSONRenderer
+    if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data, self.wants_indent(accepted_media_type, renderer_context or {}))
+
+    def wants_indent(self, accepted_media_type, renderer_context):
+        # `Accept: application/json; indent=4` pretty-prints; orjson only
+        # indents by two spaces
+        if accepted_media_type:
+            _, params = parse_header_parameters(accepted_media_type)
+            if 'indent' in params:
+                return params['indent'] not in ('', '0')
+        return bool(renderer_context.get('indent'))
+
+
+class ORJSONParser(BaseParser):
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as e:
+            raise ParseError(f'JSON parse error - {e}')
+
+
+class ORJSONResponse(HttpResponse):
+    """JsonResponse for plain Django views, rendered with orjson."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
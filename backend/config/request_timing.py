@@ -0,0 +1,249 @@
+"""
+Per-request performance instrumentation.
+
+RequestTimingMiddleware opens a RequestTimings for each request and the
+instrumented layers add to it:
+
+- SQL: a wrapper on every database connection (query count and time per
+  alias, so primary and replica show separately)
+- Elasticsearch: timed() around the calls in config/elasticsearch.py
+  (which also opens a tracing span, see config/tracing.py)
+- cache: the backends in config/cache_backends.py (hits, misses, time)
+- broker: RabbitMQPublisher connects and publishes
+- serialization: DRF serializer .data
+
+At the end of the request the totals go into a Server-Timing header
+(SERVER_TIMING), one log line on the 'request_timing' logger, and the
+per-route Prometheus metrics in config/metrics.py (GET /api/metrics/).
+"""
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+from config.tracing import CLIENT, current_trace_id, span as trace_span
+
+logger = logging.getLogger('request_timing')
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.counts = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.serializing = False
+        # Set to a list to capture (alias, sql, params, seconds) per query
+        # (config/profiling.py)
+        self.queries = None
+
+    def record(self, name, seconds, count=1):
+        self.counts[name] += count
+        self.seconds[name] += seconds
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def db_aliases(self):
+        return sorted(name[3:] for name in self.seconds if name.startswith('db-'))
+
+    def server_timing(self):
+        """Server-Timing header value (durations in milliseconds)."""
+        entries = []
+        for alias in self.db_aliases():
+            entries.append(
+                f'db-{alias};dur={self.seconds["db-" + alias] * 1000:.1f};desc="{self.counts["db-" + alias]} queries"'
+            )
+        if self.counts['es']:
+            entries.append(f'es;dur={self.seconds["es"] * 1000:.1f};desc="{self.counts["es"]} calls"')
+        if self.counts['cache-hit'] or self.counts['cache-miss'] or self.counts['cache']:
+            entries.append(
+                f'cache;dur={self.seconds["cache"] * 1000:.1f};'
+                f'desc="{self.counts["cache-hit"]} hits, {self.counts["cache-miss"]} misses"'
+            )
+        if self.counts['broker']:
+            entries.append(f'broker;dur={self.seconds["broker"] * 1000:.1f};desc="{self.counts["broker"]} publishes"')
+        if self.seconds['serialize']:
+            entries.append(f'serialize;dur={self.seconds["serialize"] * 1000:.1f}')
+        entries.append(f'total;dur={self.elapsed * 1000:.1f}')
+        return ', '.join(entries)
+
+    def log_fields(self):
+        fields = {'duration_ms': round(self.elapsed * 1000, 1)}
+        for alias in self.db_aliases():
+            fields[f'db_{alias}_queries'] = self.counts[f'db-{alias}']
+            fields[f'db_{alias}_ms'] = round(self.seconds[f'db-{alias}'] * 1000, 1)
+        fields.update({
+            'es_calls': self.counts['es'],
+            'es_ms': round(self.seconds['es'] * 1000, 1),
+            'cache_hits': self.counts['cache-hit'],
+            'cache_misses': self.counts['cache-miss'],
+            'broker_publishes': self.counts['broker'],
+            'serialize_ms': round(self.seconds['serialize'] * 1000, 1),
+        })
+        return fields
+
+
+def current_timings():
+    return _current.get()
+
+
+@contextmanager
+def timed(name, count=1, span=None, attributes=None):
+    """
+    Add the block's duration (and count) to the current request, if any.
+    With `span`, the block is also traced as a client span of that name.
+    """
+    with trace_span(span, CLIENT, attributes) if span else nullcontext():
+        timings = _current.get()
+        if timings is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings.record(name, time.perf_counter() - started, count)
+
+
+@contextmanager
+def untimed():
+    """Leave the block out of the current request's timings."""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def record_cache_lookup(hit, seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.record('cache', seconds, 0)
+        timings.counts['cache-hit' if hit else 'cache-miss'] += 1
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        alias = context['connection'].alias
+        timings.record(f'db-{alias}', seconds)
+        if timings.queries is not None:
+            timings.queries.append((alias, sql, None if many else params, seconds))
+
+
+def _install_execute_wrapper(sender, connection, **kwargs):
+    # connection_created fires on every (re)connect of the same wrapper
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def _timed_data(data):
+    def getter(self):
+        timings = _current.get()
+        # Serializer.data and ListSerializer.data call BaseSerializer.data;
+        # only the outermost call is timed.
+        if timings is None or timings.serializing:
+            return data.fget(self)
+        timings.serializing = True
+        started = time.perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            timings.serializing = False
+            timings.record('serialize', time.perf_counter() - started)
+    return property(getter)
+
+
+_installed = False
+
+
+def install():
+    """Hook the database connections and DRF serializers (once per process)."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from django.db import connections
+    from rest_framework import serializers
+
+    connection_created.connect(_install_execute_wrapper, dispatch_uid='request_timing')
+    # Connections opened before the middleware loaded
+    for alias in connections:
+        if connections[alias].connection is not None:
+            _install_execute_wrapper(None, connections[alias])
+
+    for cls in (serializers.BaseSerializer, serializers.Serializer, serializers.ListSerializer):
+        if 'data' in cls.__dict__:
+            cls.data = _timed_data(cls.__dict__['data'])
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return '/' + match.route if match.route else match.view_name
+
+
+class RequestTimingMiddleware:
+    """Collect per-request timings; see the module docstring."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        from config.metrics import observe_request
+
+        route = route_name(request)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = timings.server_timing()
+        fields = timings.log_fields()
+        trace_id = current_trace_id()
+        if trace_id:
+            fields['trace_id'] = trace_id
+        observe_request(route, request.method, response.status_code, timings)
+        logger.info(
+            f"{request.method} {route} {response.status_code} "
+            + ' '.join(f'{key}={value}' for key, value in fields.items()),
+            extra={'route': route, 'method': request.method, 'status': response.status_code, **fields},
+        )
+        return response
@@ -0,0 +1,405 @@
+"""
+Distributed tracing, OpenTelemetry-compatible.
+
+Spans follow the OpenTelemetry data model and W3C Trace Context, and are
+exported as OTLP/JSON, so any OTLP collector (Jaeger, Tempo, the
+OpenTelemetry Collector) can ingest them without extra dependencies:
+
+    TRACING_EXPORTER=file   one OTLP/JSON export request per line in TRACING_FILE
+    TRACING_EXPORTER=otlp   POST to TRACING_OTLP_ENDPOINT (OTLP/HTTP, JSON)
+
+Unset, tracing is off and span() is a no-op.
+
+What is traced:
+- TracingMiddleware: a server span per request, continuing an incoming
+  `traceparent` header
+- SQL statements (a connection execute wrapper), Elasticsearch calls and
+  broker connects (config.request_timing.timed), cache operations
+  (config/cache_backends.py)
+- RabbitMQPublisher.publish_event: a producer span; the message carries
+  its `traceparent` (and `trace_id`)
+- Worker.handle_message and the async runtime: a consumer span continuing
+  the message's trace, so publishes made while handling it (order ->
+  email) join the same trace
+
+Sampling is decided once per trace (TRACING_SAMPLE_RATE) and travels with
+the context. Spans are queued and exported in batches by a background
+thread; if the queue is full they are dropped rather than blocking.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import socket
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# OTLP SpanKind values
+INTERNAL, SERVER, CLIENT, PRODUCER, CONSUMER = 1, 2, 3, 4, 5
+STATUS_ERROR = 2
+
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+MAX_STATEMENT_LENGTH = 2000
+
+_current = ContextVar('trace_span', default=None)
+_service_name = None
+
+
+def enabled():
+    return settings.TRACING_EXPORTER in ('file', 'otlp')
+
+
+def set_service_name(name):
+    """Name this process's spans (worker.py sets worker-<type>)."""
+    global _service_name
+    _service_name = name
+
+
+class SpanContext:
+    def __init__(self, trace_id, span_id, sampled):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @classmethod
+    def from_traceparent(cls, value):
+        match = TRACEPARENT_RE.match((value or '').strip().lower())
+        if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+            return None
+        return cls(match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1)
+
+
+class Span(SpanContext):
+    def __init__(self, name, kind, parent=None, attributes=None):
+        if parent is None:
+            super().__init__(os.urandom(16).hex(), os.urandom(8).hex(), random.random() < settings.TRACING_SAMPLE_RATE)
+            self.parent_id = None
+        else:
+            super().__init__(parent.trace_id, os.urandom(8).hex(), parent.sampled)
+            self.parent_id = parent.span_id
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exc):
+        self.status = {'code': STATUS_ERROR, 'message': f'{type(exc).__name__}: {exc}'[:500]}
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        if self.sampled:
+            _exporter.submit(self)
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [otlp_attribute(key, value) for key, value in self.attributes.items() if value is not None],
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        if self.status:
+            span['status'] = self.status
+        return span
+
+
+def otlp_attribute(key, value):
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+def current_span():
+    return _current.get()
+
+
+def current_trace_id():
+    span = _current.get()
+    return span.trace_id if span is not None else None
+
+
+@contextmanager
+def span(name, kind=INTERNAL, attributes=None, parent=None):
+    """
+    Run the block in a new span, a child of `parent` (a SpanContext, e.g.
+    from a traceparent) or of the current span. Yields the Span, or None
+    when tracing is off or the trace isn't sampled.
+    """
+    if not enabled():
+        yield None
+        return
+    parent = parent or _current.get()
+    if parent is not None and not parent.sampled:
+        # Keep the unsampled context for propagation, record nothing
+        token = _current.set(parent) if parent is not _current.get() else None
+        try:
+            yield None
+        finally:
+            if token is not None:
+                _current.reset(token)
+        return
+    new = Span(name, kind, parent, attributes)
+    token = _current.set(new)
+    try:
+        yield new if new.sampled else None
+    except BaseException as e:
+        new.record_exception(e)
+        raise
+    finally:
+        _current.reset(token)
+        new.end()
+
+
+def inject(message):
+    """Add the current trace context to an outgoing message dict."""
+    current = _current.get()
+    if current is not None:
+        message['traceparent'] = current.traceparent
+    return message
+
+
+def extract(message):
+    """The SpanContext carried by a message dict or HTTP headers, if any."""
+    return SpanContext.from_traceparent(message.get('traceparent')) if isinstance(message, dict) else None
+
+
+@contextmanager
+def consumer_span(queue_name, message):
+    """Span for handling one broker message, continuing its trace."""
+    task_name = message.get('task_name') if isinstance(message, dict) else None
+    with span(
+        f'{queue_name} process', CONSUMER, parent=extract(message),
+        attributes={
+            'messaging.system': 'rabbitmq',
+            'messaging.operation': 'process',
+            'messaging.destination.name': queue_name,
+            'messaging.message.id': message.get('job_id') if isinstance(message, dict) else None,
+            'task_name': task_name,
+        },
+    ) as current:
+        yield current
+
+
+# SQL --------------------------------------------------------------------------
+
+def _execute_wrapper(execute, sql, params, many, context):
+    parent = _current.get()
+    if parent is None or not parent.sampled or not enabled():
+        return execute(sql, params, many, context)
+    connection = context['connection']
+    operation = sql.lstrip().split(' ', 1)[0].upper()
+    with span(
+        f'{operation} {connection.alias}', CLIENT,
+        attributes={
+            'db.system': connection.vendor,
+            'db.name': connection.settings_dict.get('NAME'),
+            'db.alias': connection.alias,
+            'db.operation': operation,
+            'db.statement': sql[:MAX_STATEMENT_LENGTH],
+            'db.executemany': many or None,
+        },
+    ):
+        return execute(sql, params, many, context)
+
+
+def _install_execute_wrapper(sender, connection, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+_installed = False
+
+
+def install():
+    """Trace SQL on every database connection (once per process)."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    from django.db import connections
+
+    connection_created.connect(_install_execute_wrapper, dispatch_uid='tracing')
+    for alias in connections:
+        if connections[alias].connection is not None:
+            _install_execute_wrapper(None, connections[alias])
+
+
+# Export ------------------------------------------------------------------------
+
+class BatchExporter:
+    """Queue finished spans; a daemon thread exports them in batches."""
+
+    def __init__(self):
+        self.queue = None
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def submit(self, finished):
+        self.ensure_started()
+        try:
+            self.queue.put_nowait(finished)
+        except queue.Full:
+            pass
+
+    def ensure_started(self):
+        # Per process: gunicorn forks workers after the app is loaded
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=settings.TRACING_QUEUE_SIZE)
+            self.thread = threading.Thread(target=self.run, name='trace-exporter', daemon=True)
+            self.pid = os.getpid()
+            self.thread.start()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + settings.TRACING_EXPORT_INTERVAL
+            while len(batch) < settings.TRACING_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            self.export(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    def flush(self):
+        if self.pid != os.getpid():
+            return
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.export(batch)
+            for _ in batch:
+                self.queue.task_done()
+        # And whatever batch the thread is exporting
+        self.queue.join()
+
+    def export(self, spans):
+        body = {
+            'resourceSpans': [{
+                'resource': {'attributes': [
+                    otlp_attribute('service.name', _service_name or settings.TRACING_SERVICE_NAME),
+                    otlp_attribute('host.name', socket.gethostname()),
+                    otlp_attribute('process.pid', os.getpid()),
+                ]},
+                'scopeSpans': [{
+                    'scope': {'name': 'config.tracing'},
+                    'spans': [finished.to_otlp() for finished in spans],
+                }],
+            }]
+        }
+        try:
+            if settings.TRACING_EXPORTER == 'file':
+                with self.lock, open(settings.TRACING_FILE, 'a') as f:
+                    f.write(json.dumps(body) + '\n')
+            else:
+                request = urllib.request.Request(
+                    settings.TRACING_OTLP_ENDPOINT, data=json.dumps(body).encode(),
+                    headers={'Content-Type': 'application/json'}, method='POST',
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+        except Exception as e:
+            logger.warning(f"Failed to export {len(spans)} spans: {e}")
+
+
+_exporter = BatchExporter()
+atexit.register(_exporter.flush)
+
+
+def flush():
+    """Export queued spans now (tests, short-lived commands)."""
+    _exporter.flush()
+
+
+class TracingMiddleware:
+    """A server span per request; see the module docstring."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+        self.get_response = get_response
+        install()
+        self.is_async = iscoroutinefunction(self.get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with self.request_span(request) as current:
+            response = self.get_response(request)
+            self.finish(request, response, current)
+        return response
+
+    async def __acall__(self, request):
+        with self.request_span(request) as current:
+            response = await self.get_response(request)
+            self.finish(request, response, current)
+        return response
+
+    def request_span(self, request):
+        return span(
+            f'{request.method} {request.path}', SERVER,
+            parent=SpanContext.from_traceparent(request.META.get('HTTP_TRACEPARENT')),
+            attributes={
+                'http.request.method': request.method,
+                'url.path': request.path,
+                'url.query': request.META.get('QUERY_STRING') or None,
+                'client.address': request.META.get('REMOTE_ADDR'),
+                'user_agent.original': request.META.get('HTTP_USER_AGENT'),
+            },
+        )
+
+    def finish(self, request, response, current):
+        from config.request_timing import route_name
+
+        if current is None:
+            return
+        route = route_name(request)
+        current.name = f'{request.method} {route}'
+        current.set_attribute('http.route', route)
+        current.set_attribute('http.response.status_code', response.status_code)
+        if response.status_code >= 500:
+            current.status = {'code': STATUS_ERROR}
+        response['X-Trace-Id'] = current.trace_id
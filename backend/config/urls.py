@@ -2,12 +2,17 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from config.views import DBPoolStatsView, MetricsView, ProfileDetailView, ProfileListView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/catalog/', include('catalog.urls')),
     path('api/orders/', include('orders.urls')),
     path('api/users/', include('users.urls')),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
+    path('api/metrics/db-pools/', DBPoolStatsView.as_view(), name='db-pool-stats'),
+    path('api/metrics/profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('api/metrics/profiles/<str:profile_id>/', ProfileDetailView.as_view(), name='profile-detail'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,80 @@
+import hmac
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import FileResponse, Http404, HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.permissions import BasePermission, IsAdminUser
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+# request.auth of a request carrying METRICS_TOKEN
+METRICS_SCRAPER = object()
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """
+    `Authorization: Bearer <METRICS_TOKEN>` for Prometheus, which has no
+    JWT. Other bearer tokens fall through to JWT authentication.
+    """
+
+    def authenticate(self, request):
+        token = settings.METRICS_TOKEN
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if token and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+            return AnonymousUser(), METRICS_SCRAPER
+        return None
+
+
+class IsMetricsScraper(BasePermission):
+    """Requests authenticated by MetricsTokenAuthentication."""
+
+    def has_permission(self, request, view):
+        return request.auth is METRICS_SCRAPER
+
+
+class DBPoolStatsView(APIView):
+    """Connection pool wait time and saturation for this process."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        from config.db_pool import get_pool_stats
+        return Response(get_pool_stats())
+
+
+class MetricsView(APIView):
+    """Per-route request metrics in the Prometheus text format."""
+    authentication_classes = [MetricsTokenAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    permission_classes = [IsAdminUser | IsMetricsScraper]
+
+    def get(self, request):
+        from config.metrics import metrics_registry
+        return HttpResponse(generate_latest(metrics_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+class ProfileListView(APIView):
+    """Recent request profiles stored by config.profiling.ProfilerMiddleware."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        from config.profiling import list_summaries
+        return Response(list_summaries())
+
+
+class ProfileDetailView(APIView):
+    """One profile's summary, or its raw pstats/folded file with ?download=1."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id):
+        from config.profiling import load_summary, raw_profile_path
+        if request.query_params.get('download'):
+            path = raw_profile_path(profile_id)
+            if path is None:
+                raise Http404
+            return FileResponse(open(path, 'rb'), as_attachment=True)
+        summary = load_summary(profile_id)
+        if summary is None:
+            raise Http404
+        return Response(summary)
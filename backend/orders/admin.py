@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem, Payment, Cart, CartItem
+from .models import Order, OrderItem, Payment, Cart, CartItem, OrderStatusTransition
 
 
 class OrderItemInline(admin.TabularInline):
@@ -14,13 +14,20 @@ class PaymentInline(admin.TabularInline):
     readonly_fields = ['created_at', 'updated_at']
 
 
+class OrderStatusTransitionInline(admin.TabularInline):
+    model = OrderStatusTransition
+    extra = 0
+    can_delete = False
+    readonly_fields = ['action', 'from_status', 'to_status', 'source', 'created_at']
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['order_number', 'user', 'status', 'payment_status', 'total', 'created_at']
     list_filter = ['status', 'payment_status', 'created_at']
     search_fields = ['order_number', 'user__email', 'shipping_full_name']
     readonly_fields = ['order_number', 'created_at', 'updated_at']
-    inlines = [OrderItemInline, PaymentInline]
+    inlines = [OrderItemInline, PaymentInline, OrderStatusTransitionInline]
 
 
 @admin.register(Payment)
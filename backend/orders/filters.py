@@ -0,0 +1,13 @@
+import django_filters
+
+from .models import Order
+
+
+class OrderHistoryFilter(django_filters.FilterSet):
+    status = django_filters.MultipleChoiceFilter(choices=Order.STATUS_CHOICES)
+    created_after = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
+
+    class Meta:
+        model = Order
+        fields = ['status', 'created_after', 'created_before']
@@ -0,0 +1,44 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _cache_key(user_id, key):
+    return f'idempotency:{user_id}:{key}'
+
+
+def fingerprint(data):
+    """Hash of a request body, telling a retry from another request reusing its key."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_response(user_id, key):
+    """The (status, data, fingerprint) stored for this key, or None."""
+    cached = cache.get(_cache_key(user_id, key))
+    if cached is not None and len(cached) == 2:
+        # Stored before fingerprints were
+        cached = (*cached, '')
+    return cached
+
+
+def store_response(user_id, key, status_code, data, request_fingerprint):
+    cache.set(
+        _cache_key(user_id, key), (status_code, data, request_fingerprint), settings.IDEMPOTENCY_KEY_TTL
+    )
+
+
+def acquire(user_id, key):
+    """
+    Mark a request with this key as in flight. Returns False if another
+    request holding the same key hasn't finished yet.
+    """
+    return cache.add(_cache_key(user_id, key) + ':lock', 1, settings.IDEMPOTENCY_LOCK_TIMEOUT)
+
+
+def release(user_id, key):
+    cache.delete(_cache_key(user_id, key) + ':lock')
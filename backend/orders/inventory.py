@@ -0,0 +1,75 @@
+from collections import defaultdict
+
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from catalog.models import Variant, touch_products
+from .models import OrderItem, ProcessedJob
+
+
+def claim_job(job_id, action, order_id):
+    """
+    Record that a queued job has been applied. Returns False when it
+    already was (a redelivery or DLQ replay), in which case the caller
+    must skip the work. Call inside the transaction doing the work so the
+    claim and the effect commit together.
+    """
+    if not job_id:
+        return True
+    _, created = ProcessedJob.objects.get_or_create(
+        job_id=job_id,
+        defaults={'action': action, 'order_id': order_id}
+    )
+    return created
+
+
+def adjust_stock(order_id, direction):
+    """
+    Apply every item of the order to variant stock with a single UPDATE:
+    direction=-1 takes stock, direction=1 returns it. The change is
+    computed in SQL (stock_quantity = stock_quantity +/- n), so concurrent
+    orders can't overwrite each other. Returns the touched product IDs.
+    """
+    quantities = defaultdict(int)
+    product_ids = set()
+    items = OrderItem.objects.filter(order_id=order_id, variant__isnull=False)
+    for variant_id, product_id, quantity in items.values_list('variant_id', 'product_id', 'quantity'):
+        quantities[variant_id] += quantity
+        product_ids.add(product_id)
+
+    if quantities:
+        delta = Case(
+            *[When(id=variant_id, then=Value(quantity)) for variant_id, quantity in quantities.items()],
+            output_field=IntegerField(),
+        )
+        Variant.objects.filter(id__in=quantities).update(
+            stock_quantity=F('stock_quantity') + delta * direction,
+            updated_at=timezone.now(),
+        )
+        # Stock shows on the product page; invalidates its ETag
+        touch_products(id__in=product_ids)
+    return product_ids
+
+
+def cancel_order(order, job_id=None, source=''):
+    """
+    Cancel an order (instance or ID) and return its stock in one
+    transaction. Returns False when the order could not be cancelled
+    (already cancelled, shipped or delivered) or the job was already
+    applied; stock is only restored by the caller that won the transition.
+    """
+    from django.db import transaction
+    from config.rabbitmq import publish_product_events
+    from .state_machine import transition
+
+    order_id = getattr(order, 'pk', order)
+    with transaction.atomic(using='default'):
+        if not transition(order, 'cancel', source=source):
+            return False
+        if not claim_job(job_id, 'cancel', order_id):
+            # Roll back the transition too; the first delivery owns it
+            transaction.set_rollback(True, using='default')
+            return False
+        product_ids = adjust_stock(order_id, 1)
+        transaction.on_commit(lambda: publish_product_events(product_ids), using='default')
+    return True
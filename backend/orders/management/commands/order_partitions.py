@@ -0,0 +1,86 @@
+import os
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from orders.models import Order
+from orders.partitioning import (
+    ORDER_KEYS_TABLE, PARTITIONED_MODELS, add_months, archive_partition, convert_table,
+    ensure_order_keys, ensure_partitions, get_cursor, is_partitioned, list_partitions, month_start,
+)
+
+
+class Command(BaseCommand):
+    help = 'Maintain monthly partitions of the order tables: create ahead, archive old ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert', action='store_true',
+            help='Convert unpartitioned order tables (locks them while rows are copied; run in a maintenance window)'
+        )
+        parser.add_argument(
+            '--months-ahead', type=int, default=settings.ORDER_PARTITION_MONTHS_AHEAD,
+            help='Keep partitions created this many months ahead'
+        )
+        parser.add_argument(
+            '--archive-after', type=int, metavar='MONTHS',
+            help='Detach, archive and drop partitions for months older than this'
+        )
+        parser.add_argument('--archive-dir', default=settings.ORDER_ARCHIVE_DIR)
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be done')
+
+    def handle(self, *args, **options):
+        try:
+            cursor = get_cursor()
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        this_month = month_start(date.today())
+        last_month = add_months(this_month, options['months_ahead'])
+
+        for model in PARTITIONED_MODELS:
+            table = model._meta.db_table
+            if not is_partitioned(cursor, table):
+                if not options['convert']:
+                    raise CommandError(f'{table} is not partitioned; run once with --convert')
+                self.stdout.write(f'Converting {table}...')
+                if not options['dry_run']:
+                    with transaction.atomic():
+                        convert_table(cursor, model, options['months_ahead'])
+                continue
+
+            if options['dry_run']:
+                self.stdout.write(f'{table}: would ensure partitions up to {last_month:%Y-%m}')
+            else:
+                with transaction.atomic():
+                    ensure_partitions(cursor, table, this_month, last_month)
+                    # Tables converted before the key table existed
+                    if model is Order and ensure_order_keys(cursor):
+                        self.stdout.write(f'{table}: created {ORDER_KEYS_TABLE}')
+                self.stdout.write(f'{table}: partitions ensured up to {last_month:%Y-%m}')
+
+        if options['archive_after'] is not None:
+            self.archive(cursor, this_month, options)
+
+        self.stdout.write(self.style.SUCCESS('Order partitions up to date'))
+
+    def archive(self, cursor, this_month, options):
+        if options['archive_after'] < 1:
+            raise CommandError('--archive-after must be at least 1 month')
+        cutoff = add_months(this_month, -options['archive_after'])
+        os.makedirs(options['archive_dir'], exist_ok=True)
+
+        # Orders last, so their items and payments never outlive them
+        for model in reversed(PARTITIONED_MODELS):
+            table = model._meta.db_table
+            for name, month in list_partitions(cursor, table):
+                if month >= cutoff:
+                    break
+                if options['dry_run']:
+                    self.stdout.write(f'Would archive {name}')
+                    continue
+                with transaction.atomic():
+                    rows = archive_partition(cursor, model, name, options['archive_dir'])
+                self.stdout.write(f'Archived {name} ({rows} rows)')
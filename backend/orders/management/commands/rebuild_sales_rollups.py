@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from orders.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the DailySales rollups from order items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD); default: all history')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD); default: today')
+
+    def handle(self, *args, **options):
+        start = end = None
+        try:
+            if options['start']:
+                start = parse_date(options['start'])
+            if options['end']:
+                end = parse_date(options['end'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if (options['start'] and not start) or (options['end'] and not end):
+            raise CommandError('Dates must be YYYY-MM-DD')
+
+        self.stdout.write('Rebuilding sales rollups...')
+        count = rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} rollup rows'))
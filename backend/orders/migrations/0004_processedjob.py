@@ -0,0 +1,24 @@
+# Generated by Django 5.0 on 2026-10-19 09:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_payment_status_migration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=64, unique=True)),
+                ('action', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='processed_jobs', to='orders.order')),
+            ],
+        ),
+    ]
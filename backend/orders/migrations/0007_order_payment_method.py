@@ -0,0 +1,34 @@
+# Generated by Django 5.0 on 2026-10-19 09:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_payment_method(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    Payment = apps.get_model('orders', 'Payment')
+    latest = Payment.objects.filter(order=OuterRef('pk')).order_by('-created_at').values('payment_method')[:1]
+    Order.objects.update(payment_method=Coalesce(Subquery(latest), Value('')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_idempotency_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='payment_method',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.RunPython(backfill_payment_method, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status', '-created_at'], name='order_user_status_created_idx'),
+        ),
+    ]
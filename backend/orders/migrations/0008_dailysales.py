@@ -0,0 +1,47 @@
+# Generated by Django 5.0 on 2026-10-19 09:50
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def mark_recorded_orders(apps, schema_editor):
+    # Counted by `manage.py rebuild_sales_rollups`
+    Order = apps.get_model('orders', 'Order')
+    Order.objects.filter(
+        status__in=['confirmed', 'processing', 'shipped', 'delivered']
+    ).update(sales_recorded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_payment_method'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='sales_recorded',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_recorded_orders, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('product', 'Product'), ('variant', 'Variant'), ('category', 'Category'), ('brand', 'Brand')], max_length=10)),
+                ('dimension_id', models.BigIntegerField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dimension', 'date'], name='orders_dail_dimensi_7809d0_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('dimension', 'dimension_id', 'date'), name='unique_daily_sales'),
+        ),
+    ]
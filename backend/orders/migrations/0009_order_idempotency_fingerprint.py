@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_dailysales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
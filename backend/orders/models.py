@@ -51,6 +51,13 @@ class Order(models.Model):
     billing_country = models.CharField(max_length=100)
     
     notes = models.TextField(blank=True)
+    # Copied from the checkout payment so order lists need no payments query
+    payment_method = models.CharField(max_length=20, blank=True, default='')
+    # Whether the order is currently counted in DailySales (see orders.rollups)
+    sales_recorded = models.BooleanField(default=False)
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True, editable=False)
+    # sha256 of the checkout request body; a reused key must send the same body
+    idempotency_fingerprint = models.CharField(max_length=64, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -60,6 +67,10 @@ class Order(models.Model):
             models.Index(fields=['order_number']),
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['status']),
+            models.Index(fields=['user', 'status', '-created_at'], name='order_user_status_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_order_idempotency_key'),
         ]
 
     def __str__(self):
@@ -68,7 +79,9 @@ class Order(models.Model):
     def save(self, *args, **kwargs):
         if not self.order_number:
             import uuid
-            self.order_number = f"ORD-{uuid.uuid4().hex[:12].upper()}"
+            from django.utils import timezone
+            # The month prefix lets lookups by number prune order partitions
+            self.order_number = f"ORD-{timezone.now():%y%m}-{uuid.uuid4().hex[:12].upper()}"
         super().save(*args, **kwargs)
 
 
@@ -156,3 +169,59 @@ class CartItem(models.Model):
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
+
+
+class OrderStatusTransition(models.Model):
+    """Append-only log of status changes made through orders.state_machine."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='transitions')
+    action = models.CharField(max_length=20)
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20)
+    source = models.CharField(max_length=20, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.order_id}: {self.from_status or '?'} -> {self.to_status}"
+
+
+class ProcessedJob(models.Model):
+    """Queue jobs already applied, so redelivered messages are skipped."""
+    job_id = models.CharField(max_length=64, unique=True)
+    action = models.CharField(max_length=50)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name='processed_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.action} {self.job_id}"
+
+
+class DailySales(models.Model):
+    """Per-day sales totals by product, variant, category, brand and overall."""
+    DIMENSION_CHOICES = [
+        ('total', 'Total'),
+        ('product', 'Product'),
+        ('variant', 'Variant'),
+        ('category', 'Category'),
+        ('brand', 'Brand'),
+    ]
+
+    date = models.DateField()
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    dimension_id = models.BigIntegerField()
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'dimension_id', 'date'], name='unique_daily_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['dimension', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.dimension}:{self.dimension_id}"
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OrderHistoryPagination(CursorPagination):
+    """
+    Keyset pagination over (user, -created_at): each page is an index range
+    scan from the cursor, so deep pages cost the same as the first.
+    """
+    ordering = '-created_at'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
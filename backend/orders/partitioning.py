@@ -0,0 +1,388 @@
+"""
+Monthly range partitioning of the order tables on Postgres.
+
+Partitioned tables need the partition key in every primary key and
+unique constraint, and other tables can't hold foreign keys to them, so
+converting a table:
+
+- makes the primary key (id, created_at), and adds created_at to the
+  unique constraints; indexes and constraints keep their names, which
+  Django's migrations refer to
+- keeps the unique order_number and (user_id, idempotency_key) global
+  in orders_order_keys, a plain table a trigger on orders_order keeps
+  in step
+- drops the database-level foreign keys that point at the table; Django
+  still applies on_delete itself, and archive_partition() archives the
+  referencing rows (status transitions, processed jobs) with the orders
+
+Everything else, including Django's view of the models, is unchanged.
+Looking an order up by ID alone probes every partition; order_lookup()
+adds its created_at when the caller knows it (queued order jobs carry
+it), and order_items_range() bounds item prefetches.
+"""
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+
+from .models import Order, OrderItem, Payment
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_MODELS = [Order, OrderItem, Payment]
+PARTITION_SUFFIX = re.compile(r'_p(\d{4})(\d{2})$')
+
+# Holds the unique keys of every order, which the partitioned parent can't
+# enforce itself
+ORDER_KEYS_TABLE = f'{Order._meta.db_table}_keys'
+
+# New order numbers carry their creation month (ORD-YYMM-...), which
+# lets lookups by number prune to a single partition.
+ORDER_NUMBER_MONTH = re.compile(r'^ORD-(\d{2})(\d{2})-')
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y%m}'
+
+
+def partition_month(name):
+    match = PARTITION_SUFFIX.search(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def order_number_range(order_number):
+    """created_at filters that pin an order number to its month, or {}."""
+    match = ORDER_NUMBER_MONTH.match(order_number or '')
+    if not match:
+        return {}
+    year, month = 2000 + int(match.group(1)), int(match.group(2))
+    if not 1 <= month <= 12:
+        return {}
+    start = date(year, month, 1)
+    end = add_months(start, 1)
+    # A day of slack either side: the number is stamped just before
+    # created_at and the two may straddle a month boundary.
+    return {
+        'created_at__gte': datetime(start.year, start.month, 1, tzinfo=dt_timezone.utc) - timedelta(days=1),
+        'created_at__lt': datetime(end.year, end.month, 1, tzinfo=dt_timezone.utc) + timedelta(days=1),
+    }
+
+
+def order_lookup(order_id, created_at=None):
+    """
+    Filters for one order by ID. With its created_at (a datetime, or the
+    ISO string a queued job carries) they include the partition key, so
+    only the order's partition is read.
+    """
+    if isinstance(created_at, str):
+        created_at = parse_datetime(created_at)
+    if created_at is None:
+        return {'id': order_id}
+    return {'id': order_id, 'created_at': created_at}
+
+
+def order_items_range(orders):
+    """
+    created_at filter for the items of `orders`. Items are never older
+    than their order, so item partitions before the oldest order's month
+    are skipped.
+    """
+    created = [order.created_at for order in orders]
+    return {'created_at__gte': min(created)} if created else {}
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+        [table]
+    )
+    return cursor.fetchone() is not None
+
+
+def list_partitions(cursor, table):
+    """[(partition name, month)] of the monthly partitions, oldest first."""
+    cursor.execute(
+        """
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        """,
+        [table]
+    )
+    partitions = [(name, partition_month(name)) for (name,) in cursor.fetchall()]
+    return sorted((p for p in partitions if p[1]), key=lambda p: p[1])
+
+
+def create_partition(cursor, table, month):
+    name = partition_name(table, month)
+    bounds = [month.isoformat(), add_months(month, 1).isoformat()]
+    default = f'{table}_default'
+    cursor.execute('SELECT to_regclass(%s) IS NULL AND to_regclass(%s) IS NOT NULL', [name, default])
+    if cursor.fetchone()[0]:
+        cursor.execute(f'SELECT 1 FROM "{default}" WHERE created_at >= %s AND created_at < %s LIMIT 1', bounds)
+        if cursor.fetchone():
+            move_from_default(cursor, table, name, bounds)
+            return name
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+        f'FOR VALUES FROM (%s) TO (%s)',
+        bounds
+    )
+    return name
+
+
+def move_from_default(cursor, table, name, bounds):
+    """
+    Create partition `name` for rows that landed in the default partition
+    while it was missing. Postgres won't add a partition the default holds
+    rows for, so the default is detached while they move. The rows move
+    into a plain table attached afterwards: inserting them through the
+    parent would fire the orders_order_keys trigger for keys already there.
+    """
+    default = f'{table}_default'
+    cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"')
+    cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM "{default}" WHERE created_at >= %s AND created_at < %s RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved',
+        bounds
+    )
+    logger.info(f"Moved {cursor.rowcount} rows of {table} from {default} to {name}")
+    cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', bounds)
+    cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT')
+
+
+def ensure_partitions(cursor, table, first_month, last_month):
+    created = []
+    month = first_month
+    while month <= last_month:
+        created.append(create_partition(cursor, table, month))
+        month = add_months(month, 1)
+    return created
+
+
+def ensure_order_keys(cursor):
+    """
+    Create orders_order_keys and the trigger filling it from the order
+    table, copying in the existing orders (which fails if they already
+    break the constraints). Returns False if it already existed.
+    """
+    table = Order._meta.db_table
+    cursor.execute('SELECT to_regclass(%s)', [ORDER_KEYS_TABLE])
+    if cursor.fetchone()[0] is not None:
+        return False
+
+    cursor.execute(
+        f"""
+        CREATE TABLE "{ORDER_KEYS_TABLE}" (
+            order_id bigint PRIMARY KEY,
+            created_at timestamp with time zone NOT NULL,
+            order_number text NOT NULL UNIQUE,
+            user_id bigint NOT NULL,
+            idempotency_key text,
+            UNIQUE (user_id, idempotency_key)
+        )
+        """
+    )
+    cursor.execute(
+        f'INSERT INTO "{ORDER_KEYS_TABLE}" '
+        f'SELECT id, created_at, order_number, user_id, idempotency_key FROM "{table}"'
+    )
+    # A clash raises the unique violation in the order's INSERT or UPDATE
+    cursor.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION "{ORDER_KEYS_TABLE}_sync"() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND (OLD.id, OLD.created_at, OLD.order_number, OLD.user_id, OLD.idempotency_key)
+                IS NOT DISTINCT FROM (NEW.id, NEW.created_at, NEW.order_number, NEW.user_id, NEW.idempotency_key) THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP <> 'INSERT' THEN
+                DELETE FROM "{ORDER_KEYS_TABLE}" WHERE order_id = OLD.id;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                INSERT INTO "{ORDER_KEYS_TABLE}"
+                VALUES (NEW.id, NEW.created_at, NEW.order_number, NEW.user_id, NEW.idempotency_key);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    cursor.execute(
+        f'CREATE TRIGGER "{ORDER_KEYS_TABLE}_sync" '
+        f'AFTER INSERT OR DELETE OR UPDATE OF id, created_at, order_number, user_id, idempotency_key '
+        f'ON "{table}" FOR EACH ROW EXECUTE FUNCTION "{ORDER_KEYS_TABLE}_sync"()'
+    )
+    logger.info(f"Created {ORDER_KEYS_TABLE} for {table}")
+    return True
+
+
+def dependent_tables(model):
+    """(table, column) of the unpartitioned tables with foreign keys to `model`."""
+    return [
+        (rel.related_model._meta.db_table, rel.field.column)
+        for rel in model._meta.related_objects
+        if not rel.many_to_many and rel.related_model not in PARTITIONED_MODELS
+    ]
+
+
+def table_indexes(cursor, table):
+    """
+    [(name, columns, primary key, unique constraint, definition)] of the
+    indexes on `table`, including those backing constraints.
+    """
+    cursor.execute(
+        """
+        SELECT i.relname,
+               ARRAY(
+                   SELECT a.attname FROM unnest(x.indkey) WITH ORDINALITY AS k(attnum, n)
+                   JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = k.attnum
+                   ORDER BY k.n
+               ),
+               x.indisprimary, c.contype = 'u', pg_get_indexdef(x.indexrelid)
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        LEFT JOIN pg_constraint c ON c.conindid = x.indexrelid AND c.conrelid = x.indrelid
+        WHERE x.indrelid = to_regclass(%s)
+        """,
+        [table]
+    )
+    return cursor.fetchall()
+
+
+def convert_table(cursor, model, months_ahead):
+    """
+    Replace a plain table with a partitioned one holding the same rows.
+    Indexes and constraints keep their names, which Django's migrations
+    refer to. Runs in the caller's transaction and locks the table until
+    commit.
+    """
+    table = model._meta.db_table
+    legacy = f'{table}_unpartitioned'
+
+    cursor.execute(f'SELECT min(created_at) FROM "{table}"')
+    oldest = cursor.fetchone()[0]
+    first_month = month_start(oldest) if oldest else month_start(date.today())
+    last_month = add_months(month_start(date.today()), months_ahead)
+
+    # Outgoing foreign keys (to products, variants, users...) are kept
+    cursor.execute(
+        """
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype = 'f'
+        """,
+        [table]
+    )
+    outgoing = cursor.fetchall()
+
+    # Incoming foreign keys can't reference a partitioned table
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE confrelid = to_regclass(%s) AND contype = 'f'",
+        [table]
+    )
+    for referencing, name in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE {referencing} DROP CONSTRAINT "{name}"')
+
+    # The new table takes over the index names, so the old table gives
+    # them up; it only has to be read once more
+    indexes = table_indexes(cursor, table)
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+    for name, _, primary_key, unique_constraint, _ in indexes:
+        if primary_key or unique_constraint:
+            cursor.execute(f'ALTER TABLE "{legacy}" DROP CONSTRAINT "{name}"')
+        else:
+            cursor.execute(f'DROP INDEX "{name}"')
+
+    cursor.execute(
+        f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING IDENTITY) '
+        f'PARTITION BY RANGE (created_at)'
+    )
+    # Indexes are created on the parent and cascade to partitions. Unique
+    # ones must include the partition key; orders_order_keys keeps the
+    # order's unique keys global.
+    for name, columns, primary_key, unique_constraint, definition in indexes:
+        if primary_key or unique_constraint:
+            if 'created_at' not in columns:
+                columns = [*columns, 'created_at']
+            kind = 'PRIMARY KEY' if primary_key else 'UNIQUE'
+            column_list = ', '.join(f'"{column}"' for column in columns)
+            cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {kind} ({column_list})')
+        else:
+            using = definition[definition.index(' USING '):]
+            cursor.execute(f'CREATE INDEX "{name}" ON "{table}"{using}')
+
+    ensure_partitions(cursor, table, first_month, last_month)
+    cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+    if model is Order:
+        # Before the copy, so the trigger fills it
+        ensure_order_keys(cursor)
+
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence(%s, 'id'), (SELECT coalesce(max(id), 0) + 1 FROM \"{table}\"), false)",
+        [table]
+    )
+
+    for name, definition in outgoing:
+        if any(f'REFERENCES {m._meta.db_table}(' in definition for m in PARTITIONED_MODELS):
+            continue
+        cursor.execute(f'ALTER TABLE "{legacy}" DROP CONSTRAINT "{name}"')
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+    cursor.execute(f'DROP TABLE "{legacy}"')
+    logger.info(f"Partitioned {table} from {first_month:%Y-%m} to {last_month:%Y-%m}")
+
+
+def archive_partition(cursor, model, name, directory):
+    """
+    Detach a partition of `model`'s table, write it to
+    <directory>/<name>.csv.gz and drop it. Rows of unpartitioned tables
+    referencing it go to <directory>/<name>.<table>.csv.gz and are
+    deleted, and archived orders leave orders_order_keys. Returns the
+    number of partition rows archived.
+    """
+    table = model._meta.db_table
+    cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+    cursor.execute(f'SELECT count(*) FROM "{name}"')
+    rows = cursor.fetchone()[0]
+    path = os.path.join(directory, f'{name}.csv.gz')
+    with gzip.open(path, 'wb') as archive:
+        cursor.copy_expert(f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER)', archive)
+
+    for dependent, column in dependent_tables(model):
+        selected = f'FROM "{dependent}" WHERE "{column}" IN (SELECT id FROM "{name}")'
+        with gzip.open(os.path.join(directory, f'{name}.{dependent}.csv.gz'), 'wb') as archive:
+            cursor.copy_expert(f'COPY (SELECT * {selected}) TO STDOUT WITH (FORMAT csv, HEADER)', archive)
+        cursor.execute(f'DELETE {selected}')
+        logger.info(f"Archived {cursor.rowcount} rows of {dependent} with {name}")
+    if model is Order:
+        # New order numbers carry their month, so they can't reuse these
+        cursor.execute(f'DELETE FROM "{ORDER_KEYS_TABLE}" WHERE order_id IN (SELECT id FROM "{name}")')
+
+    cursor.execute(f'DROP TABLE "{name}"')
+    logger.info(f"Archived {rows} rows of {name} to {path}")
+    return rows
+
+
+def get_cursor(using='default'):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        raise RuntimeError('Order partitioning requires PostgreSQL')
+    return connection.cursor()
@@ -0,0 +1,141 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connections, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySales, Order, OrderItem
+
+# DailySales dimension -> OrderItem field holding its ID ('total' is one row per day)
+DIMENSION_FIELDS = {
+    'total': None,
+    'product': 'product_id',
+    'variant': 'variant_id',
+    'category': 'product__category_id',
+    'brand': 'product__brand_id',
+}
+
+# Statuses that add an order to the rollups (+1) or take it out again (-1)
+STATUS_SALES_EFFECT = {
+    'confirmed': 1,
+    'cancelled': -1,
+    'refunded': -1,
+}
+
+
+def order_sales(order_id):
+    """[(date, dimension, dimension_id, units, revenue)] for one order."""
+    totals = defaultdict(lambda: [0, Decimal('0.00')])
+    items = OrderItem.objects.using('default').filter(order_id=order_id).values_list(
+        'order__created_at', 'quantity', 'total_price',
+        *[field for field in DIMENSION_FIELDS.values() if field]
+    )
+    for created_at, quantity, total_price, *ids in items:
+        day = timezone.localdate(created_at)
+        keys = [('total', 0)] + list(zip(list(DIMENSION_FIELDS)[1:], ids))
+        for dimension, dimension_id in keys:
+            if dimension_id is None:
+                continue
+            total = totals[(day, dimension, dimension_id)]
+            total[0] += quantity
+            total[1] += total_price
+    # Sorted so concurrent upserts take row locks in the same order
+    return sorted((*key, units, revenue) for key, (units, revenue) in totals.items())
+
+
+def _apply(rows, sign):
+    table = DailySales._meta.db_table
+    sql = (
+        f'INSERT INTO {table} (date, dimension, dimension_id, units, revenue, order_count) '
+        f'VALUES (%s, %s, %s, %s, %s, %s) '
+        f'ON CONFLICT (dimension, dimension_id, date) DO UPDATE SET '
+        f'units = {table}.units + EXCLUDED.units, '
+        f'revenue = {table}.revenue + EXCLUDED.revenue, '
+        f'order_count = {table}.order_count + EXCLUDED.order_count'
+    )
+    params = [
+        (day, dimension, dimension_id, sign * units, sign * revenue, sign)
+        for day, dimension, dimension_id, units, revenue in rows
+    ]
+    with connections['default'].cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def record_order_sales(order_id, sign):
+    """
+    Add (sign=1) or remove (sign=-1) an order's items in the rollups.
+    Order.sales_recorded is flipped with a conditional update first, so
+    an order is counted at most once however often this is called. Run it
+    in the transaction that changes the order's status.
+    """
+    flipped = Order.objects.filter(id=order_id, sales_recorded=sign < 0).update(
+        sales_recorded=sign > 0
+    )
+    if not flipped:
+        return False
+    _apply(order_sales(order_id), sign)
+    return True
+
+
+def rebuild(start=None, end=None):
+    """
+    Recompute the rollups from OrderItem for [start, end] (dates, both
+    optional) in one transaction. Returns the number of rows written.
+    """
+    items = OrderItem.objects.using('default').filter(order__sales_recorded=True).annotate(
+        day=TruncDate('order__created_at')
+    )
+    existing = DailySales.objects.using('default')
+    if start:
+        items = items.filter(day__gte=start)
+        existing = existing.filter(date__gte=start)
+    if end:
+        items = items.filter(day__lte=end)
+        existing = existing.filter(date__lte=end)
+
+    rows = []
+    for dimension, field in DIMENSION_FIELDS.items():
+        group_by = ['day', field] if field else ['day']
+        aggregates = items.values(*group_by).annotate(
+            units=Sum('quantity'),
+            revenue=Sum('total_price'),
+            orders=Count('order', distinct=True),
+        )
+        if field:
+            aggregates = aggregates.filter(**{f'{field}__isnull': False})
+        rows.extend(
+            DailySales(
+                date=row['day'],
+                dimension=dimension,
+                dimension_id=row[field] if field else 0,
+                units=row['units'],
+                revenue=row['revenue'],
+                order_count=row['orders'],
+            )
+            for row in aggregates
+        )
+
+    with transaction.atomic(using='default'):
+        existing.delete()
+        DailySales.objects.using('default').bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def top_sellers(dimension, start, end, limit=10):
+    return list(
+        DailySales.objects.filter(dimension=dimension, date__gte=start, date__lte=end)
+        .values('dimension_id')
+        .annotate(units=Sum('units'), revenue=Sum('revenue'), orders=Sum('order_count'))
+        .filter(units__gt=0)
+        .order_by('-revenue')[:limit]
+    )
+
+
+def time_series(dimension, dimension_id, start, end):
+    return list(
+        DailySales.objects.filter(
+            dimension=dimension, dimension_id=dimension_id, date__gte=start, date__lte=end
+        ).order_by('date').values('date', 'units', 'revenue', 'order_count')
+    )
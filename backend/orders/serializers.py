@@ -28,8 +28,7 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ['order_number', 'created_at']
     
     def get_payment_method(self, obj):
-        payment = obj.payments.first()
-        return payment.payment_method if payment else None
+        return obj.payment_method or None
 
 
 class OrderCreateSerializer(serializers.Serializer):
@@ -0,0 +1,73 @@
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderStatusTransition
+from .partitioning import order_lookup
+from .rollups import STATUS_SALES_EFFECT, record_order_sales
+
+logger = logging.getLogger(__name__)
+
+# action -> (statuses it may start from, resulting status)
+TRANSITIONS = {
+    'confirm': (('pending',), 'confirmed'),
+    'process': (('confirmed',), 'processing'),
+    'ship': (('confirmed', 'processing'), 'shipped'),
+    'deliver': (('shipped',), 'delivered'),
+    'cancel': (('pending', 'confirmed', 'processing'), 'cancelled'),
+    'refund': (('delivered', 'cancelled'), 'refunded'),
+}
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def allowed_actions(status):
+    return [action for action, (sources, _) in TRANSITIONS.items() if status in sources]
+
+
+def transition(order, action, source=''):
+    """
+    Move an order (instance or ID) through `action`. The order row is
+    locked with SELECT status ... FOR UPDATE, so the logged from_status is
+    the status the change was really made from, and of two concurrent
+    callers the second waits and then sees the new status. The UPDATE
+    writes only the status and updated_at columns. The transition log and
+    sales rollups are updated in the same transaction. Returns True if
+    this call made the change, False if the order was not in an allowed
+    status (or already moved on).
+    """
+    if action not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown order action '{action}'")
+    sources, target = TRANSITIONS[action]
+
+    if isinstance(order, Order):
+        order_id = order.pk
+        # created_at limits partitioned tables to the order's partition
+        lookup = order_lookup(order_id, order.created_at)
+    else:
+        order_id = order
+        lookup = order_lookup(order_id)
+    now = timezone.now()
+    with transaction.atomic(using='default'):
+        from_status = Order.objects.select_for_update().filter(**lookup).values_list('status', flat=True).first()
+        if from_status not in sources:
+            return False
+        Order.objects.filter(**lookup, status=from_status).update(status=target, updated_at=now)
+
+        if isinstance(order, Order):
+            order.status = target
+            order.updated_at = now
+        OrderStatusTransition.objects.create(
+            order_id=order_id,
+            action=action,
+            from_status=from_status,
+            to_status=target,
+            source=source,
+        )
+        if target in STATUS_SALES_EFFECT:
+            record_order_sales(order_id, STATUS_SALES_EFFECT[target])
+    logger.info(f"Order {order_id}: {action} -> {target}")
+    return True
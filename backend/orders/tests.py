@@ -0,0 +1,369 @@
+import csv
+import gzip
+import os
+import tempfile
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from catalog.models import Category, Product, Variant
+from config.db_utils import UsePrimaryDB
+from orders.models import Cart, CartItem, Order, OrderItem, OrderStatusTransition, Payment, ProcessedJob
+from orders.partitioning import (
+    ORDER_KEYS_TABLE, PARTITIONED_MODELS, add_months, is_partitioned, list_partitions, month_start, partition_name,
+)
+from orders.state_machine import InvalidTransition, transition
+from users.models import Address, User
+
+
+def create_order(user, **fields):
+    address = {
+        f'{kind}_{field}': value
+        for kind in ('shipping', 'billing')
+        for field, value in {
+            'full_name': 'Test Customer', 'phone': '5550100', 'address_line1': '1 Main St',
+            'city': 'Springfield', 'state': 'IL', 'postal_code': '62701', 'country': 'US',
+        }.items()
+    }
+    return Order.objects.create(user=user, subtotal=Decimal('20.00'), total=Decimal('20.00'), **address, **fields)
+
+
+class PrimaryDBTestCase(TestCase):
+    """Reads go to the primary, so tests see their writes when a replica is configured."""
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(UsePrimaryDB())
+
+
+class TransitionTests(PrimaryDBTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email='buyer@example.com', username='buyer', password='x')
+        self.order = create_order(self.user)
+
+    def test_id_based_transition_logs_the_source_status(self):
+        self.assertTrue(transition(self.order.id, 'confirm'))
+        self.assertTrue(transition(self.order.id, 'ship'))
+
+        log = list(OrderStatusTransition.objects.filter(order=self.order).values_list('from_status', 'to_status'))
+        self.assertEqual(log, [('pending', 'confirmed'), ('confirmed', 'shipped')])
+
+    def test_stale_instance_loses_to_a_concurrent_transition(self):
+        stale = Order.objects.get(id=self.order.id)
+        self.assertTrue(transition(self.order.id, 'cancel', source='api'))
+
+        self.assertFalse(transition(stale, 'confirm', source='worker'))
+        self.assertEqual(stale.status, 'pending')
+        self.assertEqual(Order.objects.get(id=self.order.id).status, 'cancelled')
+        self.assertEqual(
+            list(OrderStatusTransition.objects.filter(order=self.order).values_list('action', 'from_status')),
+            [('cancel', 'pending')],
+        )
+
+    def test_repeated_transition_is_a_no_op(self):
+        self.assertTrue(transition(self.order, 'confirm'))
+        self.assertFalse(transition(self.order.id, 'confirm'))
+        self.assertEqual(OrderStatusTransition.objects.filter(order=self.order).count(), 1)
+
+    def test_unknown_action(self):
+        with self.assertRaises(InvalidTransition):
+            transition(self.order.id, 'teleport')
+
+
+@mock.patch('config.rabbitmq.RabbitMQPublisher')
+class OrderProcessingReplayTests(PrimaryDBTestCase):
+    def setUp(self):
+        from worker import OrderProcessingWorker
+
+        super().setUp()
+        self.worker = OrderProcessingWorker()
+        self.user = User.objects.create_user(email='buyer@example.com', username='buyer', password='x')
+        self.order = create_order(self.user)
+
+    def process(self, job_id, action):
+        self.worker.process_message({'job_id': job_id, 'payload': {
+            'order_id': self.order.id, 'created_at': self.order.created_at.isoformat(), 'action': action,
+        }})
+
+    def test_confirmation_email_is_sent_on_retry_after_a_failed_publish(self, publisher_class):
+        publish_event = publisher_class.return_value.__enter__.return_value.publish_event
+        publish_event.side_effect = [ConnectionError('broker down'), None]
+
+        with self.assertLogs('worker', 'ERROR'), self.assertRaises(ConnectionError):
+            self.process('job-1', 'confirm')
+        self.assertEqual(Order.objects.get(id=self.order.id).status, 'confirmed')
+
+        # The redelivery finds the order confirmed but the email unsent
+        with self.assertLogs('worker', 'WARNING'):
+            self.process('job-1', 'confirm')
+        self.assertEqual(publish_event.call_count, 2)
+        self.assertEqual(publish_event.call_args.kwargs['payload']['order_number'], self.order.order_number)
+
+        # Once sent, replays don't send it again
+        with self.assertLogs('worker', 'WARNING'):
+            self.process('job-1', 'confirm')
+        self.assertEqual(publish_event.call_count, 2)
+
+    def test_duplicate_confirm_jobs_send_one_email(self, publisher_class):
+        publish_event = publisher_class.return_value.__enter__.return_value.publish_event
+
+        self.process('job-1', 'confirm')
+        with self.assertLogs('worker', 'WARNING'):
+            self.process('job-2', 'confirm')
+
+        publish_event.assert_called_once()
+        self.assertEqual(OrderStatusTransition.objects.filter(order=self.order).count(), 1)
+
+    def test_no_confirmation_email_for_orders_confirmed_elsewhere(self, publisher_class):
+        publish_event = publisher_class.return_value.__enter__.return_value.publish_event
+        transition(self.order.id, 'cancel', source='api')
+
+        with self.assertLogs('worker', 'WARNING'):
+            self.process('job-1', 'confirm')
+
+        publish_event.assert_not_called()
+
+    def test_inventory_update_replay_takes_stock_once(self, publisher_class):
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        product = Product.objects.create(
+            name='Shirt', slug='shirt', description='', category=category, base_price=Decimal('10.00'),
+        )
+        variant = Variant.objects.create(product=product, sku='SHIRT-M', stock_quantity=10)
+        OrderItem.objects.create(
+            order=self.order, product=product, variant=variant, product_name='Shirt', sku='SHIRT-M',
+            quantity=3, unit_price=Decimal('10.00'),
+        )
+
+        self.process('job-1', 'update_inventory')
+        self.process('job-1', 'update_inventory')
+
+        variant.refresh_from_db()
+        self.assertEqual(variant.stock_quantity, 7)
+        self.assertEqual(ProcessedJob.objects.filter(job_id='job-1').count(), 1)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class OrderHistoryTests(PrimaryDBTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email='buyer@example.com', username='buyer', password='x')
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        self.product = Product.objects.create(
+            name='Shirt', slug='shirt', description='', category=category, base_price=Decimal('10.00'),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_item(self, order, sku):
+        OrderItem.objects.create(
+            order=order, product=self.product, product_name='Shirt', sku=sku, quantity=1, unit_price=Decimal('10.00'),
+        )
+
+    def test_list_and_detail_include_items(self):
+        first, second = create_order(self.user), create_order(self.user)
+        self.add_item(first, 'SHIRT-S')
+        self.add_item(second, 'SHIRT-M')
+        self.add_item(second, 'SHIRT-L')
+
+        response = self.client.get('/api/orders/orders/')
+        self.assertEqual(response.status_code, 200)
+        items = {order['order_number']: sorted(i['sku'] for i in order['items']) for order in response.json()['results']}
+        self.assertEqual(items, {first.order_number: ['SHIRT-S'], second.order_number: ['SHIRT-L', 'SHIRT-M']})
+
+        response = self.client.get(f'/api/orders/orders/{first.order_number}/')
+        self.assertEqual([i['sku'] for i in response.json()['items']], ['SHIRT-S'])
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class SalesReportTests(PrimaryDBTestCase):
+    def setUp(self):
+        super().setUp()
+        staff = User.objects.create_user(email='staff@example.com', username='staff', password='x', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(staff)
+
+    def test_top_sellers_rejects_a_limit_below_one(self):
+        for limit in ('0', '-1', 'many'):
+            response = self.client.get('/api/orders/reports/top-sellers/', {'limit': limit})
+            self.assertEqual(response.status_code, 400, limit)
+
+        response = self.client.get('/api/orders/reports/top-sellers/', {'limit': '500'})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+@mock.patch('orders.views.RabbitMQPublisher')
+class CheckoutIdempotencyTests(PrimaryDBTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', username='buyer', password='x')
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        product = Product.objects.create(
+            name='Shirt', slug='shirt', description='', category=category, base_price=Decimal('10.00'),
+        )
+        variant = Variant.objects.create(product=product, sku='SHIRT-M', stock_quantity=10)
+        CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=product, variant=variant, quantity=2)
+        address = Address.objects.create(
+            user=self.user, address_type='shipping', full_name='Test Customer', phone='5550100',
+            address_line1='1 Main St', city='Springfield', state='IL', postal_code='62701', country='US',
+        )
+        self.body = {'shipping_address_id': address.id, 'billing_address_id': address.id, 'payment_method': 'upi'}
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, body, key='checkout-1'):
+        return self.client.post('/api/orders/orders/create/', body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_with_the_same_body_replays_the_order(self, publisher_class):
+        created = self.checkout(self.body)
+        self.assertEqual(created.status_code, 201)
+
+        replayed = self.checkout(dict(reversed(self.body.items())))
+        self.assertEqual(replayed.status_code, 201)
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed.json()['order_number'], created.json()['order_number'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_with_a_different_body_is_rejected(self, publisher_class):
+        self.assertEqual(self.checkout(self.body).status_code, 201)
+
+        different = {**self.body, 'payment_method': 'cod'}
+        self.assertEqual(self.checkout(different).status_code, 422)
+        # Also once the cached response is gone and the order is the record
+        cache.clear()
+        self.assertEqual(self.checkout(different).status_code, 422)
+        self.assertEqual(self.checkout(self.body).status_code, 201)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'order partitioning needs PostgreSQL')
+class PartitioningTests(PrimaryDBTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email='buyer@example.com', username='buyer', password='x')
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        self.product = Product.objects.create(
+            name='Shirt', slug='shirt', description='', category=category, base_price=Decimal('10.00'),
+        )
+        self.this_month = month_start(date.today())
+        self.cursor = self.enterContext(connection.cursor())
+        # ALTER TABLE refuses tables with deferred foreign key checks pending
+        self.cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+    def create_order(self, month, **fields):
+        """An order with one item and payment, created in `month`."""
+        created_at = datetime(month.year, month.month, 15, tzinfo=dt_timezone.utc)
+        order = create_order(self.user, **fields)
+        OrderItem.objects.create(
+            order=order, product=self.product, product_name='Shirt', sku='SHIRT-M', quantity=1,
+            unit_price=Decimal('10.00'),
+        )
+        Payment.objects.create(order=order, payment_method='upi', amount=Decimal('20.00'))
+        for model in (Order, OrderItem, Payment):
+            model.objects.filter(**{'id' if model is Order else 'order_id': order.id}).update(created_at=created_at)
+        order.created_at = created_at
+        return order
+
+    def schema(self, model):
+        """{name: (columns, unique, primary key, referenced table)} of model's table."""
+        return {
+            name: (info['columns'], info['unique'], info['primary_key'], (info['foreign_key'] or (None,))[0])
+            for name, info in connection.introspection.get_constraints(self.cursor, model._meta.db_table).items()
+        }
+
+    def partition_of(self, model, pk):
+        self.cursor.execute(f'SELECT tableoid::regclass::text FROM "{model._meta.db_table}" WHERE id = %s', [pk])
+        return self.cursor.fetchone()[0]
+
+    def convert(self, months_ahead=1):
+        call_command('order_partitions', '--convert', '--months-ahead', str(months_ahead), stdout=StringIO())
+
+    def test_convert_keeps_rows_and_django_names(self):
+        old = self.create_order(add_months(self.this_month, -3))
+        new = self.create_order(self.this_month, idempotency_key='checkout-1')
+        # Foreign keys to the partitioned tables are dropped
+        partitioned = {model._meta.db_table for model in PARTITIONED_MODELS}
+        before = {
+            model: {name: info for name, info in self.schema(model).items() if info[3] not in partitioned}
+            for model in PARTITIONED_MODELS
+        }
+
+        self.convert()
+
+        for model in PARTITIONED_MODELS:
+            table = model._meta.db_table
+            self.assertTrue(is_partitioned(self.cursor, table))
+            self.assertEqual(
+                [month for _, month in list_partitions(self.cursor, table)],
+                [add_months(self.this_month, n) for n in range(-3, 2)],
+            )
+            after = self.schema(model)
+            self.assertEqual(set(after), set(before[model]), table)
+            for name, (columns, unique, primary_key, referenced) in before[model].items():
+                # Unique keys gain the partition key; global ones are in orders_order_keys
+                expected = columns + ['created_at'] if unique and 'created_at' not in columns else columns
+                self.assertEqual(after[name], (expected, unique, primary_key, referenced), name)
+        old_partition = partition_name('orders_order', add_months(self.this_month, -3))
+        self.assertEqual(self.partition_of(Order, old.id), old_partition)
+        self.assertEqual(Order.objects.get(id=new.id).items.get().sku, 'SHIRT-M')
+
+        # Migrations find the indexes and constraints by their names
+        with connection.schema_editor() as editor:
+            editor.remove_index(Order, Order._meta.indexes[0])
+            editor.remove_constraint(Order, Order._meta.constraints[0])
+
+        # Order numbers and idempotency keys stay unique across partitions
+        for fields in ({'order_number': old.order_number}, {'idempotency_key': 'checkout-1'}):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                self.create_order(add_months(self.this_month, -3), **fields)
+        self.create_order(self.this_month, idempotency_key='checkout-2')
+
+    def test_ensure_moves_rows_out_of_the_default_partition(self):
+        self.convert(months_ahead=0)
+        later = add_months(self.this_month, 2)
+        order = self.create_order(later)
+        self.assertEqual(self.partition_of(Order, order.id), 'orders_order_default')
+
+        call_command('order_partitions', '--months-ahead', '2', stdout=StringIO())
+
+        for model in PARTITIONED_MODELS:
+            pk = order.id if model is Order else model.objects.get(order=order).id
+            self.assertEqual(self.partition_of(model, pk), partition_name(model._meta.db_table, later))
+            self.cursor.execute(f'SELECT count(*) FROM "{model._meta.db_table}_default"')
+            self.assertEqual(self.cursor.fetchone()[0], 0)
+        # The moved order keeps its key row, and the default is attached again
+        self.cursor.execute(f'SELECT count(*) FROM "{ORDER_KEYS_TABLE}" WHERE order_id = %s', [order.id])
+        self.assertEqual(self.cursor.fetchone()[0], 1)
+        beyond = self.create_order(add_months(self.this_month, 6))
+        self.assertEqual(self.partition_of(Order, beyond.id), 'orders_order_default')
+
+    def test_archive_exports_and_drops_old_partitions(self):
+        old = self.create_order(add_months(self.this_month, -3))
+        transition(old.id, 'confirm')
+        kept = self.create_order(self.this_month)
+        self.convert()
+
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('order_partitions', '--archive-after', '2', '--archive-dir', directory, stdout=StringIO())
+
+            archived = partition_name('orders_order', add_months(self.this_month, -3))
+            with gzip.open(os.path.join(directory, f'{archived}.csv.gz'), 'rt') as archive:
+                rows = list(csv.DictReader(archive))
+            self.assertEqual([row['order_number'] for row in rows], [old.order_number])
+            self.assertTrue(os.path.exists(os.path.join(directory, f'{archived}.orders_orderstatustransition.csv.gz')))
+
+        self.assertEqual(list(Order.objects.values_list('id', flat=True)), [kept.id])
+        self.assertFalse(OrderItem.objects.filter(order_id=old.id).exists())
+        self.assertFalse(OrderStatusTransition.objects.filter(order_id=old.id).exists())
+        self.cursor.execute(f'SELECT order_id FROM "{ORDER_KEYS_TABLE}"')
+        self.assertEqual(self.cursor.fetchall(), [(kept.id,)])
+        self.assertEqual(list_partitions(self.cursor, 'orders_order')[0][1], add_months(self.this_month, -2))
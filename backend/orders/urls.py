@@ -5,7 +5,10 @@ urlpatterns = [
     path('cart/', views.CartView.as_view(), name='cart'),
     path('cart/items/', views.CartItemCreateView.as_view(), name='cart-item-create'),
     path('cart/items/<int:pk>/', views.CartItemUpdateView.as_view(), name='cart-item-update'),
+    path('reports/top-sellers/', views.TopSellersView.as_view(), name='report-top-sellers'),
+    path('reports/sales/', views.SalesSeriesView.as_view(), name='report-sales'),
     path('orders/', views.OrderListView.as_view(), name='order-list'),
     path('orders/create/', views.OrderCreateView.as_view(), name='order-create'),
     path('orders/<str:order_number>/', views.OrderDetailView.as_view(), name='order-detail'),
+    path('orders/<str:order_number>/cancel/', views.OrderCancelView.as_view(), name='order-cancel'),
 ]
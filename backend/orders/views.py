@@ -1,8 +1,13 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.views import APIView
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django_filters.rest_framework import DjangoFilterBackend
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
 from decimal import Decimal
 
 from .models import Order, OrderItem, Cart, CartItem, Payment
@@ -12,6 +17,13 @@ from .serializers import (
 )
 from users.models import Address
 from config.rabbitmq import RabbitMQPublisher
+from config.db_utils import UsePrimaryDBMixin
+from .filters import OrderHistoryFilter
+from .inventory import cancel_order
+from .pagination import OrderHistoryPagination
+from .partitioning import order_items_range, order_number_range
+from . import rollups
+from . import idempotency
 
 
 class CartView(APIView):
@@ -119,11 +131,72 @@ class CartItemUpdateView(APIView):
             )
 
 
-class OrderCreateView(APIView):
+class OrderCreateView(UsePrimaryDBMixin, APIView):
     permission_classes = [IsAuthenticated]
     
-    @transaction.atomic
     def post(self, request):
+        key = request.headers.get(idempotency.IDEMPOTENCY_HEADER)
+        if key is None:
+            return self.create_order(request)
+        
+        if not key or len(key) > idempotency.MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{idempotency.IDEMPOTENCY_HEADER} must be 1-{idempotency.MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        request_fingerprint = idempotency.fingerprint(request.data)
+        replayed = self.replay(request, key, request_fingerprint)
+        if replayed:
+            return replayed
+        
+        if not idempotency.acquire(request.user.id, key):
+            return Response(
+                {'error': 'A request with this Idempotency-Key is already in progress'},
+                status=status.HTTP_409_CONFLICT
+            )
+        try:
+            # The first request may have finished between replay() and acquire()
+            replayed = self.replay(request, key, request_fingerprint)
+            if replayed:
+                return replayed
+            try:
+                response = self.create_order(request, key, request_fingerprint)
+            except IntegrityError:
+                # Same key committed concurrently (lock expired mid-request)
+                replayed = self.replay(request, key, request_fingerprint)
+                if replayed:
+                    return replayed
+                raise
+            # Failed checkouts rolled back, so a retry may run them again
+            if response.status_code == status.HTTP_201_CREATED:
+                idempotency.store_response(
+                    request.user.id, key, response.status_code, response.data, request_fingerprint
+                )
+            return response
+        finally:
+            idempotency.release(request.user.id, key)
+    
+    def replay(self, request, key, request_fingerprint):
+        cached = idempotency.get_response(request.user.id, key)
+        if cached is None:
+            order = Order.objects.filter(user=request.user, idempotency_key=key).first()
+            if order is None:
+                return None
+            cached = (status.HTTP_201_CREATED, OrderSerializer(order).data, order.idempotency_fingerprint)
+            idempotency.store_response(request.user.id, key, *cached)
+        
+        status_code, data, stored_fingerprint = cached
+        # Orders from before fingerprints have none to compare
+        if stored_fingerprint and stored_fingerprint != request_fingerprint:
+            return Response(
+                {'error': f'This {idempotency.IDEMPOTENCY_HEADER} was already used with a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        return Response(data, status=status_code, headers={'Idempotent-Replayed': 'true'})
+    
+    @transaction.atomic
+    def create_order(self, request, idempotency_key=None, idempotency_fingerprint=''):
         serializer = OrderCreateSerializer(data=request.data)
         
         if not serializer.is_valid():
@@ -216,7 +289,10 @@ class OrderCreateView(APIView):
                 billing_state=billing_address.state,
                 billing_postal_code=billing_address.postal_code,
                 billing_country=billing_address.country,
-                notes=serializer.validated_data.get('notes', '')
+                notes=serializer.validated_data.get('notes', ''),
+                payment_method=serializer.validated_data['payment_method'],
+                idempotency_key=idempotency_key,
+                idempotency_fingerprint=idempotency_fingerprint
             )
             
             for item_data in order_items_data:
@@ -238,6 +314,7 @@ class OrderCreateView(APIView):
                     task_name='process_order',
                     payload={
                         'order_id': order.id,
+                        'created_at': order.created_at.isoformat(),
                         'action': 'update_inventory'
                     }
                 )
@@ -247,6 +324,7 @@ class OrderCreateView(APIView):
                     task_name='process_order',
                     payload={
                         'order_id': order.id,
+                        'created_at': order.created_at.isoformat(),
                         'action': 'confirm'
                     }
                 )
@@ -268,12 +346,27 @@ class OrderCreateView(APIView):
             )
 
 
+def prefetch_order_items(orders):
+    """Prefetch the orders' items without reading item partitions older than the orders."""
+    prefetch_related_objects(orders, Prefetch('items', queryset=OrderItem.objects.filter(**order_items_range(orders))))
+
+
 class OrderListView(generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderHistoryPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = OrderHistoryFilter
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).prefetch_related('items')
+        # Filtered and ordered on the (user, [status,] -created_at) indexes
+        return Order.objects.filter(user=self.request.user)
+    
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page:
+            prefetch_order_items(page)
+        return page
 
 
 class OrderDetailView(generics.RetrieveAPIView):
@@ -282,4 +375,111 @@ class OrderDetailView(generics.RetrieveAPIView):
     lookup_field = 'order_number'
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).prefetch_related('items')
+        return Order.objects.filter(
+            user=self.request.user,
+            **order_number_range(self.kwargs['order_number'])
+        )
+    
+    def get_object(self):
+        order = super().get_object()
+        prefetch_order_items([order])
+        return order
+
+
+class OrderCancelView(UsePrimaryDBMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, order_number):
+        try:
+            order = Order.objects.get(
+                order_number=order_number,
+                user=request.user,
+                **order_number_range(order_number)
+            )
+        except Order.DoesNotExist:
+            return Response(
+                {'error': 'Order not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        if not cancel_order(order, source='api'):
+            order.refresh_from_db(fields=['status'])
+            return Response(
+                {'error': f'Order cannot be cancelled, it is {order.status}'},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        prefetch_order_items([order])
+        return Response(OrderSerializer(order).data)
+
+
+class SalesReportView(APIView):
+    """Staff sales reports, answered from the DailySales rollups."""
+    permission_classes = [IsAdminUser]
+    default_days = 30
+    
+    def parse_params(self, request):
+        dimension = request.query_params.get('dimension', 'product')
+        if dimension not in rollups.DIMENSION_FIELDS:
+            raise ValueError(f"dimension must be one of {', '.join(rollups.DIMENSION_FIELDS)}")
+        
+        end = timezone.localdate()
+        start = end - timedelta(days=self.default_days - 1)
+        if request.query_params.get('end'):
+            end = parse_date(request.query_params['end'])
+        if request.query_params.get('start'):
+            start = parse_date(request.query_params['start'])
+        if not start or not end:
+            raise ValueError('start and end must be YYYY-MM-DD')
+        return dimension, start, end
+
+
+class TopSellersView(SalesReportView):
+    def get(self, request):
+        try:
+            dimension, start, end = self.parse_params(request)
+            limit = int(request.query_params.get('limit', 10))
+            if limit < 1:
+                raise ValueError('limit must be at least 1')
+            limit = min(limit, 100)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = rollups.top_sellers(dimension, start, end, limit)
+        names = self.names(dimension, [row['dimension_id'] for row in results])
+        for row in results:
+            row['name'] = names.get(row['dimension_id'])
+        
+        return Response({
+            'dimension': dimension,
+            'start': start,
+            'end': end,
+            'results': results
+        })
+    
+    def names(self, dimension, ids):
+        from catalog.models import Product, Variant, Category, Brand
+        
+        if dimension == 'variant':
+            return dict(Variant.objects.filter(id__in=ids).values_list('id', 'sku'))
+        model = {'product': Product, 'category': Category, 'brand': Brand}.get(dimension)
+        if model is None:
+            return {}
+        return dict(model.objects.filter(id__in=ids).values_list('id', 'name'))
+
+
+class SalesSeriesView(SalesReportView):
+    def get(self, request):
+        try:
+            dimension, start, end = self.parse_params(request)
+            dimension_id = int(request.query_params.get('id', 0))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'dimension': dimension,
+            'id': dimension_id,
+            'start': start,
+            'end': end,
+            'results': rollups.time_series(dimension, dimension_id, start, end)
+        })
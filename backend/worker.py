@@ -1,19 +1,34 @@
+import copy
 import pika
 import json
 import time
 import logging
+import signal
 import sys
 import os
 import django
+from datetime import datetime
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from config.elasticsearch import index_product, delete_product_from_index
+from django.db import close_old_connections
+from config.elasticsearch import (
+    index_product, delete_product_from_index,
+    async_index_product, async_delete_product_from_index,
+)
+from config import tracing
+from config.cache_purge import product_paths, purge_paths
+from config.metrics import observe_handled, observe_received, start_metrics_server
+from config.rabbitmq import open_connection
 from catalog.models import Product
 
+# Trace SQL in worker processes too (the web process does it in TracingMiddleware)
+tracing.install()
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -22,75 +37,166 @@ logger = logging.getLogger(__name__)
 
 
 class Worker:
-    def __init__(self, queue_name, max_retries=3):
+    def __init__(self, queue_name, max_retries=3, prefetch_count=1):
         self.queue_name = queue_name
         self.max_retries = max_retries
+        self.prefetch_count = prefetch_count
         self.connection = None
         self.channel = None
+        self.should_stop = False
+        # Optional multiprocessing.Value accumulating seconds spent in
+        # process_message; set by worker_supervisor to measure utilisation.
+        self.busy_time = None
     
     def connect(self):
-        parameters = pika.URLParameters(settings.RABBITMQ_URL)
-        self.connection = pika.BlockingConnection(parameters)
+        self.connection = open_connection()
         self.channel = self.connection.channel()
         
-        self.channel.queue_declare(queue=self.queue_name, durable=True)
-        self.channel.queue_declare(queue=f"{self.queue_name}_dlq", durable=True)
+        for queue_name, arguments in self.queue_declarations():
+            self.channel.queue_declare(queue=queue_name, durable=True, arguments=arguments)
         
-        self.channel.basic_qos(prefetch_count=1)
+        self.channel.basic_qos(prefetch_count=self.prefetch_count)
+    
+    def queue_declarations(self):
+        declarations = [
+            (self.queue_name, None),
+            (f"{self.queue_name}_dlq", None),
+        ]
+        # Failed messages wait out their backoff in a TTL queue per delay,
+        # then dead-letter back onto the main queue. The consumer never
+        # sleeps, so healthy messages keep flowing while others back off.
+        for retry_count in range(1, self.max_retries + 1):
+            delay = self.retry_delay(retry_count)
+            declarations.append((self.retry_queue_name(delay), {
+                'x-message-ttl': delay * 1000,
+                'x-dead-letter-exchange': '',
+                'x-dead-letter-routing-key': self.queue_name,
+            }))
+        return declarations
+    
+    def retry_delay(self, retry_count):
+        return 5 * (2 ** retry_count)
+    
+    def retry_queue_name(self, delay):
+        return f"{self.queue_name}.retry.{delay}s"
+    
+    def dlq_headers(self, error, retry_count):
+        # Read by `manage.py dlq` to filter and replay dead messages
+        return {
+            'x-original-queue': self.queue_name,
+            'x-error': f"{type(error).__name__}: {error}"[:500],
+            'x-retry-count': retry_count,
+            'x-failed-at': datetime.utcnow().isoformat(),
+        }
+    
+    def republish_properties(self, properties, headers):
+        # Retries and dead letters keep the original message's properties
+        # (content_type, message_id, correlation_id, ...) and headers
+        republished = copy.copy(properties) if properties is not None else pika.BasicProperties()
+        republished.headers = {**(republished.headers or {}), **headers}
+        republished.delivery_mode = 2
+        # The retry queue's TTL sets the delay, not a per-message expiration
+        republished.expiration = None
+        republished.content_type = republished.content_type or 'application/json'
+        return republished
     
     def process_message(self, message):
         raise NotImplementedError("Subclasses must implement process_message")
     
+    async def aprocess_message(self, message):
+        """
+        Async variant used by async_worker.py. Defaults to running
+        process_message in a worker thread; override for native async I/O.
+        """
+        await sync_to_async(self._process_in_thread, thread_sensitive=False)(message)
+    
+    def _process_in_thread(self, message):
+        # Executor threads outlive any one job and keep their database
+        # connections; drop broken or expired ones around each job, as
+        # Django does around each request
+        close_old_connections()
+        try:
+            self.process_message(message)
+        finally:
+            close_old_connections()
+    
     def handle_message(self, ch, method, properties, body):
+        started = time.monotonic()
+        try:
+            self._handle_message(ch, method, properties, body)
+        finally:
+            if self.busy_time is not None:
+                with self.busy_time.get_lock():
+                    self.busy_time.value += time.monotonic() - started
+    
+    def _handle_message(self, ch, method, properties, body):
+        started = time.monotonic()
+        message = None
         try:
             message = json.loads(body)
             job_id = message.get('job_id')
             task_name = message.get('task_name')
             
             logger.info(f"Processing job {job_id}: {task_name}")
+            observe_received(self.queue_name, message)
             
-            self.process_message(message)
+            with tracing.consumer_span(self.queue_name, message):
+                self.process_message(message)
             
             ch.basic_ack(delivery_tag=method.delivery_tag)
+            observe_handled(self.queue_name, message, 'success', time.monotonic() - started)
             logger.info(f"Job {job_id} completed successfully")
             
         except Exception as e:
             logger.error(f"Error processing message: {e}", exc_info=True)
             
-            retry_count = properties.headers.get('x-retry-count', 0) if properties.headers else 0
+            headers = (properties.headers if properties else None) or {}
+            retry_count = headers.get('x-retry-count', 0)
             
             if retry_count < self.max_retries:
                 retry_count += 1
-                headers = {'x-retry-count': retry_count}
                 
-                delay = 5 * (2 ** retry_count)
-                time.sleep(delay)
+                delay = self.retry_delay(retry_count)
                 
                 ch.basic_publish(
                     exchange='',
-                    routing_key=self.queue_name,
+                    routing_key=self.retry_queue_name(delay),
                     body=body,
-                    properties=pika.BasicProperties(
-                        delivery_mode=2,
-                        headers=headers
-                    )
+                    properties=self.republish_properties(properties, {'x-retry-count': retry_count})
                 )
                 ch.basic_ack(delivery_tag=method.delivery_tag)
-                logger.info(f"Requeued message, retry {retry_count}/{self.max_retries}")
+                observe_handled(self.queue_name, message, 'retry', time.monotonic() - started)
+                logger.info(f"Scheduled retry {retry_count}/{self.max_retries} in {delay}s")
             else:
                 ch.basic_publish(
                     exchange='',
                     routing_key=f"{self.queue_name}_dlq",
                     body=body,
-                    properties=pika.BasicProperties(delivery_mode=2)
+                    properties=self.republish_properties(properties, self.dlq_headers(e, retry_count))
                 )
                 ch.basic_ack(delivery_tag=method.delivery_tag)
+                observe_handled(self.queue_name, message, 'dlq', time.monotonic() - started)
                 logger.error(f"Message moved to DLQ after {self.max_retries} retries")
     
+    def request_stop(self, signum=None, frame=None):
+        """
+        Drain and stop: finish the message in hand, cancel the consumer
+        (pika nacks prefetched but undelivered messages back to the queue)
+        and leave start().
+        """
+        self.should_stop = True
+        if self.connection and self.connection.is_open:
+            self.connection.add_callback_threadsafe(self._stop_consuming)
+    
+    def _stop_consuming(self):
+        if self.channel and self.channel.is_open:
+            self.channel.stop_consuming()
+    
     def start(self):
         logger.info(f"Worker started, listening on queue: {self.queue_name}")
+        signal.signal(signal.SIGTERM, self.request_stop)
         
-        while True:
+        while not self.should_stop:
             try:
                 if not self.connection or self.connection.is_closed:
                     self.connect()
@@ -106,11 +212,14 @@ class Worker:
                 logger.info("Worker stopped by user")
                 break
             except Exception as e:
+                if self.should_stop:
+                    break
                 logger.error(f"Connection error: {e}", exc_info=True)
                 time.sleep(5)
         
         if self.connection and not self.connection.is_closed:
             self.connection.close()
+        logger.info(f"Worker stopped, queue: {self.queue_name}")
 
 
 class SearchIndexWorker(Worker):
@@ -119,6 +228,9 @@ class SearchIndexWorker(Worker):
     
     def process_message(self, message):
         payload = message.get('payload', {})
+        if message.get('task_name') == 'purge_cache':
+            purge_paths(payload.get('paths', []))
+            return
         product_id = payload.get('product_id')
         event_type = payload.get('event_type', 'update')
         
@@ -129,6 +241,24 @@ class SearchIndexWorker(Worker):
             product = Product.objects.get(id=product_id)
             index_product(product)
             logger.info(f"Indexed product {product_id} in search index")
+            purge_paths(product_paths(product.slug))
+    
+    async def aprocess_message(self, message):
+        payload = message.get('payload', {})
+        if message.get('task_name') == 'purge_cache':
+            await sync_to_async(purge_paths, thread_sensitive=False)(payload.get('paths', []))
+            return
+        product_id = payload.get('product_id')
+        event_type = payload.get('event_type', 'update')
+        
+        if event_type == 'delete':
+            await async_delete_product_from_index(product_id)
+            logger.info(f"Deleted product {product_id} from search index")
+        else:
+            product = await Product.objects.select_related('brand', 'category').aget(id=product_id)
+            await async_index_product(product)
+            logger.info(f"Indexed product {product_id} in search index")
+            await sync_to_async(purge_paths, thread_sensitive=False)(product_paths(product.slug))
 
 
 class EmailWorker(Worker):
@@ -147,8 +277,11 @@ class OrderProcessingWorker(Worker):
         super().__init__(queue_name='order.process')
     
     def process_message(self, message):
-        from orders.models import Order
-        from decimal import Decimal
+        from config.db_utils import UsePrimaryDB
+        from orders.inventory import cancel_order
+        from orders.models import Order, OrderStatusTransition
+        from orders.partitioning import order_lookup
+        from orders.state_machine import TRANSITIONS, transition
         
         payload = message.get('payload', {})
         order_id = payload.get('order_id')
@@ -157,58 +290,32 @@ class OrderProcessingWorker(Worker):
         logger.info(f"Processing order {order_id}, action: {action}")
         
         try:
-            order = Order.objects.get(id=order_id)
-            
-            if action == 'confirm':
-                order.status = 'confirmed'
-                order.save()
-                logger.info(f"Order {order.order_number} confirmed")
+            with UsePrimaryDB():
+                # With created_at only the order's partition is read
+                order = Order.objects.filter(**order_lookup(order_id, payload.get('created_at'))).first()
+                if order is None:
+                    raise Order.DoesNotExist(f"Order {order_id} does not exist")
                 
-                from config.rabbitmq import RabbitMQPublisher
-                with RabbitMQPublisher() as publisher:
-                    publisher.publish_event(
-                        queue_name='email.send_order_confirmation',
-                        task_name='send_order_email',
-                        payload={
-                            'order_id': order_id,
-                            'order_number': order.order_number,
-                            'user_email': order.user.email
-                        }
-                    )
+                if action == 'update_inventory':
+                    self.update_inventory(message.get('job_id'), order)
                 
-            elif action == 'ship':
-                order.status = 'shipped'
-                order.save()
-                logger.info(f"Order {order.order_number} marked as shipped")
+                elif action == 'cancel':
+                    if cancel_order(order, job_id=message.get('job_id'), source='worker'):
+                        logger.info(f"Order {order_id} cancelled and stock restored")
+                    else:
+                        logger.warning(f"Cannot cancel order {order_id} - not in a cancellable status")
                 
-            elif action == 'deliver':
-                order.status = 'delivered'
-                order.save()
-                logger.info(f"Order {order.order_number} marked as delivered")
-                
-            elif action == 'cancel':
-                if order.status not in ['shipped', 'delivered']:
-                    order.status = 'cancelled'
-                    order.save()
-                    
-                    for item in order.items.all():
-                        if item.variant:
-                            item.variant.stock_quantity += item.quantity
-                            item.variant.save()
-                    
-                    logger.info(f"Order {order.order_number} cancelled and stock restored")
-                else:
-                    logger.warning(f"Cannot cancel order {order.order_number} - already {order.status}")
-            
-            elif action == 'update_inventory':
-                for item in order.items.all():
-                    if item.variant:
-                        item.variant.stock_quantity -= item.quantity
-                        item.variant.save()
-                        logger.info(f"Updated stock for {item.variant.sku}: -{item.quantity}")
-                        
-                        from config.rabbitmq import publish_product_event
-                        publish_product_event(item.product.id, event_type='update')
+                elif action in TRANSITIONS:
+                    changed = transition(order, action, source='worker')
+                    if not changed:
+                        logger.warning(f"Order {order_id}: '{action}' not allowed from current status, skipping")
+                    # A retry after the confirm committed but the email
+                    # failed finds the order already confirmed; the
+                    # email is still owed
+                    if action == 'confirm' and (changed or OrderStatusTransition.objects.filter(
+                        order_id=order_id, action='confirm', source='worker'
+                    ).exists()):
+                        self.send_confirmation(order)
                 
         except Order.DoesNotExist:
             logger.error(f"Order {order_id} not found")
@@ -217,6 +324,59 @@ class OrderProcessingWorker(Worker):
             logger.error(f"Error processing order {order_id}: {e}", exc_info=True)
             raise
 
+    def send_confirmation(self, order):
+        """
+        Queue the order's confirmation email once. The claim commits only
+        if the publish succeeded, so a failed publish is retried and a
+        sent email isn't queued again.
+        """
+        from django.db import transaction
+        from config.rabbitmq import RabbitMQPublisher
+        from orders.inventory import claim_job
+        
+        with transaction.atomic(using='default'):
+            if not claim_job(f"order-confirmation-{order.id}", 'send_confirmation', order.id):
+                logger.info(f"Confirmation for order {order.id} already sent, skipping")
+                return
+            logger.info(f"Order {order.order_number} confirmed")
+            with RabbitMQPublisher() as publisher:
+                publisher.publish_event(
+                    queue_name='email.send_order_confirmation',
+                    task_name='send_order_email',
+                    payload={
+                        'order_id': order.id,
+                        'order_number': order.order_number,
+                        'user_email': order.user.email
+                    }
+                )
+
+    def update_inventory(self, job_id, order):
+        from django.db import transaction
+        from config.db_utils import UsePrimaryDB
+        from config.rabbitmq import publish_product_events
+        from orders.inventory import adjust_stock, claim_job
+        from orders.models import Order
+        from orders.partitioning import order_lookup
+
+        with UsePrimaryDB(), transaction.atomic(using='default'):
+            # Lock the order so a concurrent cancel can't interleave
+            order = Order.objects.select_for_update().get(**order_lookup(order.id, order.created_at))
+            if not claim_job(job_id, 'update_inventory', order.id):
+                logger.info(f"Job {job_id} already applied, skipping")
+                return
+
+            product_ids = adjust_stock(order.id, -1)
+            transaction.on_commit(lambda: publish_product_events(product_ids), using='default')
+
+        logger.info(f"Updated stock for order {order.order_number} ({len(product_ids)} products)")
+
+
+WORKER_TYPES = {
+    'search': SearchIndexWorker,
+    'email': EmailWorker,
+    'order': OrderProcessingWorker,
+}
+
 
 if __name__ == '__main__':
     if len(sys.argv) < 2:
@@ -225,14 +385,11 @@ if __name__ == '__main__':
     
     worker_type = sys.argv[1]
     
-    if worker_type == 'search':
-        worker = SearchIndexWorker()
-    elif worker_type == 'email':
-        worker = EmailWorker()
-    elif worker_type == 'order':
-        worker = OrderProcessingWorker()
-    else:
+    if worker_type not in WORKER_TYPES:
         print(f"Unknown worker type: {worker_type}")
         sys.exit(1)
     
+    worker = WORKER_TYPES[worker_type]()
+    tracing.set_service_name(f"worker-{worker_type}")
+    start_metrics_server()
     worker.start()
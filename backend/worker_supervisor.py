@@ -0,0 +1,237 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+
+# Consumer processes write metrics to a shared directory that the
+# supervisor aggregates; prometheus_client reads this at import time.
+# Only a directory created here is removed on exit: a supplied one may be
+# shared with live processes (gunicorn), so its files are left alone and
+# exited consumers are marked dead one by one (ConsumerPool.reap).
+METRICS_DIR_CREATED = 'PROMETHEUS_MULTIPROC_DIR' not in os.environ
+if METRICS_DIR_CREATED:
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='worker-metrics-')
+else:
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+import pika
+from django.conf import settings
+from django.db import connections
+from prometheus_client import multiprocess
+
+from config import tracing
+from config.metrics import start_metrics_server
+from worker import WORKER_TYPES
+
+logger = logging.getLogger('worker_supervisor')
+
+
+def run_consumer(worker_type, prefetch_count, busy_time):
+    # Ctrl-C reaches the whole process group; only the supervisor reacts
+    # and drains the consumers with SIGTERM, so none stops mid-message
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    tracing.set_service_name(f"worker-{worker_type}")
+    worker = WORKER_TYPES[worker_type]()
+    worker.prefetch_count = prefetch_count
+    worker.busy_time = busy_time
+    worker.start()
+
+
+class ConsumerPool:
+    """
+    Consumer processes for one queue, kept between min_processes and
+    max_processes.
+
+    Scales up while the backlog per process is above scale_up_backlog or
+    the consumers are busy more than scale_up_utilisation of the time, and
+    down (one process per interval) once the queue is empty and
+    utilisation drops below scale_down_utilisation.
+    """
+    def __init__(self, worker_type, min_processes=1, max_processes=4, prefetch=1,
+                 scale_up_backlog=100, scale_up_utilisation=0.8,
+                 scale_down_utilisation=0.3, cooldown=30):
+        self.worker_type = worker_type
+        self.queue_name = WORKER_TYPES[worker_type]().queue_name
+        self.min_processes = min_processes
+        self.max_processes = max(max_processes, min_processes)
+        self.prefetch = prefetch
+        self.scale_up_backlog = scale_up_backlog
+        self.scale_up_utilisation = scale_up_utilisation
+        self.scale_down_utilisation = scale_down_utilisation
+        self.cooldown = cooldown
+
+        self.processes = []     # [(Process, busy_time Value)]
+        self.draining = []      # processes told to stop, not yet exited
+        self.last_scaled = 0
+        self.last_sample = None  # (monotonic time, total busy seconds)
+
+    @property
+    def size(self):
+        return len(self.processes)
+
+    def spawn(self):
+        busy_time = multiprocessing.Value('d', 0.0)
+        process = multiprocessing.Process(
+            target=run_consumer,
+            args=(self.worker_type, self.prefetch, busy_time),
+            name=f'worker-{self.worker_type}',
+        )
+        process.start()
+        self.processes.append((process, busy_time))
+        logger.info(f"[{self.worker_type}] started consumer pid={process.pid} ({self.size} running)")
+
+    def drain_one(self):
+        process, _ = self.processes.pop()
+        process.terminate()
+        self.draining.append(process)
+        logger.info(f"[{self.worker_type}] draining consumer pid={process.pid} ({self.size} running)")
+
+    def reap(self):
+        alive = []
+        for process, busy_time in self.processes:
+            if process.is_alive():
+                alive.append((process, busy_time))
+            else:
+                multiprocess.mark_process_dead(process.pid)
+                logger.warning(
+                    f"[{self.worker_type}] consumer pid={process.pid} exited with {process.exitcode}"
+                )
+        self.processes = alive
+        for process in self.draining:
+            if not process.is_alive():
+                multiprocess.mark_process_dead(process.pid)
+        self.draining = [p for p in self.draining if p.is_alive()]
+        while self.size < self.min_processes:
+            self.spawn()
+
+    def utilisation(self):
+        now = time.monotonic()
+        busy = sum(busy_time.value for _, busy_time in self.processes)
+        previous, self.last_sample = self.last_sample, (now, busy)
+        if previous is None or not self.size:
+            return None
+        elapsed = (now - previous[0]) * self.size
+        if elapsed <= 0:
+            return None
+        # busy drops when a process is reaped; clamp rather than go negative
+        return min(max(busy - previous[1], 0) / elapsed, 1.0)
+
+    def autoscale(self, depth):
+        utilisation = self.utilisation()
+        if time.monotonic() - self.last_scaled < self.cooldown:
+            return
+
+        backlog = depth / max(self.size, 1)
+        busy = utilisation is not None and utilisation >= self.scale_up_utilisation
+        idle = utilisation is not None and utilisation <= self.scale_down_utilisation
+
+        if self.size < self.max_processes and depth and (backlog > self.scale_up_backlog or busy):
+            logger.info(
+                f"[{self.worker_type}] scaling up: depth={depth} utilisation={utilisation}"
+            )
+            self.spawn()
+            self.last_scaled = time.monotonic()
+        elif self.size > self.min_processes and not depth and idle:
+            logger.info(
+                f"[{self.worker_type}] scaling down: depth={depth} utilisation={utilisation}"
+            )
+            self.drain_one()
+            self.last_scaled = time.monotonic()
+
+    def stop(self):
+        while self.processes:
+            self.drain_one()
+
+    def join(self, timeout):
+        deadline = time.monotonic() + timeout
+        for process in self.draining:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning(f"[{self.worker_type}] consumer pid={process.pid} did not drain, killing")
+                process.kill()
+                process.join()
+        self.draining = []
+
+
+class Supervisor:
+    def __init__(self, pools, interval=10, graceful_timeout=60):
+        self.pools = pools
+        self.interval = interval
+        self.graceful_timeout = graceful_timeout
+        self.connection = None
+        self.channel = None
+        self.should_stop = False
+
+    def queue_depth(self, queue_name):
+        try:
+            if not self.connection or self.connection.is_closed:
+                self.connection = pika.BlockingConnection(pika.URLParameters(settings.RABBITMQ_URL))
+                self.channel = self.connection.channel()
+            result = self.channel.queue_declare(queue=queue_name, durable=True, passive=True)
+            return result.method.message_count
+        except Exception as e:
+            logger.error(f"Could not read depth of {queue_name}: {e}")
+            self.connection = None
+            return 0
+
+    def request_stop(self, signum=None, frame=None):
+        self.should_stop = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+
+        start_metrics_server()
+
+        # Children must not inherit open database connections
+        connections.close_all()
+        for pool in self.pools:
+            pool.reap()
+
+        while not self.should_stop:
+            time.sleep(self.interval)
+            if self.should_stop:
+                break
+            for pool in self.pools:
+                pool.reap()
+                pool.autoscale(self.queue_depth(pool.queue_name))
+
+        logger.info("Stopping: draining consumers")
+        for pool in self.pools:
+            pool.stop()
+        for pool in self.pools:
+            pool.join(self.graceful_timeout)
+        if self.connection and self.connection.is_open:
+            self.connection.close()
+        logger.info("All consumers stopped")
+
+
+def build_pools(worker_types):
+    pools = []
+    for worker_type in worker_types:
+        options = settings.WORKER_POOLS.get(worker_type, {})
+        pools.append(ConsumerPool(worker_type, **options))
+    return pools
+
+
+if __name__ == '__main__':
+    worker_types = sys.argv[1:] or list(settings.WORKER_POOLS)
+    unknown = [t for t in worker_types if t not in WORKER_TYPES]
+    if unknown:
+        print(f"Unknown worker type: {', '.join(unknown)}")
+        print("Usage: python worker_supervisor.py [search] [email] [order]")
+        sys.exit(1)
+
+    try:
+        Supervisor(
+            build_pools(worker_types),
+            interval=settings.WORKER_AUTOSCALE_INTERVAL,
+            graceful_timeout=settings.WORKER_GRACEFUL_TIMEOUT,
+        ).run()
+    finally:
+        if METRICS_DIR_CREATED:
+            shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)